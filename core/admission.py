@@ -0,0 +1,143 @@
+import asyncio
+import os
+import random
+import socket
+from typing import Dict, Optional
+from core import config
+from core.log import get_logger
+from core.metrics import Gauge, CONNECTS_REJECTED
+from core.ratelimit import TokenBucketLimiter
+
+log = get_logger("chat")
+
+
+class Rejected(Exception):
+    """Connect refused for capacity reasons; the client should retry later."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    """Connection caps and connect-rate limiting for chat sockets.
+
+    ``precheck`` runs before authentication and only touches local state:
+    the connect rate, the worker cap (counting handshakes still in flight)
+    and the room cap. ``admit`` runs once the user is known and applies the
+    per-user cap and the cluster-wide cap. The cluster total is refreshed in
+    the background through the backplane, so no connect waits on a network
+    round trip. A cap of 0 disables it.
+    """
+
+    def __init__(self, manager, max_global: int = None, max_worker: int = None, max_room: int = None,
+                 max_user: int = None, connect_rate: float = None, connect_burst: float = None):
+        self.manager = manager
+        self.max_global = config.WS_MAX_CONNECTIONS if max_global is None else max_global
+        self.max_worker = config.WS_MAX_WORKER_CONNECTIONS if max_worker is None else max_worker
+        self.max_room = config.WS_MAX_ROOM_CONNECTIONS if max_room is None else max_room
+        self.max_user = config.WS_MAX_USER_CONNECTIONS if max_user is None else max_user
+        self.connect_rate = TokenBucketLimiter(
+            config.WS_CONNECT_RATE if connect_rate is None else connect_rate,
+            config.WS_CONNECT_BURST if connect_burst is None else connect_burst,
+        )
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.connections = 0
+        self.pending = 0
+        self._users: Dict[str, int] = {}
+        self._cluster_total = 0
+        self._cluster_reported = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def register_metrics(self):
+        Gauge("chat_admission_pending", "WebSocket handshakes between precheck and admit",
+              collect=lambda: [((), self.pending)])
+
+    def _retry_after(self) -> float:
+        # Jittered so a rejected storm does not come back in lockstep.
+        return round(config.WS_RETRY_AFTER * random.uniform(1.0, 2.0), 1)
+
+    def _reject(self, reason: str, retry_after: float = None):
+        CONNECTS_REJECTED.labels(reason).inc()
+        raise Rejected(reason, self._retry_after() if retry_after is None else retry_after)
+
+    def precheck(self, room_id: str):
+        """Reserve a handshake slot or raise ``Rejected``. Pair every successful
+        call with ``admit`` or ``abandon``."""
+        self.start()
+        wait = self.connect_rate.wait_time(None)
+        if wait:
+            self._reject("connect_rate", round(wait + random.uniform(0, config.WS_RETRY_AFTER), 1))
+        if self.max_worker and self.connections + self.pending >= self.max_worker:
+            self._reject("worker")
+        if self.max_room and self.manager.connections.room_count(room_id) >= self.max_room:
+            self._reject("room")
+        self.connect_rate.take(None)
+        self.pending += 1
+
+    def abandon(self):
+        self.pending -= 1
+
+    def admit(self, user_id: str):
+        """Turn the reserved handshake into a connection or raise ``Rejected``."""
+        self.pending -= 1
+        if self.max_user and self._users.get(user_id, 0) >= self.max_user:
+            self._reject("user")
+        if self.max_global and self.cluster_estimate() >= self.max_global:
+            self._reject("global")
+        self.connections += 1
+        self._users[user_id] = self._users.get(user_id, 0) + 1
+
+    def release(self, user_id: str):
+        self.connections -= 1
+        count = self._users.get(user_id, 0) - 1
+        if count > 0:
+            self._users[user_id] = count
+        else:
+            self._users.pop(user_id, None)
+
+    def cluster_estimate(self) -> int:
+        # Last reported total, corrected by our own change since that report.
+        return self._cluster_total + self.connections - self._cluster_reported
+
+    def start(self):
+        if self._task is None and self.max_global:
+            self._task = asyncio.create_task(self._report())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _report(self):
+        interval = config.WS_CAPACITY_REPORT_SECONDS
+        while True:
+            count = self.connections
+            try:
+                self._cluster_total = await self.manager.backplane.report_connections(
+                    self.worker_id, count, interval * 3)
+                self._cluster_reported = count
+            except Exception as e:
+                log.warning("capacity_report_failed", error=str(e))
+            await asyncio.sleep(interval)
+
+    def capacity(self) -> dict:
+        worker_free = max(self.max_worker - self.connections - self.pending, 0) if self.max_worker else None
+        return {
+            "worker_id": self.worker_id,
+            "connections": self.connections,
+            "pending": self.pending,
+            "max_worker_connections": self.max_worker or None,
+            "worker_free": worker_free,
+            "load": round((self.connections + self.pending) / self.max_worker, 3) if self.max_worker else None,
+            "cluster_connections": self.cluster_estimate() if self.max_global else None,
+            "max_connections": self.max_global or None,
+            "accepting": worker_free != 0 and not (self.max_global and self.cluster_estimate() >= self.max_global),
+            "rooms": self.manager.connections.rooms,
+            "reaped": dict(self.manager.reaped),
+        }
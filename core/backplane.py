@@ -0,0 +1,342 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Set
+from urllib.parse import urlparse
+from core.log import get_logger
+
+log = get_logger("chat")
+
+Deliver = Callable[[str, str], None]
+Reconnected = Callable[[], None]
+
+CHANNEL_PREFIX = "chat:room:"
+SEQ_PREFIX = "chat:seq:"
+WORKERS_KEY = "chat:workers"
+
+# Commands that are safe to send again when the connection drops after they
+# were written: running them twice has the same effect as running them once.
+# PUBLISH (a duplicate message) and INCR (a skipped seq) are not.
+IDEMPOTENT_COMMANDS = frozenset({"GET", "SET", "HSET", "HGETALL", "HDEL", "PING"})
+
+
+class Backplane:
+    """Carries room messages between workers.
+
+    ``publish`` sends a message once; every worker that has subscribed to the
+    room gets it back through the ``deliver`` callback and fans it out to its
+    own sockets. ``reconnected`` is called when the subscription was lost
+    and re-established: messages published in between were missed.
+    """
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+        self._reconnected: Optional[Reconnected] = None
+        self._rooms: Set[str] = set()
+
+    async def start(self, deliver: Deliver, reconnected: Reconnected = None):
+        self._deliver = deliver
+        self._reconnected = reconnected
+
+    async def close(self):
+        pass
+
+    def subscribe(self, room_id: str):
+        self._rooms.add(room_id)
+
+    def unsubscribe(self, room_id: str):
+        self._rooms.discard(room_id)
+
+    async def publish(self, room_id: str, message: str):
+        raise NotImplementedError
+
+    async def next_seq(self, room_id: str) -> int:
+        """Next value of the room's message sequence, shared by all workers."""
+        raise NotImplementedError
+
+    async def seed_seq(self, room_id: str, last_seq: int):
+        """Make sure the room's sequence continues after ``last_seq``."""
+        raise NotImplementedError
+
+    async def current_seq(self, room_id: str) -> int:
+        """Last value handed out by ``next_seq`` (0 if none)."""
+        raise NotImplementedError
+
+    async def report_connections(self, worker_id: str, count: int, stale_after: float) -> int:
+        """Record this worker's socket count; returns the total across live
+        workers (those that reported within ``stale_after`` seconds)."""
+        return count
+
+
+class InMemoryBackplane(Backplane):
+    """Single-process backplane: publishing is a direct local delivery."""
+
+    def __init__(self):
+        super().__init__()
+        self._seqs: Dict[str, int] = {}
+
+    async def next_seq(self, room_id: str) -> int:
+        seq = self._seqs.get(room_id, 0) + 1
+        self._seqs[room_id] = seq
+        return seq
+
+    async def seed_seq(self, room_id: str, last_seq: int):
+        if last_seq > self._seqs.get(room_id, 0):
+            self._seqs[room_id] = last_seq
+
+    async def current_seq(self, room_id: str) -> int:
+        return self._seqs.get(room_id, 0)
+
+    async def publish(self, room_id: str, message: str):
+        if self._deliver is not None and room_id in self._rooms:
+            self._deliver(room_id, message)
+
+
+class RespError(Exception):
+    pass
+
+
+def encode_command(*args) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, int):
+            arg = str(arg).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        raise RespError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length == -1:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(rest)
+        if count == -1:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise RespError(f"Unexpected reply: {line!r}")
+
+
+class RedisBackplane(Backplane):
+    """Redis pub/sub backplane speaking RESP directly over asyncio streams.
+
+    One connection is used for commands (PUBLISH) and a second one stays in
+    subscribe mode. Commands are pipelined: they are written in order under a
+    lock and a reader task hands the replies back in the same order, so a
+    slow round trip doesn't hold up the commands behind it. The subscriber
+    reconnects with backoff and re-subscribes to every room this worker still
+    has sockets in.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, password: str = None):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self._cmd: Optional[tuple] = None
+        self._cmd_lock = asyncio.Lock()
+        self._replies: Deque[asyncio.Future] = deque()
+        self._reply_task: Optional[asyncio.Task] = None
+        self._sub_writer: Optional[asyncio.StreamWriter] = None
+        self._sub_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_url(cls, url: str):
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip("/") or 0)
+        return cls(parsed.hostname or "localhost", parsed.port or 6379, db, parsed.password)
+
+    async def start(self, deliver: Deliver, reconnected: Reconnected = None):
+        await super().start(deliver, reconnected)
+        self._sub_task = asyncio.create_task(self._subscriber())
+
+    async def close(self):
+        if self._sub_task is not None:
+            self._sub_task.cancel()
+            try:
+                await self._sub_task
+            except asyncio.CancelledError:
+                pass
+            self._sub_task = None
+        if self._sub_writer is not None:
+            self._sub_writer.close()
+        self._sub_writer = None
+        self._drop_connection(ConnectionError("Backplane closed"))
+
+    def subscribe(self, room_id: str):
+        if room_id in self._rooms:
+            return
+        super().subscribe(room_id)
+        if self._sub_writer is not None:
+            self._sub_writer.write(encode_command("SUBSCRIBE", CHANNEL_PREFIX + room_id))
+
+    def unsubscribe(self, room_id: str):
+        if room_id not in self._rooms:
+            return
+        super().unsubscribe(room_id)
+        if self._sub_writer is not None:
+            self._sub_writer.write(encode_command("UNSUBSCRIBE", CHANNEL_PREFIX + room_id))
+
+    async def publish(self, room_id: str, message: str):
+        await self.execute("PUBLISH", CHANNEL_PREFIX + room_id, message)
+
+    async def next_seq(self, room_id: str) -> int:
+        return await self.execute("INCR", SEQ_PREFIX + room_id)
+
+    async def seed_seq(self, room_id: str, last_seq: int):
+        # Only takes effect if the key is missing (e.g. Redis was flushed);
+        # otherwise the existing counter is authoritative.
+        await self.execute("SET", SEQ_PREFIX + room_id, last_seq, "NX")
+
+    async def current_seq(self, room_id: str) -> int:
+        return int(await self.execute("GET", SEQ_PREFIX + room_id) or 0)
+
+    async def report_connections(self, worker_id: str, count: int, stale_after: float) -> int:
+        # One hash field per worker, "<count>:<unix time>". Fields of workers
+        # that stopped reporting (crashed) are ignored and cleaned up.
+        now = time.time()
+        await self.execute("HSET", WORKERS_KEY, worker_id, f"{count}:{now:.0f}")
+        reply = await self.execute("HGETALL", WORKERS_KEY) or []
+        total, stale = 0, []
+        for field, value in zip(reply[::2], reply[1::2]):
+            reported, _, at = value.decode().partition(":")
+            if now - float(at or 0) > stale_after:
+                stale.append(field)
+            else:
+                total += int(reported)
+        if stale:
+            await self.execute("HDEL", WORKERS_KEY, *stale)
+        return total
+
+    async def execute(self, *args):
+        idempotent = args[0].upper() in IDEMPOTENT_COMMANDS
+        for attempt in range(2):
+            async with self._cmd_lock:
+                try:
+                    if self._cmd is None:
+                        self._cmd = await self._open()
+                        self._reply_task = asyncio.create_task(self._read_replies(self._cmd))
+                    writer = self._cmd[1]
+                    reply = asyncio.get_running_loop().create_future()
+                    self._replies.append(reply)
+                    writer.write(encode_command(*args))
+                    await writer.drain()
+                except (ConnectionError, OSError) as e:
+                    # Not sent (or not all of it): safe to send again.
+                    self._drop_connection(e)
+                    if attempt:
+                        raise
+                    continue
+            try:
+                return await reply
+            except (ConnectionError, OSError, asyncio.IncompleteReadError):
+                # The command reached the socket; Redis may have run it.
+                if attempt or not idempotent:
+                    raise
+
+    async def _read_replies(self, connection: tuple):
+        reader = connection[0]
+        try:
+            while True:
+                try:
+                    result = await read_reply(reader)
+                except RespError as e:
+                    result = e
+                if not self._replies:
+                    continue
+                future = self._replies.popleft()
+                if future.done():
+                    pass  # the caller gave up waiting
+                elif isinstance(result, RespError):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError) as e:
+            if self._cmd is connection:
+                self._drop_connection(e)
+
+    def _drop_connection(self, error: BaseException):
+        """Close the command connection and fail the commands awaiting a reply."""
+        if self._cmd is not None:
+            self._cmd[1].close()
+            self._cmd = None
+        if self._reply_task is not None and self._reply_task is not asyncio.current_task():
+            self._reply_task.cancel()
+        self._reply_task = None
+        while self._replies:
+            future = self._replies.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(str(error) or type(error).__name__))
+
+    async def _open(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        for command in self._handshake():
+            writer.write(encode_command(*command))
+            await writer.drain()
+            await read_reply(reader)
+        return reader, writer
+
+    def _handshake(self):
+        if self.password:
+            yield ("AUTH", self.password)
+        if self.db:
+            yield ("SELECT", self.db)
+
+    async def _subscriber(self):
+        backoff = 0.1
+        connected = False
+        while True:
+            try:
+                reader, writer = await self._open()
+                self._sub_writer = writer
+                if self._rooms:
+                    writer.write(encode_command("SUBSCRIBE", *(CHANNEL_PREFIX + r for r in self._rooms)))
+                    await writer.drain()
+                backoff = 0.1
+                if connected and self._reconnected is not None:
+                    try:
+                        self._reconnected()
+                    except Exception:
+                        log.exception("backplane_reconnected_failed")
+                connected = True
+                while True:
+                    reply = await read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        room_id = reply[1].decode()[len(CHANNEL_PREFIX):]
+                        if room_id in self._rooms and self._deliver is not None:
+                            try:
+                                self._deliver(room_id, reply[2].decode())
+                            except Exception:
+                                # One bad message must not stop delivery to the room.
+                                log.exception("backplane_deliver_failed", room_id=room_id)
+            except asyncio.CancelledError:
+                raise
+            except (ConnectionError, OSError, asyncio.IncompleteReadError, RespError):
+                self._sub_writer = None
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+
+
+def create_backplane(url: str) -> Backplane:
+    scheme = urlparse(url).scheme
+    if scheme in ("", "memory"):
+        return InMemoryBackplane()
+    if scheme == "redis":
+        return RedisBackplane.from_url(url)
+    raise ValueError(f"Unsupported backplane URL: {url}")
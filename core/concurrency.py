@@ -0,0 +1,37 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+async def single_flight(pending: Dict[Hashable, asyncio.Future], key: Hashable,
+                         load: Callable[[], Awaitable]):
+    """Run ``load`` once per key; concurrent callers share its result.
+
+    If the caller running ``load`` is cancelled, the others don't inherit
+    the cancellation: one of them runs ``load`` again.
+    """
+    while True:
+        future = pending.get(key)
+        if future is None:
+            break
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise  # this caller was cancelled, not the leader
+
+    future = asyncio.get_running_loop().create_future()
+    pending[key] = future
+    try:
+        result = await load()
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        # Mark retrieved so a failure nobody else awaited isn't logged.
+        future.exception()
+        raise
+    finally:
+        del pending[key]
+        if not future.done():
+            # Cancelled (or another BaseException): release the followers
+            future.cancel()
@@ -15,3 +15,176 @@ headers = {
   "Content-Type": "application/json"
 }
 
+# WebSocket fan-out: each connection gets its own bounded send queue.
+# WS_OVERFLOW_POLICY is "drop_oldest" or "disconnect" (close the slow consumer).
+WS_SEND_QUEUE_SIZE = int(os.getenv('WS_SEND_QUEUE_SIZE', '256'))
+WS_OVERFLOW_POLICY = os.getenv('WS_OVERFLOW_POLICY', 'drop_oldest')
+WS_SLOW_CONSUMER_CLOSE_CODE = int(os.getenv('WS_SLOW_CONSUMER_CLOSE_CODE', '1013'))
+
+# Cross-worker pub/sub for room broadcasts: "memory://" (single process)
+# or "redis://host:port/db".
+BACKPLANE_URL = os.getenv('BACKPLANE_URL', 'memory://')
+
+# Write-behind message persistence: rows are buffered and inserted in bulk
+# once PERSIST_BATCH_SIZE rows are pending or PERSIST_FLUSH_INTERVAL seconds
+# have passed. Senders wait when PERSIST_BUFFER_SIZE rows are pending.
+PERSIST_BUFFER_SIZE = int(os.getenv('PERSIST_BUFFER_SIZE', '10000'))
+PERSIST_BATCH_SIZE = int(os.getenv('PERSIST_BATCH_SIZE', '200'))
+PERSIST_FLUSH_INTERVAL = float(os.getenv('PERSIST_FLUSH_INTERVAL', '0.05'))
+PERSIST_MAX_RETRIES = int(os.getenv('PERSIST_MAX_RETRIES', '5'))
+
+# Token verification. "local" checks Supabase JWTs in-process using the
+# project's JWT secret (HS256) and/or its JWKS; "remote" asks GoTrue on every
+# call. With AUTH_REMOTE_FALLBACK, tokens no local key can check go to GoTrue.
+SUPABASE_JWT_SECRET = os.getenv('SUPABASE_JWT_SECRET')
+SUPABASE_JWKS_URL = os.getenv('SUPABASE_JWKS_URL')
+AUTH_VERIFY_MODE = os.getenv('AUTH_VERIFY_MODE', 'local' if (SUPABASE_JWT_SECRET or SUPABASE_JWKS_URL) else 'remote')
+AUTH_REMOTE_FALLBACK = os.getenv('AUTH_REMOTE_FALLBACK', 'false').lower() == 'true'
+JWT_AUDIENCE = os.getenv('JWT_AUDIENCE', 'authenticated')
+JWT_ALLOWED_ROLES = os.getenv('JWT_ALLOWED_ROLES', 'user,admin').split(',')
+JWKS_REFRESH_SECONDS = int(os.getenv('JWKS_REFRESH_SECONDS', '600'))
+
+# Shared HTTP gateway to Supabase. Limits apply per host; HTTP2 needs the
+# optional h2 package (pip install httpx[http2]).
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '30'))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '10'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP2 = os.getenv('HTTP2', 'false').lower() == 'true'
+
+# In-memory pair -> room_id cache used by /room/get_or_create.
+ROOM_CACHE_SIZE = int(os.getenv('ROOM_CACHE_SIZE', '50000'))
+ROOM_CACHE_TTL = float(os.getenv('ROOM_CACHE_TTL', '3600'))
+
+# Per-room replay buffer for reconnecting clients (?since=<seq>). Older
+# gaps are read from the messages table: the latest HISTORY_MAX_REPLAY rows
+# at most, after a "truncated" frame when the gap is longer. When the newest
+# messages aren't stored yet (write-behind), the replay waits up to
+# HISTORY_FLUSH_WAIT seconds for them once.
+HISTORY_ROOM_MESSAGES = int(os.getenv('HISTORY_ROOM_MESSAGES', '500'))
+HISTORY_ROOM_BYTES = int(os.getenv('HISTORY_ROOM_BYTES', str(256 * 1024)))
+HISTORY_TOTAL_BYTES = int(os.getenv('HISTORY_TOTAL_BYTES', str(64 * 1024 * 1024)))
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '200'))
+HISTORY_MAX_REPLAY = int(os.getenv('HISTORY_MAX_REPLAY', '1000'))
+HISTORY_FLUSH_WAIT = float(os.getenv('HISTORY_FLUSH_WAIT', '0.25'))
+
+# GET /chat/rooms/{room_id}/messages page sizes.
+MESSAGES_PAGE_DEFAULT = int(os.getenv('MESSAGES_PAGE_DEFAULT', '50'))
+MESSAGES_PAGE_MAX = int(os.getenv('MESSAGES_PAGE_MAX', '200'))
+
+# Storage backend for users/chat_rooms/messages: "supabase" (PostgREST via
+# the gateway), "postgres" (direct asyncpg pool on DATABASE_URL) or "sqlite"
+# (offline; SQLITE_PATH defaults to an in-memory database).
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'supabase')
+DATABASE_URL = os.getenv('DATABASE_URL')
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '2'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '20'))
+SQLITE_PATH = os.getenv('SQLITE_PATH', ':memory:')
+
+# /metrics exports per-room connection counts for at most this many of the
+# busiest rooms, to keep series cardinality bounded.
+METRICS_MAX_ROOM_SERIES = int(os.getenv('METRICS_MAX_ROOM_SERIES', '100'))
+
+# Structured logging (core/log.py). Levels per logger; LOG_SAMPLE keeps a
+# fraction of debug/info events by name, e.g. "message_received=0.01";
+# LOG_RATE_LIMIT caps each event at that many records per second (0 = off).
+# LOG_REDACT replaces message content, passwords and tokens by their length.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_LEVELS = {name: os.getenv(f'LOG_LEVEL_{name.upper()}', LOG_LEVEL) for name in ('chat', 'room', 'auth', 'storage')}
+LOG_SAMPLE = {k.strip(): float(v) for k, _, v in
+              (item.partition('=') for item in os.getenv('LOG_SAMPLE', 'message_received=0.01').split(',') if item)}
+LOG_RATE_LIMIT = float(os.getenv('LOG_RATE_LIMIT', '100'))
+LOG_REDACT = os.getenv('LOG_REDACT', 'true').lower() == 'true'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+# Inbound chat message limits (token buckets: rate per second, burst size;
+# a rate of 0 disables that scope). WS_RATE_ACTION is "drop" (ignore the
+# message), "delay" (wait for a token, up to WS_RATE_MAX_DELAY seconds, then
+# close) or "close" (close with WS_RATE_CLOSE_CODE, 1008 or 1013). Frames
+# over WS_MAX_FRAME_BYTES close the socket with 1009. Pings and read receipts
+# count against a separate per-connection bucket (WS_RATE_CONTROL) and are
+# dropped over it.
+WS_RATE_CONNECTION = float(os.getenv('WS_RATE_CONNECTION', '5'))
+WS_BURST_CONNECTION = float(os.getenv('WS_BURST_CONNECTION', '10'))
+WS_RATE_USER = float(os.getenv('WS_RATE_USER', '10'))
+WS_BURST_USER = float(os.getenv('WS_BURST_USER', '20'))
+WS_RATE_ROOM = float(os.getenv('WS_RATE_ROOM', '50'))
+WS_BURST_ROOM = float(os.getenv('WS_BURST_ROOM', '100'))
+WS_RATE_ACTION = os.getenv('WS_RATE_ACTION', 'drop')
+WS_RATE_MAX_DELAY = float(os.getenv('WS_RATE_MAX_DELAY', '2'))
+WS_RATE_CLOSE_CODE = int(os.getenv('WS_RATE_CLOSE_CODE', '1008'))
+WS_RATE_CONTROL = float(os.getenv('WS_RATE_CONTROL', '5'))
+WS_BURST_CONTROL = float(os.getenv('WS_BURST_CONTROL', '20'))
+WS_MAX_FRAME_BYTES = int(os.getenv('WS_MAX_FRAME_BYTES', str(16 * 1024)))
+RATE_LIMIT_IDLE_SECONDS = float(os.getenv('RATE_LIMIT_IDLE_SECONDS', '300'))
+
+# Admission control for chat sockets (0 = no cap). WS_MAX_CONNECTIONS is
+# cluster-wide, totalled through the backplane every
+# WS_CAPACITY_REPORT_SECONDS. Refused connects are closed with 1013 and a
+# "retry-after=<seconds>" reason, based on WS_RETRY_AFTER.
+WS_MAX_CONNECTIONS = int(os.getenv('WS_MAX_CONNECTIONS', '0'))
+WS_MAX_WORKER_CONNECTIONS = int(os.getenv('WS_MAX_WORKER_CONNECTIONS', '10000'))
+WS_MAX_ROOM_CONNECTIONS = int(os.getenv('WS_MAX_ROOM_CONNECTIONS', '50'))
+WS_MAX_USER_CONNECTIONS = int(os.getenv('WS_MAX_USER_CONNECTIONS', '10'))
+WS_CONNECT_RATE = float(os.getenv('WS_CONNECT_RATE', '200'))
+WS_CONNECT_BURST = float(os.getenv('WS_CONNECT_BURST', '400'))
+WS_RETRY_AFTER = float(os.getenv('WS_RETRY_AFTER', '2'))
+WS_CAPACITY_REPORT_SECONDS = float(os.getenv('WS_CAPACITY_REPORT_SECONDS', '2'))
+
+# Heartbeat. WS_PING_INTERVAL/WS_PING_TIMEOUT are protocol-level pings sent
+# by uvicorn (python main.py applies them; pass --ws-ping-interval and
+# --ws-ping-timeout when starting uvicorn directly). The app reaps sockets
+# whose sends have been stuck for WS_SEND_TIMEOUT seconds and, if set, those
+# that sent nothing for WS_IDLE_TIMEOUT seconds, checked every
+# WS_HEARTBEAT_TICK seconds.
+WS_PING_INTERVAL = float(os.getenv('WS_PING_INTERVAL', '20'))
+WS_PING_TIMEOUT = float(os.getenv('WS_PING_TIMEOUT', '20'))
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', '30'))
+WS_IDLE_TIMEOUT = float(os.getenv('WS_IDLE_TIMEOUT', '0'))
+WS_HEARTBEAT_TICK = float(os.getenv('WS_HEARTBEAT_TICK', '1'))
+
+# permessage-deflate for chat sockets, offered by uvicorn when started with
+# python main.py (pass --ws-per-message-deflate to plain uvicorn). Clients
+# opt in per connection in their handshake.
+WS_PER_MESSAGE_DEFLATE = os.getenv('WS_PER_MESSAGE_DEFLATE', 'true').lower() == 'true'
+
+# room_id -> members cache that authorizes WebSocket joins and history
+# reads. Unknown room ids are cached for MEMBERSHIP_NEGATIVE_TTL seconds.
+MEMBERSHIP_CACHE_SIZE = int(os.getenv('MEMBERSHIP_CACHE_SIZE', '100000'))
+MEMBERSHIP_CACHE_TTL = float(os.getenv('MEMBERSHIP_CACHE_TTL', '3600'))
+MEMBERSHIP_NEGATIVE_TTL = float(os.getenv('MEMBERSHIP_NEGATIVE_TTL', '30'))
+
+# Read receipts: watermarks are coalesced in memory and written in one
+# batch every RECEIPTS_FLUSH_INTERVAL seconds.
+RECEIPTS_FLUSH_INTERVAL = float(os.getenv('RECEIPTS_FLUSH_INTERVAL', '1'))
+RECEIPTS_CACHE_SIZE = int(os.getenv('RECEIPTS_CACHE_SIZE', '200000'))
+
+# Admins are users whose app_metadata.role is "admin" (only settable with
+# the service role key) or whose id is listed in ADMIN_USER_IDS. The
+# user-editable user_metadata is never trusted for this.
+ADMIN_USER_IDS = {u.strip() for u in os.getenv('ADMIN_USER_IDS', '').split(',') if u.strip()}
+
+# POST /auth/bulk_signup (admin only): at most BULK_SIGNUP_MAX_USERS per
+# request, BULK_SIGNUP_CONCURRENCY GoTrue signups in flight, and users rows
+# inserted BULK_SIGNUP_BATCH_SIZE at a time.
+BULK_SIGNUP_MAX_USERS = int(os.getenv('BULK_SIGNUP_MAX_USERS', '5000'))
+BULK_SIGNUP_CONCURRENCY = int(os.getenv('BULK_SIGNUP_CONCURRENCY', '16'))
+BULK_SIGNUP_BATCH_SIZE = int(os.getenv('BULK_SIGNUP_BATCH_SIZE', '500'))
+
+# Verified access tokens are cached (by hash) until they expire, at most
+# SESSION_CACHE_SIZE of them. POST /auth/refresh hands the same rotated
+# tokens to repeat refreshes of one refresh token for REFRESH_REUSE_SECONDS.
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '100000'))
+REFRESH_REUSE_SECONDS = float(os.getenv('REFRESH_REUSE_SECONDS', '10'))
+
+# GET /room/list (inbox) page sizes, and how much of each room's latest
+# message is kept in chat_rooms.last_message_preview.
+ROOM_LIST_PAGE_DEFAULT = int(os.getenv('ROOM_LIST_PAGE_DEFAULT', '30'))
+ROOM_LIST_PAGE_MAX = int(os.getenv('ROOM_LIST_PAGE_MAX', '100'))
+ROOM_PREVIEW_CHARS = int(os.getenv('ROOM_PREVIEW_CHARS', '120'))
+
+# GET /chat/search page sizes and the longest accepted query.
+SEARCH_PAGE_DEFAULT = int(os.getenv('SEARCH_PAGE_DEFAULT', '20'))
+SEARCH_PAGE_MAX = int(os.getenv('SEARCH_PAGE_MAX', '50'))
+SEARCH_QUERY_MAX = int(os.getenv('SEARCH_QUERY_MAX', '200'))
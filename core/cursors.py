@@ -0,0 +1,47 @@
+import base64
+import json
+import math
+from datetime import datetime
+from typing import Any, Callable, Sequence
+from uuid import UUID
+
+
+def timestamp_field(value: Any) -> str:
+    datetime.fromisoformat(value)
+    return value
+
+
+def uuid_field(value: Any) -> str:
+    return str(UUID(value))
+
+
+def number_field(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(value)
+    return float(value)
+
+
+def encode_cursor(values: list) -> str:
+    """Opaque, URL-safe cursor for keyset pagination."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, fields: Sequence[Callable[[Any], Any]]) -> list:
+    """Values of an ``encode_cursor`` cursor, one per field.
+
+    Each field checks and normalises its value (``timestamp_field``,
+    ``uuid_field``, ``number_field``), so a tampered cursor is a ValueError
+    here rather than a database error later.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise ValueError("Malformed cursor")
+    try:
+        return [field(value) for field, value in zip(fields, values)]
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Malformed cursor")
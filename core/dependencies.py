@@ -1,7 +1,12 @@
+import time
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from core.config import SUPABASE_URL, SUPABASE_KEY
-import httpx
+from jose import jwt, JWTError
+from core import config
+from core.gateway import gateway
+from core.metrics import TOKEN_VERIFY_SECONDS, TOKEN_VERIFICATIONS
+from core.sessions import session_cache
+from core.tokens import get_local_verifier, TokenInvalid, KeyUnavailable
 
 security = HTTPBearer(auto_error=False)
 
@@ -15,15 +20,55 @@ async def verify_request_token(
     return await verify_token_direct(token)
 
 async def verify_token_direct(token: str):
-    url = f"{SUPABASE_URL}/auth/v1/user"
+    user = session_cache.get(token)
+    if user is None:
+        user = await verify_token_uncached(token)
+        session_cache.put(token, user, token_expiry(token, user))
+    return user
+
+def token_expiry(token: str, user: dict):
+    if user.get("exp"):
+        return user["exp"]
+    # GoTrue's /user response has no exp; the token was just accepted, so
+    # reading it from the unverified claims is safe.
+    try:
+        return jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return None
+
+async def verify_token_uncached(token: str):
+    mode = config.AUTH_VERIFY_MODE
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        if mode == "local":
+            try:
+                user = await get_local_verifier().verify(token)
+                outcome = "ok"
+                return user
+            except TokenInvalid as e:
+                outcome = "rejected"
+                raise HTTPException(status_code=401, detail=f"Invalid or expired token: {str(e)}")
+            except KeyUnavailable as e:
+                if not config.AUTH_REMOTE_FALLBACK:
+                    raise HTTPException(status_code=401, detail=f"Token verification failed: {str(e)}")
+            mode = "remote"
+        try:
+            user = await verify_token_remote(token)
+        except HTTPException as e:
+            outcome = "rejected" if e.status_code == 401 else "error"
+            raise
+        outcome = "ok"
+        return user
+    finally:
+        TOKEN_VERIFY_SECONDS.labels(mode).observe(time.perf_counter() - started)
+        TOKEN_VERIFICATIONS.labels(mode, outcome).inc()
+
+async def verify_token_remote(token: str):
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers={
-                "apikey": SUPABASE_KEY,
-                "Authorization": f"Bearer {token}"
-            })
-        if response.status_code != 200:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
-        return response.json()
+        response = await gateway.get_user(token)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Token verification failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Token verification failed: {str(e)}")
+    if response.status_code != 200:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return response.json()
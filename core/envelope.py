@@ -0,0 +1,126 @@
+"""Chat message envelopes and their wire encodings.
+
+A message is serialized once, when it is sent: ``make_envelope`` builds
+the JSON text that goes over the backplane. Each worker wraps what it
+receives in a ``Frame``, and that single object is queued to every local
+recipient. The MessagePack form is encoded the first time a binary
+client needs it and then reused. orjson and msgpack are optional
+(``pip install orjson msgpack``). Without them JSON falls back to the
+standard library and only the JSON subprotocol is offered.
+"""
+import json
+from typing import Any, Iterable, Optional
+
+try:
+    import orjson
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value).decode()
+
+    loads = orjson.loads
+except ImportError:
+    def dumps(value: Any) -> str:
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+    loads = json.loads
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_PROTOCOL = "chat.json"
+MSGPACK_PROTOCOL = "chat.msgpack"
+
+# Seqs are stored as bigint
+MAX_SEQ = 2 ** 63 - 1
+
+
+def make_envelope(room_id: str, seq: int, sender_id: str, content: str, created_at: str) -> str:
+    return dumps({
+        "seq": seq,
+        "room_id": room_id,
+        "sender_id": sender_id,
+        "content": content,
+        "created_at": created_at,
+    })
+
+
+class Frame:
+    """One outbound message, shared by every recipient on this worker."""
+
+    __slots__ = ("seq", "text", "_value", "_binary")
+
+    def __init__(self, text: str, seq: Optional[int] = None, value: Any = None):
+        self.text = text
+        self.seq = seq
+        self._value = value
+        self._binary: Optional[bytes] = None
+
+    @classmethod
+    def parse(cls, text: str) -> "Frame":
+        """Wrap an envelope received from the backplane, reading its seq."""
+        try:
+            value = loads(text)
+        except ValueError:
+            return cls(text, None, text)
+        seq = value.get("seq") if isinstance(value, dict) else None
+        return cls(text, seq if isinstance(seq, int) else None, value)
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            value = self._value if self._value is not None else loads(self.text)
+            self._binary = msgpack.packb(value)
+        return self._binary
+
+    def __len__(self):
+        return len(self.text)
+
+
+def choose_subprotocol(offered: Iterable[str]) -> Optional[str]:
+    """Pick the client's first supported subprotocol, if it offered any."""
+    for protocol in offered:
+        if protocol == JSON_PROTOCOL or (protocol == MSGPACK_PROTOCOL and msgpack is not None):
+            return protocol
+    return None
+
+
+def read_receipt(message: str) -> Optional[int]:
+    """The seq from a ``{"type": "read", "seq": N}`` control frame, else None."""
+    if len(message) > 64 or not message.startswith("{") or '"read"' not in message:
+        return None
+    try:
+        value = loads(message)
+    except ValueError:
+        return None
+    if not isinstance(value, dict) or value.get("type") != "read":
+        return None
+    seq = value.get("seq")
+    return seq if isinstance(seq, int) and not isinstance(seq, bool) and 0 <= seq <= MAX_SEQ else None
+
+
+def read_inbound(message: dict, binary: bool) -> Optional[str]:
+    """Message text from an ASGI ``websocket.receive`` event.
+
+    Binary clients send either a MessagePack string or a map with a
+    ``content`` string; anything else is ignored (None).
+    """
+    text = message.get("text")
+    if text is not None:
+        return text
+    data = message.get("bytes") or b""
+    if binary:
+        try:
+            value = msgpack.unpackb(data)
+        except Exception:
+            return None
+        if isinstance(value, dict):
+            if value.get("type") == "read":
+                return dumps(value)
+            value = value.get("content")
+        return value if isinstance(value, str) else None
+    try:
+        return data.decode()
+    except UnicodeDecodeError:
+        return None
@@ -0,0 +1,183 @@
+import time
+from typing import Dict, List, Union
+from urllib.parse import urlsplit
+import httpx
+from core import config
+from core.metrics import SUPABASE_SECONDS, SUPABASE_ERRORS
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class GatewayError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.total_seconds = 0.0
+
+
+class SupabaseGateway:
+    """Shared async HTTP access to GoTrue and PostgREST.
+
+    Keeps one pooled keep-alive ``httpx.AsyncClient`` per host, so the pool
+    limits below apply per host. Clients are created on first use and closed
+    by ``close()`` at app shutdown.
+    """
+
+    def __init__(self, url: str = None, key: str = None, max_connections: int = None,
+                 max_keepalive: int = None, keepalive_expiry: float = None,
+                 timeout: float = None, connect_timeout: float = None, http2: bool = None):
+        self.url = (url or config.SUPABASE_URL or "").rstrip("/")
+        self.key = key or config.SUPABASE_KEY
+        self.limits = httpx.Limits(
+            max_connections=max_connections or config.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive or config.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=keepalive_expiry or config.HTTP_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = httpx.Timeout(timeout or config.HTTP_TIMEOUT,
+                                     connect=connect_timeout or config.HTTP_CONNECT_TIMEOUT)
+        self.http2 = (config.HTTP2 if http2 is None else http2) and HTTP2_AVAILABLE
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, HostStats] = {}
+
+    def client(self, host: str) -> httpx.AsyncClient:
+        client = self._clients.get(host)
+        if client is None:
+            client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+            self._clients[host] = client
+            self._stats[host] = HostStats()
+        return client
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    async def request(self, method: str, url: str, table: str = "-", operation: str = None,
+                      **kwargs) -> httpx.Response:
+        """``table``/``operation`` label the latency metrics for this call."""
+        if not url.startswith("http"):
+            url = self.url + url
+        host = urlsplit(url).netloc
+        client = self.client(host)
+        stats = self._stats[host]
+        stats.requests += 1
+        stats.in_flight += 1
+        started = time.perf_counter()
+        labels = (table, operation or method.lower())
+        try:
+            return await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            stats.errors += 1
+            SUPABASE_ERRORS.labels(*labels).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.in_flight -= 1
+            stats.total_seconds += elapsed
+            SUPABASE_SECONDS.labels(*labels).observe(elapsed)
+
+    def stats(self) -> dict:
+        hosts = {}
+        for host, stats in self._stats.items():
+            pool = getattr(self._clients.get(host), "_transport", None)
+            connections = list(getattr(getattr(pool, "_pool", None), "connections", []))
+            hosts[host] = {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "in_flight": stats.in_flight,
+                "avg_ms": round(stats.total_seconds / stats.requests * 1000, 2) if stats.requests else 0.0,
+                "connections": len(connections),
+                "idle_connections": sum(1 for c in connections if c.is_idle()),
+            }
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "hosts": hosts,
+        }
+
+    # GoTrue
+
+    def _auth_headers(self, token: str = None) -> dict:
+        headers = {"apikey": self.key, "Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        return headers
+
+    async def signup(self, email: str, password: str, role: str = "user") -> httpx.Response:
+        data = {"email": email, "password": password, "data": {"role": role}}
+        return await self.request("POST", "/auth/v1/signup", "auth", "signup",
+                                  json=data, headers=self._auth_headers())
+
+    async def login(self, email: str, password: str) -> httpx.Response:
+        data = {"email": email, "password": password}
+        return await self.request("POST", "/auth/v1/token", "auth", "login", params={"grant_type": "password"},
+                                  json=data, headers=self._auth_headers())
+
+    async def refresh(self, refresh_token: str) -> httpx.Response:
+        return await self.request("POST", "/auth/v1/token", "auth", "refresh", params={"grant_type": "refresh_token"},
+                                  json={"refresh_token": refresh_token}, headers=self._auth_headers())
+
+    async def get_user(self, token: str) -> httpx.Response:
+        return await self.request("GET", "/auth/v1/user", "auth", "user", headers=self._auth_headers(token))
+
+    # PostgREST
+
+    def _rest_headers(self, prefer: str = None) -> dict:
+        headers = self._auth_headers(self.key)
+        if prefer:
+            headers["Prefer"] = prefer
+        return headers
+
+    async def _rest(self, method: str, path: str, operation: str, prefer: str = None, **kwargs):
+        response = await self.request(method, f"/rest/v1/{path}", path, operation,
+                                      headers=self._rest_headers(prefer), **kwargs)
+        if response.status_code >= 400:
+            SUPABASE_ERRORS.labels(path, operation).inc()
+            raise GatewayError(response.status_code, response.text)
+        if response.status_code == 204 or not response.content:
+            return []
+        return response.json()
+
+    async def select(self, table: str, filters: dict = None, columns: str = "*",
+                     order: str = None, limit: int = None) -> List[dict]:
+        """``filters`` uses PostgREST syntax, e.g. ``{"user1_id": "eq.<id>"}``."""
+        params = dict(filters or {})
+        params["select"] = columns
+        if order:
+            params["order"] = order
+        if limit is not None:
+            params["limit"] = str(limit)
+        return await self._rest("GET", table, "select", params=params)
+
+    async def insert(self, table: str, rows: Union[dict, List[dict]], returning: bool = False) -> List[dict]:
+        prefer = "return=representation" if returning else "return=minimal"
+        return await self._rest("POST", table, "insert", prefer=prefer, json=rows)
+
+    async def upsert(self, table: str, rows: Union[dict, List[dict]], on_conflict: str,
+                     ignore_duplicates: bool = False, returning: bool = False) -> List[dict]:
+        resolution = "ignore-duplicates" if ignore_duplicates else "merge-duplicates"
+        prefer = f"resolution={resolution},return={'representation' if returning else 'minimal'}"
+        return await self._rest("POST", table, "upsert", prefer=prefer, params={"on_conflict": on_conflict}, json=rows)
+
+    async def update(self, table: str, values: dict, filters: dict, returning: bool = False) -> List[dict]:
+        prefer = "return=representation" if returning else "return=minimal"
+        return await self._rest("PATCH", table, "update", prefer=prefer, params=filters, json=values)
+
+    async def rpc(self, function: str, params: dict = None):
+        return await self._rest("POST", f"rpc/{function}", "rpc", json=params or {})
+
+
+gateway = SupabaseGateway()
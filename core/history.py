@@ -0,0 +1,142 @@
+import asyncio
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Deque, List
+from core import config
+from core.backplane import Backplane
+from core.envelope import Frame, dumps, make_envelope
+from core.repository import get_repository
+from core.log import get_logger
+
+log = get_logger("chat")
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class RoomBuffer:
+    __slots__ = ("entries", "bytes")
+
+    def __init__(self):
+        self.entries: Deque[Frame] = deque()
+        self.bytes = 0
+
+
+class RoomHistory:
+    """Recent messages per room, kept in memory for cheap reconnect replay.
+
+    Each room keeps at most ``room_messages`` entries / ``room_bytes`` bytes,
+    and whole rooms are evicted least-recently-active first once the total
+    passes ``total_bytes``. A room's buffer is dropped when this worker
+    stops receiving its messages (its last socket left, or the backplane
+    reconnected), so a buffer never has holes in it.
+    """
+
+    def __init__(self, backplane: Backplane, room_messages: int = None, room_bytes: int = None,
+                 total_bytes: int = None, page_size: int = None, max_replay: int = None,
+                 flush_wait: float = None):
+        self.backplane = backplane
+        self.room_messages = room_messages or config.HISTORY_ROOM_MESSAGES
+        self.room_bytes = room_bytes or config.HISTORY_ROOM_BYTES
+        self.total_bytes = total_bytes or config.HISTORY_TOTAL_BYTES
+        self.page_size = page_size or config.HISTORY_PAGE_SIZE
+        self.max_replay = max_replay or config.HISTORY_MAX_REPLAY
+        self.flush_wait = config.HISTORY_FLUSH_WAIT if flush_wait is None else flush_wait
+        self._rooms: "OrderedDict[str, RoomBuffer]" = OrderedDict()
+        self._bytes = 0
+        self._seeded = set()
+
+    async def next_seq(self, room_id: str) -> int:
+        if room_id not in self._seeded:
+            # First message this worker sends to the room: make sure the
+            # shared counter is past whatever is already stored.
+            try:
+                await self.backplane.seed_seq(room_id, await get_repository().last_seq(room_id))
+            except Exception as e:
+                log.warning("seq_seed_failed", room_id=room_id, error=str(e))
+            self._seeded.add(room_id)
+        return await self.backplane.next_seq(room_id)
+
+    def record(self, room_id: str, frame: Frame):
+        if frame.seq is None:
+            return
+        room = self._rooms.get(room_id)
+        if room is None:
+            room = self._rooms[room_id] = RoomBuffer()
+        else:
+            self._rooms.move_to_end(room_id)
+        size = len(frame)
+        room.entries.append(frame)
+        room.bytes += size
+        self._bytes += size
+        while room.entries and (len(room.entries) > self.room_messages or room.bytes > self.room_bytes):
+            old = room.entries.popleft()
+            room.bytes -= len(old)
+            self._bytes -= len(old)
+        while self._bytes > self.total_bytes and len(self._rooms) > 1:
+            _, evicted = self._rooms.popitem(last=False)
+            self._bytes -= evicted.bytes
+
+    def forget(self, room_id: str):
+        self._seeded.discard(room_id)
+        room = self._rooms.pop(room_id, None)
+        if room is not None:
+            self._bytes -= room.bytes
+
+    def clear(self) -> int:
+        """Drop every buffer; returns how many rooms had one."""
+        count = len(self._rooms)
+        self._rooms.clear()
+        self._bytes = 0
+        self._seeded.clear()
+        return count
+
+    async def replay(self, room_id: str, since: int) -> List[Frame]:
+        """Everything after ``since``: from memory when the buffer reaches
+        back far enough, otherwise older entries are paged from storage.
+
+        At most the ``max_replay`` most recent stored messages are replayed.
+        If the gap is longer, the replay starts with a
+        ``{"type": "truncated", "since", "resume_from"}`` frame: messages
+        before ``resume_from`` were skipped, and the client should page
+        them from GET /chat/rooms/{room_id}/messages.
+        """
+        room = self._rooms.get(room_id)
+        buffered = [f for f in room.entries if f.seq > since] if room else []
+        oldest = room.entries[0].seq if room and room.entries else None
+        if oldest is not None and oldest <= since + 1:
+            return buffered
+
+        # Seqs are per-room counters, so the newest max_replay stored
+        # messages are at most the seq range (start, upper).
+        repository = get_repository()
+        if oldest is not None:
+            upper = oldest
+        else:
+            upper = max(await self.backplane.current_seq(room_id), await repository.last_seq(room_id)) + 1
+        start = max(since, upper - 1 - self.max_replay)
+
+        frames: List[Frame] = []
+        if start > since:
+            frames.append(Frame(dumps({"type": "truncated", "room_id": room_id, "since": since,
+                                       "resume_from": start + 1})))
+        stored = await self._stored(room_id, start, upper)
+        last = stored[-1].seq if stored else start
+        if last < upper - 1 and self.flush_wait:
+            # The newest messages may still be in a write-behind buffer
+            # (this worker's or another's): give them one flush to land.
+            await asyncio.sleep(self.flush_wait)
+            stored += await self._stored(room_id, last, upper)
+        return frames + stored + buffered
+
+    async def _stored(self, room_id: str, after: int, upper: int) -> List[Frame]:
+        repository = get_repository()
+        frames: List[Frame] = []
+        while True:
+            rows = await repository.messages_after(room_id, after, upper, self.page_size)
+            for row in rows:
+                frames.append(Frame(make_envelope(
+                    room_id, row["seq"], row["sender_id"], row["content"], row["created_at"]), row["seq"]))
+            if len(rows) < self.page_size:
+                return frames
+            after = rows[-1]["seq"]
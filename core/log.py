@@ -0,0 +1,164 @@
+"""Structured, non-blocking logging.
+
+Loggers hand records to a ``QueueHandler``; a single background thread
+formats them as one JSON object per line and writes them out, so the event
+loop never blocks on stdout. Each event name can be sampled
+(``LOG_SAMPLE=message_received=0.01``) and is rate limited to
+``LOG_RATE_LIMIT`` records per second; suppressed records are counted and
+reported on the next one that gets through. Fields named in
+``REDACTED_FIELDS`` are replaced by their length unless ``LOG_REDACT`` is off.
+
+    log = get_logger("chat")
+    log.info("message_received", room_id=room_id, content=message)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from typing import Dict
+from core import config
+
+REDACTED_FIELDS = frozenset({"content", "message", "password", "token", "access_token", "refresh_token"})
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.msg,
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging():
+    """Install the queue handler and start the writer thread (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    records: queue.Queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    for name, level in config.LOG_LEVELS.items():
+        logger = logging.getLogger(name)
+        logger.setLevel(level.upper())
+        logger.propagate = False
+        logger.addHandler(_DroppingQueueHandler(records))
+    _listener = logging.handlers.QueueListener(records, stream)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()  # flushes what is already queued
+        _listener = None
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drops records when the writer falls behind instead of blocking."""
+
+    dropped = 0
+
+    def prepare(self, record):
+        return record  # formatting happens on the writer thread
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+class _Budget:
+    __slots__ = ("tokens", "updated", "suppressed")
+
+    def __init__(self, capacity: float):
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.suppressed = 0
+
+
+class EventLogger:
+    """Wraps a stdlib logger with per-event sampling, rate limits and redaction."""
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+        self.rate = config.LOG_RATE_LIMIT
+        self._budgets: Dict[str, _Budget] = {}
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=True)
+
+    def _log(self, level: int, event: str, fields: dict, exc_info: bool = False):
+        if not self.logger.isEnabledFor(level):
+            return
+        # Warnings and errors are never sampled, only rate limited.
+        rate = config.LOG_SAMPLE.get(event, 1.0)
+        if level < logging.WARNING and rate < 1.0 and random.random() >= rate:
+            return
+        suppressed = self._take(event)
+        if suppressed is None:
+            return
+        if suppressed:
+            fields["suppressed"] = suppressed
+        if rate < 1.0:
+            fields["sample_rate"] = rate
+        if config.LOG_REDACT:
+            for key in REDACTED_FIELDS.intersection(fields):
+                value = fields[key]
+                fields[key] = f"<redacted {len(value)} chars>" if isinstance(value, str) else "<redacted>"
+        self.logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
+    def _take(self, event: str):
+        """Returns the number of records suppressed since the last one, or
+        None if this one is over the event's budget."""
+        if self.rate <= 0:
+            return 0
+        budget = self._budgets.get(event)
+        now = time.monotonic()
+        if budget is None:
+            budget = self._budgets[event] = _Budget(self.rate)
+        else:
+            budget.tokens = min(self.rate, budget.tokens + (now - budget.updated) * self.rate)
+            budget.updated = now
+        if budget.tokens < 1:
+            budget.suppressed += 1
+            return None
+        budget.tokens -= 1
+        suppressed, budget.suppressed = budget.suppressed, 0
+        return suppressed
+
+
+_loggers: Dict[str, EventLogger] = {}
+
+
+def get_logger(name: str) -> EventLogger:
+    logger = _loggers.get(name)
+    if logger is None:
+        setup_logging()
+        logger = _loggers[name] = EventLogger(name)
+    return logger
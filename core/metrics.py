@@ -0,0 +1,195 @@
+"""Minimal in-process Prometheus metrics.
+
+Counters, gauges and histograms keep one small child object per label
+combination, so recording is a dict lookup plus an addition. Gauges can
+instead be computed at scrape time from a callback, which keeps per-event
+work at zero for values the app already tracks (connection counts, queue
+depths). ``render()`` produces the text exposition format for /metrics.
+"""
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_registry: List["Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, object] = {}
+        _registry.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in self._children.items():
+            yield f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"
+
+
+class Gauge(Counter):
+    """A settable value, or one computed at scrape time by ``collect``.
+
+    ``collect`` returns ``(label_values, value)`` pairs.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Iterable[Tuple[Tuple, float]]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def samples(self):
+        if self.collect is None:
+            yield from super().samples()
+            return
+        for values, value in self.collect():
+            yield f"{self.name}{_labels(self.labelnames, values)} {_number(value)}"
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    """Histogram; with ``collect`` it is rebuilt from a fresh set of
+    observations at each scrape (for point-in-time distributions)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+                 collect: Optional[Callable[[], Iterable[float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.collect = collect
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        children = self._children.items()
+        if self.collect is not None:
+            snapshot = _HistogramValue(self.buckets)
+            for value in self.collect():
+                snapshot.observe(value)
+            children = [((), snapshot)]
+        for values, child in children:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, values)} {_number(child.sum)}"
+            yield f"{self.name}_count{_labels(self.labelnames, values)} {child.count}"
+
+
+def render() -> str:
+    return "".join(metric.render() for metric in _registry)
+
+
+# Metrics shared across modules. Scrape-time gauges are registered by the
+# module that owns the data (see core/ws_manager.py).
+
+MESSAGES_RECEIVED = Counter("chat_messages_received_total", "Chat messages received from clients")
+MESSAGES_BROADCAST = Counter("chat_messages_broadcast_total", "Chat messages fanned out to local sockets")
+MESSAGES_DELIVERED = Counter("chat_messages_delivered_total", "Frames queued for delivery to sockets")
+MESSAGES_PERSISTED = Counter("chat_messages_persisted_total", "Chat messages written to storage")
+MESSAGES_PERSIST_FAILED = Counter("chat_messages_persist_failed_total", "Chat messages dropped after failed inserts")
+FANOUT_SECONDS = Histogram("chat_broadcast_fanout_seconds", "Time to enqueue one message for every local socket")
+SEND_QUEUE_DROPPED = Counter("chat_send_queue_dropped_total", "Frames dropped from full send queues")
+SLOW_CONSUMERS = Counter("chat_slow_consumer_disconnects_total", "Sockets closed because their send queue was full")
+RATE_LIMITED = Counter("chat_rate_limited_total", "Inbound messages over a rate limit", ("scope", "action"))
+CONNECTIONS_REAPED = Counter("chat_connections_reaped_total", "Dead sockets removed by the heartbeat", ("reason",))
+CONNECTS_REJECTED = Counter("chat_connects_rejected_total", "WebSocket connects refused by admission control",
+                            ("reason",))
+OVERSIZED_FRAMES = Counter("chat_oversized_frames_total", "Sockets closed for sending a frame over WS_MAX_FRAME_BYTES")
+
+TOKEN_VERIFY_SECONDS = Histogram("auth_token_verify_seconds", "Token verification latency", ("mode",))
+TOKEN_VERIFICATIONS = Counter("auth_token_verifications_total", "Token verifications", ("mode", "outcome"))
+TOKEN_CACHE = Counter("auth_token_cache_total", "Signing key and session cache lookups", ("cache", "result"))
+
+SUPABASE_SECONDS = Histogram("supabase_request_seconds", "Supabase call latency", ("table", "operation"))
+SUPABASE_ERRORS = Counter("supabase_request_errors_total", "Failed Supabase calls", ("table", "operation"))
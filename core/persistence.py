@@ -0,0 +1,112 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+from core import config
+from core.metrics import MESSAGES_PERSISTED, MESSAGES_PERSIST_FAILED
+from core.log import get_logger
+
+log = get_logger("storage")
+
+Flush = Callable[[List[dict]], Awaitable[None]]
+
+_STOP = object()
+
+
+class MessageWriter:
+    """Write-behind buffer that persists rows in bulk off the request path.
+
+    ``submit`` only waits when the buffer is full, which pushes back on the
+    sender instead of growing memory. A background task flushes a batch as
+    soon as it reaches ``batch_size`` rows or ``flush_interval`` seconds have
+    passed since its first row.
+
+    Failures that ``transient`` accepts (connection loss, timeouts) are
+    retried with exponential backoff. Any other failure means some row in
+    the batch is bad. The batch is then split in halves until the bad rows
+    are isolated, so one bad message costs only itself and not the rest of
+    the batch.
+    """
+
+    def __init__(self, flush: Flush, max_buffer: int = None, batch_size: int = None,
+                 flush_interval: float = None, max_retries: int = None,
+                 transient: Callable[[Exception], bool] = None):
+        self.flush = flush
+        self.transient = transient or (lambda error: isinstance(error, OSError))
+        self.max_buffer = max_buffer or config.PERSIST_BUFFER_SIZE
+        self.batch_size = batch_size or config.PERSIST_BATCH_SIZE
+        self.flush_interval = flush_interval or config.PERSIST_FLUSH_INTERVAL
+        self.max_retries = max_retries if max_retries is not None else config.PERSIST_MAX_RETRIES
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.failed = 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_buffer)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, row: dict):
+        self.start()
+        await self._queue.put(row)
+
+    async def close(self):
+        # Flushes everything already accepted before returning.
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[dict]):
+        delay = 0.1
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.flush(batch)
+                MESSAGES_PERSISTED.inc(len(batch))
+                return
+            except Exception as e:
+                if not self.transient(e):
+                    await self._split(batch, e)
+                    return
+                if attempt == self.max_retries:
+                    self._drop(batch, "persist_dropped", e, attempts=attempt + 1)
+                    return
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    async def _split(self, batch: List[dict], error: Exception):
+        if len(batch) == 1:
+            self._drop(batch, "persist_rejected", error, room_id=batch[0].get("chat_room_id"),
+                       seq=batch[0].get("seq"))
+            return
+        middle = len(batch) // 2
+        await self._flush(batch[:middle])
+        await self._flush(batch[middle:])
+
+    def _drop(self, batch: List[dict], event: str, error: Exception, **fields):
+        self.failed += len(batch)
+        MESSAGES_PERSIST_FAILED.inc(len(batch))
+        log.error(event, rows=len(batch), error=str(error), **fields)
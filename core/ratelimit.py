@@ -0,0 +1,136 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+from core.metrics import RATE_LIMITED
+
+
+class Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class TokenBucketLimiter:
+    """Token buckets keyed by connection, user or room.
+
+    ``rate`` tokens per second refill up to ``burst``. Buckets are kept in
+    access order and any idle for ``idle_seconds`` are evicted as new keys
+    arrive, so memory stays proportional to the keys active recently. An
+    idle bucket would be full anyway, so evicting it changes nothing.
+    """
+
+    def __init__(self, rate: float, burst: float, idle_seconds: float = 300.0):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.idle_seconds = idle_seconds
+        self._buckets: "OrderedDict[Hashable, Bucket]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _bucket(self, key: Hashable, now: float) -> Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._evict(now)
+            bucket = self._buckets[key] = Bucket(self.burst, now)
+            return bucket
+        self._buckets.move_to_end(key)
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+        bucket.updated = now
+        return bucket
+
+    def _evict(self, now: float):
+        while self._buckets:
+            key, oldest = next(iter(self._buckets.items()))
+            if now - oldest.updated < self.idle_seconds:
+                break
+            del self._buckets[key]
+
+    def wait_time(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Seconds until ``key`` has a token; 0 if one is available now."""
+        if not self.enabled:
+            return 0.0
+        bucket = self._bucket(key, time.monotonic() if now is None else now)
+        return 0.0 if bucket.tokens >= 1 else (1 - bucket.tokens) / self.rate
+
+    def take(self, key: Hashable, now: Optional[float] = None):
+        """Spend a token. The balance may go negative, which makes later
+        callers wait their turn (used by the delay action)."""
+        if self.enabled:
+            self._bucket(key, time.monotonic() if now is None else now).tokens -= 1
+
+    def forget(self, key: Hashable):
+        self._buckets.pop(key, None)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+ALLOW = "allow"
+DROP = "drop"
+DELAY = "delay"
+CLOSE = "close"
+
+
+class MessageLimits:
+    """Per-connection, per-user and per-room limits for inbound chat messages.
+
+    ``admit`` returns ALLOW, DROP or CLOSE. With the delay action it sleeps
+    until every bucket has a token and then allows the message, unless the
+    wait would exceed ``max_delay``, in which case it returns CLOSE.
+
+    Control frames (pings, read receipts) have their own per-connection
+    bucket, ``control``, so reading a busy room doesn't use up the tokens
+    for sending; ``admit_control`` returns ALLOW or DROP.
+    """
+
+    def __init__(self, connection: TokenBucketLimiter, user: TokenBucketLimiter,
+                 room: TokenBucketLimiter, action: str, max_delay: float,
+                 control: TokenBucketLimiter = None):
+        if action not in (DROP, DELAY, CLOSE):
+            raise ValueError(f"Unknown rate limit action: {action}")
+        self.scopes = (("connection", connection), ("user", user), ("room", room))
+        self.control = TokenBucketLimiter(0, 1) if control is None else control
+        self.action = action
+        self.max_delay = max_delay
+
+    async def admit(self, conn_key: Hashable, user_id: str, room_id: str) -> str:
+        now = time.monotonic()
+        keys = (conn_key, user_id, room_id)
+        wait, scope = 0.0, None
+        for (name, limiter), key in zip(self.scopes, keys):
+            needed = limiter.wait_time(key, now)
+            if needed > wait:
+                wait, scope = needed, name
+        if wait == 0.0:
+            self._take(keys, now)
+            return ALLOW
+        RATE_LIMITED.labels(scope, self.action).inc()
+        if self.action == DROP:
+            return DROP
+        if self.action == CLOSE or wait > self.max_delay:
+            return CLOSE
+        self._take(keys, now)
+        await asyncio.sleep(wait)
+        return ALLOW
+
+    def admit_control(self, conn_key: Hashable) -> str:
+        now = time.monotonic()
+        if self.control.wait_time(conn_key, now) > 0:
+            RATE_LIMITED.labels("control", DROP).inc()
+            return DROP
+        self.control.take(conn_key, now)
+        return ALLOW
+
+    def _take(self, keys, now: float):
+        for (_, limiter), key in zip(self.scopes, keys):
+            limiter.take(key, now)
+
+    def forget(self, conn_key: Hashable):
+        # User and room buckets are shared with other sockets and simply age out.
+        self.scopes[0][1].forget(conn_key)
+        self.control.forget(conn_key)
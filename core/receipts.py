@@ -0,0 +1,158 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from core import config
+from core.log import get_logger
+from core.repository import get_repository
+
+log = get_logger("chat")
+
+ReadKey = Tuple[str, str]
+
+
+def _advance(values: "OrderedDict", key, seq: int, max_size: int) -> bool:
+    """Raise ``values[key]`` to ``seq`` (LRU-bounded); True if it moved."""
+    current = values.get(key, 0)
+    if seq <= current:
+        return False
+    values[key] = seq
+    values.move_to_end(key)
+    while len(values) > max_size:
+        values.popitem(last=False)
+    return True
+
+
+class ReadReceipts:
+    """Read watermarks and unread counts.
+
+    A user's position in a room is the last seq they have read, so a
+    receipt is one number per (room, user) rather than an update per
+    message. Receipts only move watermarks forward and are coalesced in
+    memory: however many arrive for a key between flushes, one row is
+    written, in a single batched call every ``flush_interval`` seconds.
+
+    Unread count = room's last seq - user's watermark. Both come from
+    storage (chat_rooms.last_seq, room_reads) and are overlaid with the
+    newer values this worker has seen since, so counts are current without
+    waiting for a flush and never scan messages.
+    """
+
+    def __init__(self, flush_interval: float = None, max_size: int = None):
+        self.flush_interval = flush_interval or config.RECEIPTS_FLUSH_INTERVAL
+        self.max_size = max_size or config.RECEIPTS_CACHE_SIZE
+        self._room_seqs: "OrderedDict[str, int]" = OrderedDict()
+        self._reads: "OrderedDict[ReadKey, int]" = OrderedDict()
+        self._dirty: Dict[ReadKey, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    def message_sent(self, room_id: str, user_id: str, seq: int):
+        # Senders have read everything up to their own message.
+        _advance(self._room_seqs, room_id, seq, self.max_size)
+        self.mark_read(room_id, user_id, seq)
+
+    async def clamp(self, room_id: str, seq: int, seen: int = 0) -> int:
+        """``seq`` capped at the room's latest seq, so a client can't move its
+        watermark past messages that don't exist yet (which would hide them
+        from the unread count for good, watermarks never move back).
+
+        ``seen`` is the newest seq delivered to the client's socket, which
+        may not be stored yet.
+        """
+        known = max(self._room_seqs.get(room_id, 0), seen)
+        if seq > known:
+            try:
+                room = await get_repository().get_room(room_id)
+            except Exception as e:
+                # Only what this worker knows, until storage answers again
+                log.warning("receipt_clamp_failed", room_id=room_id, error=str(e))
+                room = None
+            if room is not None and room.get("last_seq"):
+                _advance(self._room_seqs, room_id, room["last_seq"], self.max_size)
+                known = max(known, room["last_seq"])
+        return min(seq, known)
+
+    def mark_read(self, room_id: str, user_id: str, seq: int) -> bool:
+        known = self._room_seqs.get(room_id)
+        if known is not None:
+            seq = min(seq, known)
+        key = (room_id, user_id)
+        if not _advance(self._reads, key, seq, self.max_size):
+            return False
+        if seq > self._dirty.get(key, 0):
+            self._dirty[key] = seq
+        self.start()
+        return True
+
+    async def unread(self, user_id: str) -> List[dict]:
+        return [{"room_id": state["room_id"], **self.counts(state["room_id"], user_id, state["last_seq"],
+                                                             state["last_read_seq"])}
+                for state in await get_repository().read_states(user_id)]
+
+    def counts(self, room_id: str, user_id: str, last_seq: int, last_read_seq: int) -> dict:
+        """Stored seq and watermark, overlaid with what this worker has seen since."""
+        last_seq = max(last_seq or 0, self._room_seqs.get(room_id, 0))
+        last_read = max(last_read_seq or 0, self._reads.get((room_id, user_id), 0))
+        return {"last_seq": last_seq, "last_read_seq": last_read, "unread": max(last_seq - last_read, 0)}
+
+    def start(self):
+        if self._task is None:
+            self._stop = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        # Not cancelled: a cancel landing mid-write would lose that batch.
+        # The loop is told to stop and finishes with one last flush.
+        if self._task is not None:
+            self._stop.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await self._write(list(dirty.items()))
+        except BaseException as e:
+            # Keep them for the next flush, unless something newer arrived
+            self._restore(dirty.items())
+            if not isinstance(e, Exception):
+                raise
+            log.warning("receipts_flush_failed", rows=len(dirty), error=str(e))
+
+    async def _write(self, marks: List[Tuple[ReadKey, int]]):
+        """Write the marks. A transient failure is raised, and ``flush`` keeps
+        the batch for the next one (rewriting a mark is harmless). Any other
+        failure means a bad row: the batch is split in halves until it is
+        isolated, and only that row is dropped."""
+        repository = get_repository()
+        try:
+            await repository.mark_read([(room, user, seq) for (room, user), seq in marks])
+        except Exception as e:
+            if repository.is_transient(e):
+                raise
+            if len(marks) == 1:
+                (room_id, user_id), seq = marks[0]
+                log.error("receipt_rejected", room_id=room_id, user_id=user_id, seq=seq, error=str(e))
+                return
+            middle = len(marks) // 2
+            await self._write(marks[:middle])
+            await self._write(marks[middle:])
+
+    def _restore(self, marks):
+        for key, seq in marks:
+            if seq > self._dirty.get(key, 0):
+                self._dirty[key] = seq
+
+
+read_receipts = ReadReceipts()
@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import time
+from typing import Dict, Iterator, Optional, Tuple
+from fastapi import WebSocket
+
+_ids = itertools.count(1)
+
+
+class Connection:
+    """A socket plus its outbound queue, the task that drains it and counters."""
+
+    __slots__ = ("id", "user_id", "room_id", "websocket", "connected_at", "queue", "writer", "closed",
+                 "binary", "skip_upto", "last_sent_seq", "last_seen", "sending_since", "received", "sent",
+                 "dropped")
+
+    def __init__(self, websocket: WebSocket, room_id: str, user_id: Optional[str], queue_size: int,
+                 binary: bool = False):
+        self.id = next(_ids)
+        self.user_id = user_id
+        self.room_id = room_id
+        self.websocket = websocket
+        self.connected_at = time.time()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
+        # MessagePack subprotocol: frames go out as binary.
+        self.binary = binary
+        # Live messages up to this seq were already sent during replay.
+        self.skip_upto = 0
+        # Newest message seq sent to the client (what it can have read).
+        self.last_sent_seq = 0
+        self.last_seen = time.monotonic()
+        self.sending_since: Optional[float] = None
+        self.received = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def touch(self):
+        """Record inbound traffic; called for every frame the client sends."""
+        self.last_seen = time.monotonic()
+        self.received += 1
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "room_id": self.room_id,
+            "connected_at": self.connected_at,
+            "received": self.received,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize(),
+        }
+
+
+class ConnectionRegistry:
+    """Live connections indexed by id, by room and by user.
+
+    The per-room and per-user indexes are dicts keyed by connection id
+    (insertion-ordered sets), so ``add`` and ``remove`` are O(1). The
+    lookups return tuples: callers can iterate them while connections are
+    being added or removed, e.g. during a broadcast that disconnects a
+    slow consumer.
+    """
+
+    def __init__(self):
+        self._by_id: Dict[int, Connection] = {}
+        self._by_room: Dict[str, Dict[int, Connection]] = {}
+        self._by_user: Dict[str, Dict[int, Connection]] = {}
+
+    def add(self, conn: Connection) -> bool:
+        """Index ``conn``; returns True if it is the first in its room."""
+        self._by_id[conn.id] = conn
+        room = self._by_room.get(conn.room_id)
+        first = room is None
+        if first:
+            room = self._by_room[conn.room_id] = {}
+        room[conn.id] = conn
+        if conn.user_id is not None:
+            self._by_user.setdefault(conn.user_id, {})[conn.id] = conn
+        return first
+
+    def remove(self, conn: Connection) -> bool:
+        """Drop ``conn``; returns True if that emptied its room."""
+        if self._by_id.pop(conn.id, None) is None:
+            return False
+        if conn.user_id is not None:
+            self._discard(self._by_user, conn.user_id, conn.id)
+        return self._discard(self._by_room, conn.room_id, conn.id)
+
+    @staticmethod
+    def _discard(index: Dict[str, Dict[int, Connection]], key: str, conn_id: int) -> bool:
+        conns = index.get(key)
+        if conns is None:
+            return False
+        conns.pop(conn_id, None)
+        if not conns:
+            del index[key]
+            return True
+        return False
+
+    def get(self, conn_id: int) -> Optional[Connection]:
+        return self._by_id.get(conn_id)
+
+    def room(self, room_id: str) -> Tuple[Connection, ...]:
+        conns = self._by_room.get(room_id)
+        return tuple(conns.values()) if conns else ()
+
+    def user(self, user_id: str) -> Tuple[Connection, ...]:
+        conns = self._by_user.get(user_id)
+        return tuple(conns.values()) if conns else ()
+
+    def room_count(self, room_id: str) -> int:
+        conns = self._by_room.get(room_id)
+        return len(conns) if conns else 0
+
+    def user_count(self, user_id: str) -> int:
+        conns = self._by_user.get(user_id)
+        return len(conns) if conns else 0
+
+    def room_sizes(self) -> Iterator[Tuple[str, int]]:
+        return ((room_id, len(conns)) for room_id, conns in list(self._by_room.items()))
+
+    @property
+    def rooms(self) -> int:
+        return len(self._by_room)
+
+    @property
+    def users(self) -> int:
+        return len(self._by_user)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[Connection]:
+        return iter(tuple(self._by_id.values()))
@@ -0,0 +1,32 @@
+from typing import Optional
+from core import config
+from core.repository.base import Repository, MESSAGE_COLUMNS, SNIPPET_START, SNIPPET_STOP
+
+_repository: Optional[Repository] = None
+
+
+def create_repository(backend: str) -> Repository:
+    if backend == "supabase":
+        from core.repository.rest import SupabaseRepository
+        return SupabaseRepository()
+    if backend == "postgres":
+        from core.repository.postgres import PostgresRepository
+        return PostgresRepository()
+    if backend == "sqlite":
+        from core.repository.sqlite import SqliteRepository
+        return SqliteRepository()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def get_repository() -> Repository:
+    global _repository
+    if _repository is None:
+        _repository = create_repository(config.STORAGE_BACKEND)
+    return _repository
+
+
+async def close_repository():
+    global _repository
+    if _repository is not None:
+        await _repository.close()
+        _repository = None
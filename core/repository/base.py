@@ -0,0 +1,111 @@
+from typing import List, Optional, Sequence, Tuple
+
+PairKey = Tuple[str, str]
+# (room_id, user_id, last_read_seq)
+ReadMark = Tuple[str, str, int]
+
+# Control characters around matched terms in search snippets; the API
+# escapes the text and replaces them with markup.
+SNIPPET_START = "\x02"
+SNIPPET_STOP = "\x03"
+
+MESSAGE_COLUMNS = ("id", "chat_room_id", "sender_id", "content", "message_type", "is_read", "seq", "created_at")
+
+
+class Repository:
+    """Storage for users, chat_rooms and messages.
+
+    Rows are plain dicts with ids as strings and timestamps as ISO 8601
+    strings, whatever the backend, so callers can hand them straight to
+    JSON responses.
+    """
+
+    async def open(self):
+        """Connect ahead of the first query; backends also connect lazily."""
+        pass
+
+    async def close(self):
+        pass
+
+    def is_transient(self, error: Exception) -> bool:
+        """True if ``error`` may go away on retry (connection, timeout).
+
+        Anything else is taken to be a problem with the data, which the
+        same rows would hit again.
+        """
+        return isinstance(error, OSError)  # includes ConnectionError and TimeoutError
+
+    # users
+
+    async def insert_users(self, rows: List[dict]):
+        raise NotImplementedError
+
+    # chat_rooms
+
+    async def get_or_create_room(self, key: PairKey) -> str:
+        """Room id for the canonical (low, high) user pair, created atomically."""
+        raise NotImplementedError
+
+    async def get_room(self, room_id: str) -> Optional[dict]:
+        """The chat_rooms row, or None if there is none (or the id is malformed)."""
+        raise NotImplementedError
+
+    async def update_room_summaries(self, summaries: List[dict]):
+        """Record each room's latest message.
+
+        ``summaries`` holds one ``{"room_id", "seq", "sender_id", "preview",
+        "created_at"}`` per room; a room is only updated when ``seq`` is
+        above its ``last_seq``, so summaries never move backwards.
+        """
+        raise NotImplementedError
+
+    async def list_rooms(self, user_id: str, before: Optional[Sequence], limit: int) -> List[dict]:
+        """The user's rooms by last activity, newest first.
+
+        Rows are ``{"id", "other_user_id", "other_username", "last_seq",
+        "last_activity_at", "last_sender_id", "last_message_preview",
+        "last_read_seq"}``; ``before`` is the (last_activity_at, id) of the
+        previous page's last row.
+        """
+        raise NotImplementedError
+
+    # read receipts
+
+    async def mark_read(self, marks: List[ReadMark]):
+        """Upsert read watermarks, keeping the larger value on conflict."""
+        raise NotImplementedError
+
+    async def read_states(self, user_id: str) -> List[dict]:
+        """``{"room_id", "last_seq", "last_read_seq"}`` for each of the user's rooms."""
+        raise NotImplementedError
+
+    # messages
+
+    async def insert_messages(self, rows: List[dict]):
+        """Rows carry their own id; rows whose id is already stored are
+        skipped, so a batch retried after an ambiguous failure (a timeout
+        after the commit) doesn't store its messages twice."""
+        raise NotImplementedError
+
+    async def last_seq(self, room_id: str) -> int:
+        raise NotImplementedError
+
+    async def messages_after(self, room_id: str, after: int, before: Optional[int], limit: int) -> List[dict]:
+        """Messages with ``after < seq`` (``< before`` when given), oldest first."""
+        raise NotImplementedError
+
+    async def messages_page(self, room_id: str, before: Optional[Sequence], limit: int,
+                            columns: Sequence[str]) -> List[dict]:
+        """Newest first; ``before`` is the (created_at, id) of the previous page's last row."""
+        raise NotImplementedError
+
+    async def search_messages(self, user_id: str, query: str, room_id: Optional[str],
+                              before: Optional[Sequence], limit: int) -> List[dict]:
+        """Full-text hits in the user's rooms (or just ``room_id``), best first.
+
+        Rows are ``{"id", "chat_room_id", "sender_id", "seq", "created_at",
+        "score", "snippet"}``, where ``snippet`` marks matches with
+        ``SNIPPET_START``/``SNIPPET_STOP``; ``before`` is the (score, id) of
+        the previous page's last row.
+        """
+        raise NotImplementedError
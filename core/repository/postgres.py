@@ -0,0 +1,177 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence
+from uuid import UUID, uuid4
+import asyncpg
+from core import config
+from core.repository.base import Repository, PairKey, ReadMark, MESSAGE_COLUMNS
+
+# Column order for COPY into messages
+COPY_COLUMNS = ("id", "chat_room_id", "sender_id", "content", "message_type", "is_read", "seq", "created_at")
+
+
+def _value(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _row(record) -> dict:
+    return {k: _value(v) for k, v in record.items()}
+
+
+def _timestamp(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+class PostgresRepository(Repository):
+    """Direct asyncpg pool, skipping the PostgREST hop.
+
+    asyncpg prepares each distinct query once per connection and keeps it in
+    its statement cache, so repeated calls only send bind parameters. Bulk
+    message inserts go through COPY.
+    """
+
+    def __init__(self, dsn: str = None, min_size: int = None, max_size: int = None):
+        self.dsn = dsn or config.DATABASE_URL
+        self.min_size = min_size or config.DB_POOL_MIN
+        self.max_size = max_size or config.DB_POOL_MAX
+        self._pool: Optional[asyncpg.Pool] = None
+        self._lock = asyncio.Lock()
+
+    async def pool(self) -> asyncpg.Pool:
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size)
+        return self._pool
+
+    async def open(self):
+        await self.pool()
+
+    def is_transient(self, error: Exception) -> bool:
+        # Lost or refused connections, statement timeouts, and
+        # serialization failures/deadlocks (SQLSTATE class 40).
+        return isinstance(error, (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError,
+                                  asyncpg.TooManyConnectionsError, asyncpg.QueryCanceledError,
+                                  asyncpg.TransactionRollbackError))
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def insert_users(self, rows: List[dict]):
+        pool = await self.pool()
+        await pool.executemany(
+            "insert into users (id, email, username, role, preferences) "
+            "values ($1, $2, $3, $4, $5::jsonb) on conflict (id) do nothing",
+            [(r["id"], r["email"], r.get("username"), r.get("role", "user"), json.dumps(r.get("preferences") or {}))
+             for r in rows],
+        )
+
+    async def get_or_create_room(self, key: PairKey) -> str:
+        pool = await self.pool()
+        return str(await pool.fetchval("select get_or_create_room($1::uuid, $2::uuid)", *key))
+
+    async def get_room(self, room_id: str) -> Optional[dict]:
+        pool = await self.pool()
+        try:
+            record = await pool.fetchrow("select * from chat_rooms where id = $1::uuid", room_id)
+        except asyncpg.DataError:  # not a uuid
+            return None
+        return _row(record) if record else None
+
+    async def update_room_summaries(self, summaries: List[dict]):
+        pool = await self.pool()
+        await pool.execute(
+            "select update_room_summaries($1::uuid[], $2::bigint[], $3::uuid[], $4::text[], $5::timestamptz[])",
+            [s["room_id"] for s in summaries], [s["seq"] for s in summaries],
+            [s["sender_id"] for s in summaries], [s["preview"] for s in summaries],
+            [_timestamp(s["created_at"]) for s in summaries])
+
+    async def list_rooms(self, user_id: str, before: Optional[Sequence], limit: int) -> List[dict]:
+        pool = await self.pool()
+        before_at, before_id = before or (None, None)
+        records = await pool.fetch("select * from list_rooms($1::uuid, $2::timestamptz, $3::uuid, $4)",
+                                   user_id, _timestamp(before_at), before_id, limit)
+        return [_row(r) for r in records]
+
+    async def mark_read(self, marks: List[ReadMark]):
+        pool = await self.pool()
+        room_ids, user_ids, seqs = (list(column) for column in zip(*marks))
+        await pool.execute("select mark_rooms_read($1::uuid[], $2::uuid[], $3::bigint[])", room_ids, user_ids, seqs)
+
+    async def read_states(self, user_id: str) -> List[dict]:
+        pool = await self.pool()
+        records = await pool.fetch(
+            "select c.id as room_id, c.last_seq, coalesce(r.last_read_seq, 0) as last_read_seq "
+            "from chat_rooms c left join room_reads r on r.room_id = c.id and r.user_id = $1::uuid "
+            "where c.user1_id = $1::uuid or c.user2_id = $1::uuid", user_id)
+        return [_row(r) for r in records]
+
+    async def insert_messages(self, rows: List[dict]):
+        pool = await self.pool()
+        now = datetime.now().astimezone()
+        records = [(UUID(r["id"]) if r.get("id") else uuid4(), r["chat_room_id"], r["sender_id"], r["content"],
+                    r.get("message_type", "text"), r.get("is_read", False), r.get("seq"),
+                    _timestamp(r.get("created_at")) or now)
+                   for r in rows]
+        columns = ", ".join(COPY_COLUMNS)
+        # COPY can't skip conflicts: copy into a staging table, then move
+        # the rows whose id isn't stored yet, in one transaction.
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("create temporary table messages_incoming "
+                                   "(like messages including defaults) on commit drop")
+                await conn.copy_records_to_table("messages_incoming", records=records, columns=COPY_COLUMNS)
+                await conn.execute(f"insert into messages ({columns}) select {columns} from messages_incoming "
+                                   "on conflict (id) do nothing")
+
+    async def last_seq(self, room_id: str) -> int:
+        pool = await self.pool()
+        return await pool.fetchval(
+            "select coalesce(max(seq), 0) from messages where chat_room_id = $1::uuid", room_id)
+
+    async def messages_after(self, room_id: str, after: int, before: Optional[int], limit: int) -> List[dict]:
+        pool = await self.pool()
+        records = await pool.fetch(
+            "select seq, sender_id, content, created_at from messages "
+            "where chat_room_id = $1::uuid and seq > $2 and ($3::bigint is null or seq < $3) "
+            "order by seq limit $4",
+            room_id, after, before, limit)
+        return [_row(r) for r in records]
+
+    async def messages_page(self, room_id: str, before: Optional[Sequence], limit: int,
+                            columns: Sequence[str]) -> List[dict]:
+        pool = await self.pool()
+        select = ", ".join(c for c in columns if c in MESSAGE_COLUMNS)
+        if before is None:
+            records = await pool.fetch(
+                f"select {select} from messages where chat_room_id = $1::uuid "
+                "order by created_at desc, id desc limit $2",
+                room_id, limit)
+        else:
+            created_at, message_id = before
+            records = await pool.fetch(
+                f"select {select} from messages where chat_room_id = $1::uuid "
+                "and (created_at, id) < ($2, $3) "
+                "order by created_at desc, id desc limit $4",
+                room_id, _timestamp(created_at), message_id, limit)
+        return [_row(r) for r in records]
+
+    async def search_messages(self, user_id: str, query: str, room_id: Optional[str],
+                              before: Optional[Sequence], limit: int) -> List[dict]:
+        pool = await self.pool()
+        before_score, before_id = before or (None, None)
+        try:
+            records = await pool.fetch(
+                "select * from search_messages($1::uuid, $2, $3::uuid, $4::real, $5::uuid, $6)",
+                user_id, query, room_id, before_score, before_id, limit)
+        except asyncpg.DataError:  # room_id or cursor id is not a uuid
+            return []
+        return [_row(r) for r in records]
+
@@ -0,0 +1,188 @@
+from typing import List, Optional, Sequence
+from uuid import uuid4
+import httpx
+from core.gateway import gateway, GatewayError
+from core.repository.base import Repository, PairKey, ReadMark
+
+
+class SupabaseRepository(Repository):
+    """PostgREST over the shared async gateway."""
+
+    def is_transient(self, error: Exception) -> bool:
+        if isinstance(error, GatewayError):
+            # 4xx is PostgREST rejecting the request itself (bad value,
+            # constraint); 408/429 and 5xx are the service or a proxy.
+            return error.status_code in (408, 429) or error.status_code >= 500
+        return isinstance(error, (httpx.TransportError, OSError))
+
+    async def insert_users(self, rows: List[dict]):
+        # Existing ids are skipped, as in the other backends: one already
+        # stored user must not fail a whole bulk signup batch with a 409.
+        await gateway.upsert("users", rows, on_conflict="id", ignore_duplicates=True)
+
+    async def get_or_create_room(self, key: PairKey) -> str:
+        # get_or_create_room() comes from migrations/001; without it, fall
+        # back to one lookup covering both user orderings plus an insert
+        # that re-reads when it loses a creation race.
+        low, high = key
+        try:
+            return await gateway.rpc("get_or_create_room", {"a": low, "b": high})
+        except GatewayError as e:
+            if e.status_code != 404:
+                raise
+
+        room_id = await self._find_room(key)
+        if room_id:
+            return room_id
+        try:
+            await gateway.insert("chat_rooms", {"id": str(uuid4()), "user1_id": low, "user2_id": high})
+        except GatewayError as e:
+            if e.status_code != 409:
+                raise
+        return await self._find_room(key)
+
+    async def _find_room(self, key: PairKey) -> Optional[str]:
+        # Fixed eq filters only: ids never become part of a filter tree.
+        # Rooms created before pairs were stored in (low, high) order may
+        # hold the reverse, so that is checked second.
+        low, high = key
+        for user1, user2 in ((low, high), (high, low)):
+            rows = await gateway.select("chat_rooms", {"user1_id": f"eq.{user1}", "user2_id": f"eq.{user2}"},
+                                        columns="id", limit=1)
+            if rows:
+                return rows[0]["id"]
+        return None
+
+    async def get_room(self, room_id: str) -> Optional[dict]:
+        try:
+            rows = await gateway.select("chat_rooms", {"id": f"eq.{room_id}"}, limit=1)
+        except GatewayError as e:
+            if e.status_code != 400:  # not a uuid
+                raise
+            return None
+        return rows[0] if rows else None
+
+    async def update_room_summaries(self, summaries: List[dict]):
+        # update_room_summaries() comes from migrations/005; without it, one
+        # conditional PATCH per room keeps summaries from moving backwards.
+        try:
+            await gateway.rpc("update_room_summaries", {
+                "room_ids": [s["room_id"] for s in summaries],
+                "seqs": [s["seq"] for s in summaries],
+                "sender_ids": [s["sender_id"] for s in summaries],
+                "previews": [s["preview"] for s in summaries],
+                "sent_at": [s["created_at"] for s in summaries],
+            })
+            return
+        except GatewayError as e:
+            if e.status_code != 404:
+                raise
+        for s in summaries:
+            await gateway.update("chat_rooms", {
+                "last_seq": s["seq"],
+                "last_activity_at": s["created_at"],
+                "last_sender_id": s["sender_id"],
+                "last_message_preview": s["preview"],
+            }, {"id": f"eq.{s['room_id']}", "last_seq": f"lt.{s['seq']}"})
+
+    async def list_rooms(self, user_id: str, before: Optional[Sequence], limit: int) -> List[dict]:
+        before_at, before_id = before or (None, None)
+        try:
+            return await gateway.rpc("list_rooms", {"uid": user_id, "before_at": before_at,
+                                                    "before_id": before_id, "page_size": limit})
+        except GatewayError as e:
+            if e.status_code != 404:
+                raise
+        # Without the RPC: the rooms page, then the other participants and
+        # read watermarks for just that page.
+        condition = f"or(user1_id.eq.{user_id},user2_id.eq.{user_id})"
+        if before is not None:
+            condition += (f',or(last_activity_at.lt."{before_at}",'
+                          f'and(last_activity_at.eq."{before_at}",id.lt.{before_id}))')
+        rooms = await gateway.select("chat_rooms", {"and": f"({condition})"},
+                                     columns="id,user1_id,user2_id,last_seq,last_activity_at,last_sender_id,"
+                                             "last_message_preview",
+                                     order="last_activity_at.desc,id.desc", limit=limit)
+        if not rooms:
+            return []
+        others = {r["id"]: r["user2_id"] if r["user1_id"] == user_id else r["user1_id"] for r in rooms}
+        users = await gateway.select("users", {"id": f"in.({','.join(set(others.values()))})"},
+                                     columns="id,username")
+        reads = await gateway.select("room_reads", {"user_id": f"eq.{user_id}",
+                                                    "room_id": f"in.({','.join(others)})"},
+                                     columns="room_id,last_read_seq")
+        usernames = {u["id"]: u["username"] for u in users}
+        read = {r["room_id"]: r["last_read_seq"] for r in reads}
+        return [{
+            "id": r["id"],
+            "other_user_id": others[r["id"]],
+            "other_username": usernames.get(others[r["id"]]),
+            "last_seq": r.get("last_seq") or 0,
+            "last_activity_at": r["last_activity_at"],
+            "last_sender_id": r.get("last_sender_id"),
+            "last_message_preview": r.get("last_message_preview"),
+            "last_read_seq": read.get(r["id"], 0),
+        } for r in rooms]
+
+    async def mark_read(self, marks: List[ReadMark]):
+        room_ids, user_ids, seqs = (list(column) for column in zip(*marks))
+        try:
+            await gateway.rpc("mark_rooms_read", {"room_ids": room_ids, "user_ids": user_ids, "seqs": seqs})
+            return
+        except GatewayError as e:
+            if e.status_code != 404:
+                raise
+        # Plain upsert: can only move a watermark back if two workers race
+        await gateway.upsert("room_reads", [{"room_id": r, "user_id": u, "last_read_seq": s} for r, u, s in marks],
+                             on_conflict="room_id,user_id")
+
+    async def read_states(self, user_id: str) -> List[dict]:
+        rooms = await gateway.select("chat_rooms", {"or": f"(user1_id.eq.{user_id},user2_id.eq.{user_id})"},
+                                     columns="id,last_seq")
+        reads = await gateway.select("room_reads", {"user_id": f"eq.{user_id}"}, columns="room_id,last_read_seq")
+        read = {r["room_id"]: r["last_read_seq"] for r in reads}
+        return [{"room_id": r["id"], "last_seq": r.get("last_seq") or 0, "last_read_seq": read.get(r["id"], 0)}
+                for r in rooms]
+
+    async def insert_messages(self, rows: List[dict]):
+        await gateway.upsert("messages", rows, on_conflict="id", ignore_duplicates=True)
+
+    async def last_seq(self, room_id: str) -> int:
+        rows = await gateway.select("messages", {"chat_room_id": f"eq.{room_id}", "seq": "not.is.null"},
+                                    columns="seq", order="seq.desc", limit=1)
+        return rows[0]["seq"] if rows else 0
+
+    async def messages_after(self, room_id: str, after: int, before: Optional[int], limit: int) -> List[dict]:
+        filters = {"chat_room_id": f"eq.{room_id}"}
+        if before is None:
+            filters["seq"] = f"gt.{after}"
+        else:
+            filters["and"] = f"(seq.gt.{after},seq.lt.{before})"
+        return await gateway.select("messages", filters, columns="seq,sender_id,content,created_at",
+                                    order="seq.asc", limit=limit)
+
+    async def messages_page(self, room_id: str, before: Optional[Sequence], limit: int,
+                            columns: Sequence[str]) -> List[dict]:
+        filters = {"chat_room_id": f"eq.{room_id}"}
+        if before is not None:
+            created_at, message_id = before
+            filters["or"] = (f'(created_at.lt."{created_at}",'
+                             f'and(created_at.eq."{created_at}",id.lt.{message_id}))')
+        return await gateway.select("messages", filters, columns=",".join(columns),
+                                    order="created_at.desc,id.desc", limit=limit)
+
+    async def search_messages(self, user_id: str, query: str, room_id: Optional[str],
+                              before: Optional[Sequence], limit: int) -> List[dict]:
+        # Needs search_messages() from migrations/006: there is no fallback,
+        # since without the GIN index every search would scan messages.
+        before_score, before_id = before or (None, None)
+        try:
+            return await gateway.rpc("search_messages", {
+                "uid": user_id, "query": query, "room": room_id,
+                "before_score": before_score, "before_id": before_id, "page_size": limit,
+            })
+        except GatewayError as e:
+            if e.status_code == 404:
+                raise NotImplementedError("Message search needs migrations/006_message_search.sql")
+            raise
+
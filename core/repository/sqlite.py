@@ -0,0 +1,244 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+from uuid import uuid4
+from core import config
+from core.repository.base import Repository, PairKey, ReadMark, MESSAGE_COLUMNS, SNIPPET_START, SNIPPET_STOP
+
+SCHEMA = """
+create table if not exists users (
+    id text primary key,
+    email text not null,
+    username text,
+    role text,
+    preferences text,
+    created_at text
+);
+create table if not exists chat_rooms (
+    id text primary key,
+    user1_id text not null,
+    user2_id text not null,
+    created_at text,
+    last_seq integer not null default 0,
+    last_activity_at text,
+    last_sender_id text,
+    last_message_preview text,
+    unique (user1_id, user2_id)
+);
+create index if not exists chat_rooms_user1_activity on chat_rooms (user1_id, last_activity_at desc, id desc);
+create index if not exists chat_rooms_user2_activity on chat_rooms (user2_id, last_activity_at desc, id desc);
+create table if not exists room_reads (
+    room_id text not null,
+    user_id text not null,
+    last_read_seq integer not null default 0,
+    updated_at text,
+    primary key (room_id, user_id)
+);
+create index if not exists room_reads_user on room_reads (user_id);
+create table if not exists messages (
+    id text primary key,
+    chat_room_id text not null,
+    sender_id text not null,
+    content text not null,
+    message_type text,
+    is_read integer,
+    seq integer,
+    created_at text not null
+);
+create index if not exists messages_room_seq on messages (chat_room_id, seq);
+create index if not exists messages_room_created_id on messages (chat_room_id, created_at desc, id desc);
+create virtual table if not exists messages_fts using fts5(content, content='messages', content_rowid='rowid');
+-- Indexed in the same transaction as each inserted batch; messages are
+-- never updated or deleted.
+create trigger if not exists messages_fts_insert after insert on messages begin
+    insert into messages_fts (rowid, content) values (new.rowid, new.content);
+end;
+"""
+
+# chat_rooms columns added after the first release, for _add_columns
+ADDED_COLUMNS = (
+    ("last_seq", "integer not null default 0"),
+    ("last_activity_at", "text"),
+    ("last_sender_id", "text"),
+    ("last_message_preview", "text"),
+)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SqliteRepository(Repository):
+    """Offline backend for tests and benchmarks; ``:memory:`` by default.
+
+    Queries run inline on the event loop, which is fine for an in-memory or
+    local file database but not meant for production traffic.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or config.SQLITE_PATH
+        self.db = sqlite3.connect(self.path, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self._add_columns()
+        indexed = self.db.execute("select 1 from sqlite_master where name = 'messages_fts'").fetchone()
+        self.db.executescript(SCHEMA)
+        if not indexed:
+            self.db.execute("insert into messages_fts (messages_fts) values ('rebuild')")
+
+    def _add_columns(self):
+        # Databases created before a column was added to SCHEMA: create
+        # table if not exists leaves them as they were.
+        existing = {row["name"] for row in self.db.execute("pragma table_info(chat_rooms)")}
+        if not existing:
+            return
+        for column, definition in ADDED_COLUMNS:
+            if column not in existing:
+                self.db.execute(f"alter table chat_rooms add column {column} {definition}")
+        if "last_activity_at" not in existing:
+            self.db.execute("update chat_rooms set last_activity_at = created_at")
+
+    async def close(self):
+        self.db.close()
+
+    def is_transient(self, error: Exception) -> bool:
+        # A locked/busy database clears up; constraint and type errors don't.
+        return isinstance(error, sqlite3.OperationalError) and (
+            "locked" in str(error) or "busy" in str(error))
+
+    @contextmanager
+    def _transaction(self):
+        # One transaction per batch instead of one per row in autocommit mode
+        self.db.execute("begin")
+        try:
+            yield
+        except Exception:
+            self.db.execute("rollback")
+            raise
+        self.db.execute("commit")
+
+    async def insert_users(self, rows: List[dict]):
+        with self._transaction():
+            self.db.executemany(
+                "insert or ignore into users (id, email, username, role, preferences, created_at) "
+                "values (?, ?, ?, ?, ?, ?)",
+                [(r["id"], r["email"], r.get("username"), r.get("role", "user"),
+                  json.dumps(r.get("preferences") or {}), _now()) for r in rows])
+
+    async def get_or_create_room(self, key: PairKey) -> str:
+        low, high = key
+        now = _now()
+        self.db.execute("insert or ignore into chat_rooms (id, user1_id, user2_id, created_at, last_activity_at) "
+                        "values (?, ?, ?, ?, ?)", (str(uuid4()), low, high, now, now))
+        return self.db.execute("select id from chat_rooms where user1_id = ? and user2_id = ?", key).fetchone()[0]
+
+    async def get_room(self, room_id: str) -> Optional[dict]:
+        row = self.db.execute("select * from chat_rooms where id = ?", (room_id,)).fetchone()
+        return dict(row) if row else None
+
+    async def update_room_summaries(self, summaries: List[dict]):
+        with self._transaction():
+            self.db.executemany(
+                "update chat_rooms set last_seq = ?, last_activity_at = ?, last_sender_id = ?, "
+                "last_message_preview = ? where id = ? and last_seq < ?",
+                [(s["seq"], s["created_at"], s["sender_id"], s["preview"], s["room_id"], s["seq"])
+                 for s in summaries])
+
+    async def list_rooms(self, user_id: str, before: Optional[Sequence], limit: int) -> List[dict]:
+        before_at, before_id = before or (None, None)
+        side = ("select c.id, c.{other} as other_user_id, c.last_seq, c.last_activity_at, c.last_sender_id, "
+                "c.last_message_preview from chat_rooms c where c.{me} = :uid "
+                "and (:before_at is null or (c.last_activity_at, c.id) < (:before_at, :before_id)) "
+                "order by c.last_activity_at desc, c.id desc limit :limit")
+        rows = self.db.execute(
+            "select r.*, u.username as other_username, coalesce(rr.last_read_seq, 0) as last_read_seq from ("
+            f"select * from ({side.format(me='user1_id', other='user2_id')}) "
+            f"union all select * from ({side.format(me='user2_id', other='user1_id')})) r "
+            "left join users u on u.id = r.other_user_id "
+            "left join room_reads rr on rr.room_id = r.id and rr.user_id = :uid "
+            "order by r.last_activity_at desc, r.id desc limit :limit",
+            {"uid": user_id, "before_at": before_at, "before_id": before_id, "limit": limit})
+        return [dict(r) for r in rows]
+
+    async def mark_read(self, marks: List[ReadMark]):
+        now = _now()
+        with self._transaction():
+            self.db.executemany(
+                "insert into room_reads (room_id, user_id, last_read_seq, updated_at) values (?, ?, ?, ?) "
+                "on conflict (room_id, user_id) do update set "
+                "last_read_seq = max(last_read_seq, excluded.last_read_seq), updated_at = excluded.updated_at",
+                [(room_id, user_id, seq, now) for room_id, user_id, seq in marks])
+
+    async def read_states(self, user_id: str) -> List[dict]:
+        rows = self.db.execute(
+            "select c.id as room_id, c.last_seq, coalesce(r.last_read_seq, 0) as last_read_seq "
+            "from chat_rooms c left join room_reads r on r.room_id = c.id and r.user_id = ? "
+            "where c.user1_id = ? or c.user2_id = ?", (user_id, user_id, user_id))
+        return [dict(r) for r in rows]
+
+    async def insert_messages(self, rows: List[dict]):
+        now = _now()
+        with self._transaction():
+            self.db.executemany(
+                "insert or ignore into messages "
+                "(id, chat_room_id, sender_id, content, message_type, is_read, seq, created_at) "
+                "values (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(r.get("id") or str(uuid4()), r["chat_room_id"], r["sender_id"], r["content"],
+                  r.get("message_type", "text"), int(r.get("is_read", False)), r.get("seq"),
+                  r.get("created_at") or now) for r in rows])
+
+    async def last_seq(self, room_id: str) -> int:
+        return self.db.execute("select coalesce(max(seq), 0) from messages where chat_room_id = ?",
+                               (room_id,)).fetchone()[0]
+
+    async def messages_after(self, room_id: str, after: int, before: Optional[int], limit: int) -> List[dict]:
+        rows = self.db.execute(
+            "select seq, sender_id, content, created_at from messages "
+            "where chat_room_id = ? and seq > ? and (? is null or seq < ?) order by seq limit ?",
+            (room_id, after, before, before, limit))
+        return [dict(r) for r in rows]
+
+    async def messages_page(self, room_id: str, before: Optional[Sequence], limit: int,
+                            columns: Sequence[str]) -> List[dict]:
+        select = ", ".join(c for c in columns if c in MESSAGE_COLUMNS)
+        if before is None:
+            rows = self.db.execute(
+                f"select {select} from messages where chat_room_id = ? "
+                "order by created_at desc, id desc limit ?", (room_id, limit))
+        else:
+            created_at, message_id = before
+            rows = self.db.execute(
+                f"select {select} from messages where chat_room_id = ? "
+                "and (created_at < ? or (created_at = ? and id < ?)) "
+                "order by created_at desc, id desc limit ?",
+                (room_id, created_at, created_at, message_id, limit))
+        return [self._message(r) for r in rows]
+
+    async def search_messages(self, user_id: str, query: str, room_id: Optional[str],
+                              before: Optional[Sequence], limit: int) -> List[dict]:
+        # Every word as a quoted FTS5 string: all must match, and user input
+        # can't be read as query syntax. bm25 is lower-is-better, so negate it.
+        match = " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+        if not match:
+            return []
+        before_score, before_id = before or (None, None)
+        rows = self.db.execute(
+            "select * from ("
+            "select m.id, m.chat_room_id, m.sender_id, m.seq, m.created_at, -bm25(messages_fts) as score, "
+            "snippet(messages_fts, 0, :start, :stop, '…', 16) as snippet "
+            "from messages_fts join messages m on m.rowid = messages_fts.rowid "
+            "where messages_fts match :match and m.chat_room_id in ("
+            "select id from chat_rooms where (user1_id = :uid or user2_id = :uid) and (:room is null or id = :room))"
+            ") where :before_score is null or score < :before_score or (score = :before_score and id < :before_id) "
+            "order by score desc, id desc limit :limit",
+            {"match": match, "uid": user_id, "room": room_id, "before_score": before_score,
+             "before_id": before_id, "limit": limit, "start": SNIPPET_START, "stop": SNIPPET_STOP})
+        return [dict(r) for r in rows]
+
+    @staticmethod
+    def _message(row) -> dict:
+        message = dict(row)
+        if "is_read" in message:
+            message["is_read"] = bool(message["is_read"])
+        return message
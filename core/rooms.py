@@ -0,0 +1,122 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from core import config
+from core.concurrency import single_flight
+from core.repository import get_repository
+from core.repository.base import PairKey
+
+
+def pair_key(user_a: str, user_b: str) -> PairKey:
+    """Order-independent key for a two-user room."""
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+
+class RoomMembership:
+    """LRU/TTL cache of room_id -> its two members, used to authorize joins.
+
+    Warmed by ``RoomDirectory`` whenever it resolves a pair, so the usual
+    connect right after /room/get_or_create never reaches the backend.
+    Unknown rooms are remembered for ``negative_ttl`` so probing random ids
+    can't turn into a query per attempt.
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None, negative_ttl: float = None):
+        self.max_size = max_size or config.MEMBERSHIP_CACHE_SIZE
+        self.ttl = ttl or config.MEMBERSHIP_CACHE_TTL
+        self.negative_ttl = config.MEMBERSHIP_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+        self._rooms: "OrderedDict[str, Tuple[Optional[PairKey], float]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, room_id: str, members: Optional[PairKey]):
+        ttl = self.ttl if members is not None else self.negative_ttl
+        self._rooms[room_id] = (members, time.monotonic() + ttl)
+        self._rooms.move_to_end(room_id)
+        while len(self._rooms) > self.max_size:
+            self._rooms.popitem(last=False)
+
+    def invalidate(self, room_id: str):
+        self._rooms.pop(room_id, None)
+
+    async def members(self, room_id: str) -> Optional[PairKey]:
+        entry = self._rooms.get(room_id)
+        if entry is not None and entry[1] >= time.monotonic():
+            self._rooms.move_to_end(room_id)
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        return await single_flight(self._pending, room_id, lambda: self._load(room_id))
+
+    async def _load(self, room_id: str) -> Optional[PairKey]:
+        room = await get_repository().get_room(room_id)
+        members = pair_key(room["user1_id"], room["user2_id"]) if room else None
+        self.put(room_id, members)
+        return members
+
+    async def is_member(self, room_id: str, user_id: str) -> bool:
+        members = await self.members(room_id)
+        return members is not None and user_id in members
+
+
+class RoomDirectory:
+    """LRU/TTL cache of pair -> room_id in front of the repository.
+
+    Concurrent lookups for the same pair share one backend call.
+    """
+
+    def __init__(self, membership: RoomMembership = None, max_size: int = None, ttl: float = None):
+        self.membership = membership
+        self.max_size = max_size or config.ROOM_CACHE_SIZE
+        self.ttl = ttl or config.ROOM_CACHE_TTL
+        self._rooms: "OrderedDict[PairKey, Tuple[str, float]]" = OrderedDict()
+        self._pending: Dict[PairKey, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_a: str, user_b: str) -> Optional[str]:
+        key = pair_key(user_a, user_b)
+        entry = self._rooms.get(key)
+        if entry is None:
+            return None
+        room_id, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._rooms[key]
+            return None
+        self._rooms.move_to_end(key)
+        return room_id
+
+    def put(self, user_a: str, user_b: str, room_id: str):
+        key = pair_key(user_a, user_b)
+        self._rooms[key] = (room_id, time.monotonic() + self.ttl)
+        if self.membership is not None:
+            self.membership.put(room_id, key)
+        self._rooms.move_to_end(key)
+        while len(self._rooms) > self.max_size:
+            self._rooms.popitem(last=False)
+
+    def invalidate(self, user_a: str, user_b: str):
+        entry = self._rooms.pop(pair_key(user_a, user_b), None)
+        if entry is not None and self.membership is not None:
+            self.membership.invalidate(entry[0])
+
+    async def get_or_create(self, user_a: str, user_b: str) -> str:
+        room_id = self.get(user_a, user_b)
+        if room_id is not None:
+            self.hits += 1
+            return room_id
+        self.misses += 1
+
+        key = pair_key(user_a, user_b)
+        return await single_flight(self._pending, key, lambda: self._create(key))
+
+    async def _create(self, key: PairKey) -> str:
+        room_id = await get_repository().get_or_create_room(key)
+        self.put(*key, room_id)
+        return room_id
+
+
+room_membership = RoomMembership()
+room_directory = RoomDirectory(room_membership)
@@ -0,0 +1,99 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from core import config
+from core.gateway import gateway
+from core.metrics import TOKEN_CACHE
+from core.concurrency import single_flight
+
+
+def token_key(token: str) -> str:
+    # Tokens are credentials: only their hash is kept as a key.
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class SessionCache:
+    """Verified access tokens -> user, until the token's ``exp``.
+
+    Repeated verification of a live session (every API call, every
+    WebSocket reconnect) is a dict lookup instead of a signature check or a
+    GoTrue round trip. LRU-bounded to ``max_size`` sessions.
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or config.SESSION_CACHE_SIZE
+        self._sessions: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = token_key(token)
+        entry = self._sessions.get(key)
+        if entry is None:
+            TOKEN_CACHE.labels("session", "miss").inc()
+            return None
+        user, expires_at = entry
+        if expires_at <= time.time():
+            del self._sessions[key]
+            TOKEN_CACHE.labels("session", "expired").inc()
+            return None
+        self._sessions.move_to_end(key)
+        TOKEN_CACHE.labels("session", "hit").inc()
+        return user
+
+    def put(self, token: str, user: dict, expires_at: Optional[float]):
+        if not expires_at or expires_at <= time.time():
+            return
+        key = token_key(token)
+        self._sessions[key] = (user, expires_at)
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_size:
+            self._sessions.popitem(last=False)
+
+    def invalidate(self, token: str):
+        self._sessions.pop(token_key(token), None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class Refresher:
+    """Rotates sessions through GoTrue's refresh_token grant.
+
+    Refresh tokens are single use, so two tabs (or a retry) refreshing the
+    same token at once would make all but one fail. Concurrent refreshes of
+    a token share one GoTrue call, and a successful result is handed out
+    again for ``reuse_seconds`` to callers that were just too late.
+    """
+
+    def __init__(self, reuse_seconds: float = None):
+        self.reuse_seconds = config.REFRESH_REUSE_SECONDS if reuse_seconds is None else reuse_seconds
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._recent: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+
+    async def refresh(self, refresh_token: str) -> Tuple[int, dict]:
+        """GoTrue's status code and body for the refresh."""
+        key = token_key(refresh_token)
+        now = time.monotonic()
+        while self._recent and next(iter(self._recent.values()))[1] <= now:
+            self._recent.popitem(last=False)
+        recent = self._recent.get(key)
+        if recent is not None:
+            TOKEN_CACHE.labels("refresh", "hit").inc()
+            return 200, recent[0]
+        TOKEN_CACHE.labels("refresh", "miss").inc()
+        return await single_flight(self._pending, key, lambda: self._load(key, refresh_token))
+
+    async def _load(self, key: str, refresh_token: str) -> Tuple[int, dict]:
+        response = await gateway.refresh(refresh_token)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {"error": response.text}
+        if response.status_code == 200 and self.reuse_seconds:
+            self._recent[key] = (body, time.monotonic() + self.reuse_seconds)
+        return response.status_code, body
+
+
+session_cache = SessionCache()
+refresher = Refresher()
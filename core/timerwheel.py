@@ -0,0 +1,83 @@
+import asyncio
+import math
+from typing import Callable, Dict, Hashable, List, Optional
+from core.log import get_logger
+
+log = get_logger("chat")
+
+
+class TimerWheel:
+    """Hashed timer wheel run by a single task.
+
+    ``schedule(item, delay)`` files the item into the slot ``delay`` ticks
+    ahead (whole laps of the wheel are counted in ``rounds``); each tick the
+    task expires one slot and calls ``expire(item)``. Scheduling and
+    cancelling are O(1), and there is one sleeping task for any number of
+    timers instead of one per socket. Timers fire up to one tick late.
+    """
+
+    def __init__(self, expire: Callable[[Hashable], None], tick: float = 1.0, slots: int = 64):
+        self.expire = expire
+        self.tick = tick
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(slots)]
+        self._where: Dict[Hashable, int] = {}
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, item: Hashable, delay: float):
+        self.cancel(item)
+        ticks = max(1, math.ceil(delay / self.tick))
+        rounds, offset = divmod(ticks, len(self._slots))
+        if offset == 0:
+            rounds, offset = rounds - 1, len(self._slots)
+        slot = (self._cursor + offset) % len(self._slots)
+        self._slots[slot][item] = rounds
+        self._where[item] = slot
+
+    def cancel(self, item: Hashable):
+        slot = self._where.pop(item, None)
+        if slot is not None:
+            self._slots[slot].pop(item, None)
+
+    def __len__(self):
+        return len(self._where)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self._cursor = (self._cursor + 1) % len(self._slots)
+            self.advance()
+
+    def advance(self):
+        """Expire everything due in the current slot."""
+        slot = self._slots[self._cursor]
+        due = []
+        for item, rounds in list(slot.items()):
+            if rounds:
+                slot[item] = rounds - 1
+            else:
+                due.append(item)
+                del slot[item]
+                del self._where[item]
+        for item in due:
+            try:
+                self.expire(item)
+            except Exception:
+                # one bad callback must not stop the wheel
+                log.exception("timer_callback_failed")
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from typing import Dict, Optional
+import httpx
+from jose import jwt, JWTError, ExpiredSignatureError
+from core import config
+from core.gateway import gateway
+from core.metrics import TOKEN_CACHE
+
+SUPPORTED_ALGORITHMS = ("HS256", "RS256", "ES256")
+
+
+class TokenInvalid(Exception):
+    """The token was checked locally and rejected."""
+
+
+class KeyUnavailable(Exception):
+    """No local key can verify this token (unknown kid, nothing configured)."""
+
+
+class SigningKeys:
+    """HS256 project secret and/or JWKS keys, refreshed periodically.
+
+    The JWKS document is re-fetched every ``refresh_seconds`` and, at most
+    once per ``min_refetch_seconds``, when a token names an unknown ``kid``
+    (key rotation). Concurrent refreshes share a single fetch.
+    """
+
+    def __init__(self, secret: str = None, jwks_url: str = None,
+                 refresh_seconds: int = None, min_refetch_seconds: int = 30):
+        self.secret = secret
+        self.jwks_url = jwks_url
+        self.refresh_seconds = refresh_seconds or config.JWKS_REFRESH_SECONDS
+        self.min_refetch_seconds = min_refetch_seconds
+        self._keys: Dict[str, dict] = {}
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def warm(self):
+        """Fetch the JWKS ahead of the first token (no-op for HS256 only)."""
+        if self.jwks_url and not self._keys:
+            await self._refresh(self._fetched_at)
+
+    async def get(self, header: dict):
+        alg = header.get("alg")
+        if alg == "HS256":
+            if not self.secret:
+                raise KeyUnavailable("No JWT secret configured")
+            TOKEN_CACHE.labels("signing_key", "hit").inc()
+            return self.secret
+        if not self.jwks_url:
+            raise KeyUnavailable(f"No JWKS configured for {alg}")
+
+        kid = header.get("kid")
+        age = time.monotonic() - self._fetched_at
+        if age > self.refresh_seconds or (kid not in self._keys and age > self.min_refetch_seconds):
+            TOKEN_CACHE.labels("signing_key", "miss").inc()
+            try:
+                await self._refresh(self._fetched_at)
+            except httpx.HTTPError as e:
+                # Keep serving the keys we already have until JWKS is back.
+                if not self._keys:
+                    raise KeyUnavailable(f"JWKS fetch failed: {str(e)}")
+        key = self._keys.get(kid)
+        if key is None:
+            raise KeyUnavailable(f"Unknown signing key: {kid}")
+        TOKEN_CACHE.labels("signing_key", "hit").inc()
+        return key
+
+    async def _refresh(self, seen: float):
+        async with self._lock:
+            if self._fetched_at != seen:
+                return  # another caller refreshed while we waited
+            response = await gateway.request("GET", self.jwks_url, "auth", "jwks",
+                                             headers={"apikey": config.SUPABASE_KEY})
+            response.raise_for_status()
+            self._keys = {k.get("kid"): k for k in response.json().get("keys", [])}
+            self._fetched_at = time.monotonic()
+
+
+class LocalVerifier:
+    """Validates Supabase access tokens without calling GoTrue.
+
+    Returns a dict shaped like the ``/auth/v1/user`` response so callers can
+    keep using ``user["id"]`` and ``user["user_metadata"]["role"]``.
+    """
+
+    def __init__(self, keys: SigningKeys, audience: str = None, allowed_roles=None):
+        self.keys = keys
+        self.audience = audience or config.JWT_AUDIENCE
+        self.allowed_roles = set(allowed_roles or config.JWT_ALLOWED_ROLES)
+
+    async def verify(self, token: str) -> dict:
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise TokenInvalid(f"Malformed token: {str(e)}")
+        if header.get("alg") not in SUPPORTED_ALGORITHMS:
+            raise TokenInvalid(f"Unsupported algorithm: {header.get('alg')}")
+        key = await self.keys.get(header)
+        try:
+            claims = jwt.decode(token, key, algorithms=[header.get("alg")], audience=self.audience)
+        except ExpiredSignatureError:
+            raise TokenInvalid("Token expired")
+        except JWTError as e:
+            raise TokenInvalid(str(e))
+
+        user_metadata = claims.get("user_metadata") or {}
+        if user_metadata.get("role") not in self.allowed_roles:
+            raise TokenInvalid(f"Role not allowed: {user_metadata.get('role')}")
+        if not claims.get("sub"):
+            raise TokenInvalid("Token has no subject")
+
+        return {
+            "id": claims["sub"],
+            "aud": claims.get("aud"),
+            "role": claims.get("role"),
+            "email": claims.get("email"),
+            "phone": claims.get("phone"),
+            "app_metadata": claims.get("app_metadata") or {},
+            "user_metadata": user_metadata,
+            "session_id": claims.get("session_id"),
+            "exp": claims.get("exp"),
+        }
+
+
+_verifier: Optional[LocalVerifier] = None
+
+
+def get_local_verifier() -> LocalVerifier:
+    global _verifier
+    if _verifier is None:
+        _verifier = LocalVerifier(SigningKeys(config.SUPABASE_JWT_SECRET, config.SUPABASE_JWKS_URL))
+    return _verifier
@@ -1,19 +1,244 @@
+import asyncio
+import heapq
+import time
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Dict
+from core import config
+from core.backplane import Backplane, create_backplane
+from core.history import RoomHistory
+from core.envelope import Frame, MSGPACK_PROTOCOL
+from core.registry import Connection, ConnectionRegistry
+from core.timerwheel import TimerWheel
+from core.log import get_logger
+from core.metrics import (Gauge, Histogram, SIZE_BUCKETS, FANOUT_SECONDS, MESSAGES_BROADCAST,
+                          MESSAGES_DELIVERED, SEND_QUEUE_DROPPED, SLOW_CONSUMERS, CONNECTIONS_REAPED)
+
+log = get_logger("chat")
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+    def __init__(self, queue_size: int = None, overflow_policy: str = None, close_code: int = None,
+                 backplane: Backplane = None):
+        self.connections = ConnectionRegistry()
+        self.backplane = backplane or create_backplane(config.BACKPLANE_URL)
+        self.history = RoomHistory(self.backplane)
+        self._started = False
+        self.queue_size = queue_size or config.WS_SEND_QUEUE_SIZE
+        self.overflow_policy = overflow_policy or config.WS_OVERFLOW_POLICY
+        self.close_code = close_code or config.WS_SLOW_CONSUMER_CLOSE_CODE
+        if self.overflow_policy not in (DROP_OLDEST, DISCONNECT):
+            raise ValueError(f"Unknown overflow policy: {self.overflow_policy}")
+        self.idle_timeout = config.WS_IDLE_TIMEOUT
+        self.send_timeout = config.WS_SEND_TIMEOUT
+        self.heartbeat = TimerWheel(self._check_alive, config.WS_HEARTBEAT_TICK)
+        self.reaped: Dict[str, int] = {}
+
+    def register_metrics(self):
+        """Export connection counts and queue depths, computed at scrape time."""
+        Gauge("chat_connections", "Open chat sockets on this worker",
+              collect=lambda: [((), len(self.connections))])
+        Gauge("chat_room_connections", "Open sockets in the busiest rooms", ("room_id",),
+              collect=self._room_counts)
+        Histogram("chat_send_queue_depth", "Frames waiting in each socket's send queue",
+                  buckets=SIZE_BUCKETS, collect=self._queue_depths)
+
+    def _room_counts(self):
+        rooms = self.connections.room_sizes()
+        for room_id, count in heapq.nlargest(config.METRICS_MAX_ROOM_SERIES, rooms, key=lambda r: r[1]):
+            yield (room_id,), count
+
+    def _queue_depths(self):
+        for conn in self.connections:
+            yield conn.queue.qsize()
 
-    async def connect(self, room_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.setdefault(room_id, []).append(websocket)
+    async def start(self):
+        if not self._started:
+            self._started = True
+            try:
+                await self.backplane.start(self._fan_out, self._resubscribed)
+            except Exception:
+                self._started = False
+                raise
+            self.heartbeat.start()
 
-    def disconnect(self, room_id: str, websocket: WebSocket):
-        self.active_connections[room_id].remove(websocket)
-        if not self.active_connections[room_id]:
-            del self.active_connections[room_id]
+    async def close(self):
+        if self._started:
+            self._started = False
+            await self.heartbeat.close()
+            await self.backplane.close()
+
+    async def connect(self, room_id: str, websocket: WebSocket, user_id: str = None,
+                      since: int = None, subprotocol: str = None) -> Connection:
+        await self.start()
+        await websocket.accept(subprotocol=subprotocol)
+        conn = Connection(websocket, room_id, user_id, self.queue_size, subprotocol == MSGPACK_PROTOCOL)
+        conn.writer = asyncio.create_task(self._writer(conn, since))
+        if self.connections.add(conn):
+            self.backplane.subscribe(room_id)
+        self._schedule_check(conn, 0.0)
+        return conn
+
+    def disconnect(self, conn: Connection):
+        # Safe to call more than once: the writer may already have dropped
+        # the connection after a failed send or a slow-consumer close.
+        self._detach(conn)
+
+    def disconnect_user(self, user_id: str, code: int = 1008) -> int:
+        """Close every socket the user has on this worker (e.g. to kick them)."""
+        conns = self.connections.user(user_id)
+        for conn in conns:
+            self._detach(conn)
+            asyncio.create_task(self._close(conn.websocket, code))
+        return len(conns)
+
+    def send(self, conn: Connection, message: str):
+        """Queue a plain-text frame (e.g. "pong") for one socket."""
+        # Carries its value: MessagePack clients get it packed as a string.
+        self._enqueue(conn, Frame(message, value=message))
+
+    def send_to_user(self, user_id: str, message: str) -> int:
+        """Queue a frame for all of the user's sockets on this worker."""
+        conns = self.connections.user(user_id)
+        for conn in conns:
+            self._enqueue(conn, Frame(message, value=message))
+        return len(conns)
 
     async def broadcast(self, room_id: str, message: str):
-        for conn in self.active_connections.get(room_id, []):
-            await conn.send_text(message)
\ No newline at end of file
+        # Published once; every worker with sockets in the room (this one
+        # included) receives it back through _fan_out.
+        await self.backplane.publish(room_id, message)
+
+    def _fan_out(self, room_id: str, message: str):
+        # Only enqueues; each connection's writer does the actual send, so a
+        # stalled socket never delays delivery to the rest of the room. The
+        # message is parsed once and the same Frame goes to every socket.
+        started = time.perf_counter()
+        frame = Frame.parse(message)
+        self.history.record(room_id, frame)
+        conns = self.connections.room(room_id)
+        for conn in conns:
+            self._enqueue(conn, frame)
+        MESSAGES_BROADCAST.inc()
+        MESSAGES_DELIVERED.inc(len(conns))
+        FANOUT_SECONDS.observe(time.perf_counter() - started)
+
+    def _resubscribed(self):
+        # The backplane was disconnected: room buffers may be missing
+        # messages, so replays read storage until they fill up again.
+        log.warning("backplane_reconnected", rooms=self.history.clear())
+
+    def _enqueue(self, conn: Connection, frame: Frame):
+        if conn.closed:
+            return
+        try:
+            conn.queue.put_nowait(frame)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if self.overflow_policy == DROP_OLDEST:
+            conn.queue.get_nowait()
+            conn.queue.put_nowait(frame)
+            conn.dropped += 1
+            SEND_QUEUE_DROPPED.inc()
+        else:
+            SLOW_CONSUMERS.inc()
+            self._detach(conn)
+            asyncio.create_task(self._close(conn.websocket, self.close_code))
+
+    async def _writer(self, conn: Connection, since: int = None):
+        try:
+            if since is not None:
+                try:
+                    frames = await self.history.replay(conn.room_id, since)
+                except Exception as e:
+                    # Without the replay the client would silently miss
+                    # messages: close so it reconnects and retries.
+                    log.warning("replay_failed", room_id=conn.room_id, user_id=conn.user_id, since=since,
+                                error=str(e))
+                    self._detach(conn)
+                    await self._close(conn.websocket, 1011)
+                    return
+                # Anything broadcast meanwhile is both in the replay and in
+                # the queue; the queued copy is skipped below.
+                for frame in frames:
+                    await self._send(conn, frame)
+                    if frame.seq is not None:
+                        conn.skip_upto = max(conn.skip_upto, frame.seq)
+            while True:
+                frame = await conn.queue.get()
+                if frame.seq is not None and frame.seq <= conn.skip_upto:
+                    continue
+                conn.sending_since = time.monotonic()
+                await self._send(conn, frame)
+                conn.sending_since = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Usually a dead socket, but not always (e.g. a frame that can't
+            # be encoded): close it too, so the client isn't left connected
+            # to a socket nothing sends to. The receive loop will notice.
+            log.info("ws_send_failed", room_id=conn.room_id, user_id=conn.user_id, error=str(e))
+            self._detach(conn)
+            await self._close(conn.websocket, 1011)
+
+    @staticmethod
+    async def _send(conn: Connection, frame: Frame):
+        if conn.binary:
+            await conn.websocket.send_bytes(frame.binary)
+        else:
+            await conn.websocket.send_text(frame.text)
+        conn.sent += 1
+        if frame.seq is not None and frame.seq > conn.last_sent_seq:
+            conn.last_sent_seq = frame.seq
+
+    def _detach(self, conn: Connection):
+        if conn.closed:
+            return
+        conn.closed = True
+        self.heartbeat.cancel(conn)
+        if self.connections.remove(conn):
+            self.backplane.unsubscribe(conn.room_id)
+            self.history.forget(conn.room_id)
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+
+    # Heartbeat. Protocol-level ping/pong is answered by the ASGI server
+    # (uvicorn --ws-ping-interval/--ws-ping-timeout), which closes sockets
+    # whose peer stops responding. On top of that one shared timer wheel
+    # checks every connection for a send that has been blocked longer than
+    # WS_SEND_TIMEOUT (a peer that stopped reading) and, if WS_IDLE_TIMEOUT
+    # is set, for clients that have sent nothing for that long.
+
+    def _schedule_check(self, conn: Connection, elapsed: float):
+        delays = [self.send_timeout]
+        if self.idle_timeout:
+            delays.append(self.idle_timeout - elapsed)
+        self.heartbeat.schedule(conn, max(min(delays), self.heartbeat.tick))
+
+    def _check_alive(self, conn: Connection):
+        if conn.closed:
+            return
+        now = time.monotonic()
+        if conn.sending_since is not None and now - conn.sending_since >= self.send_timeout:
+            self._reap(conn, "send_stalled")
+        elif self.idle_timeout and now - conn.last_seen >= self.idle_timeout:
+            self._reap(conn, "idle")
+        else:
+            self._schedule_check(conn, now - conn.last_seen)
+
+    def _reap(self, conn: Connection, reason: str):
+        self.reaped[reason] = self.reaped.get(reason, 0) + 1
+        CONNECTIONS_REAPED.labels(reason).inc()
+        self._detach(conn)
+        asyncio.create_task(self._close(conn.websocket, 1001))
+
+    @staticmethod
+    async def _close(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
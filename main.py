@@ -1,10 +1,66 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from core import config
+from core.gateway import gateway
+from core.log import get_logger
+from core.receipts import read_receipts
+from core.repository import get_repository, close_repository
+from core.tokens import get_local_verifier
 from routes.auth import router as auth_router
-from routes.chat import router as chat_router
+from routes.chat import router as chat_router, manager, message_writer, admission
 from routes.room import router as room_router
+from routes.health import router as health_router
+from routes.metrics import router as metrics_router
 
-app = FastAPI()
+log = get_logger("chat")
+
+
+async def warm():
+    """Open clients before the first request instead of on it.
+
+    Everything here is also created lazily, so a step that fails (database
+    or Redis still starting) is logged and retried on first use.
+    """
+    steps = [("repository", get_repository().open), ("backplane", manager.start)]
+    if config.AUTH_VERIFY_MODE == "local":
+        steps.append(("signing_keys", get_local_verifier().keys.warm))
+    for name, step in steps:
+        try:
+            await step()
+        except Exception as e:
+            log.warning("startup_warm_failed", step=name, error=str(e))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.draining = False
+    await warm()
+    app.state.ready = True
+    yield
+    app.state.ready = False
+    app.state.draining = True
+    # The server has closed the sockets by now: stop the backplane and
+    # heartbeat, then drain the write-behind buffers before the clients
+    # they write through go away.
+    await manager.close()
+    await message_writer.close()
+    await read_receipts.close()
+    await admission.close()
+    await close_repository()
+    await gateway.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(auth_router, prefix="/auth")
 app.include_router(room_router, prefix="/room")
 app.include_router(chat_router, prefix="/chat")
+app.include_router(health_router, prefix="/health")
+app.include_router(metrics_router)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("main:app", host="0.0.0.0", port=8000,
+                ws_ping_interval=config.WS_PING_INTERVAL, ws_ping_timeout=config.WS_PING_TIMEOUT,
+                ws_per_message_deflate=config.WS_PER_MESSAGE_DEFLATE)
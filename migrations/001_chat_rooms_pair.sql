@@ -0,0 +1,57 @@
+-- Merge rooms that were already duplicated before the index existed: the
+-- oldest room of each pair is kept, the others' messages are moved into it
+-- and the others are deleted. To see what will be merged first:
+--
+--     select least(user1_id, user2_id), greatest(user1_id, user2_id), count(*)
+--       from chat_rooms group by 1, 2 having count(*) > 1;
+create temporary table chat_room_duplicates as
+select id, keep_id
+  from (select id, first_value(id) over (partition by least(user1_id, user2_id), greatest(user1_id, user2_id)
+                                          order by created_at, id) as keep_id
+          from chat_rooms) r
+ where id <> keep_id;
+
+update messages m
+   set chat_room_id = d.keep_id
+  from chat_room_duplicates d
+ where m.chat_room_id = d.id;
+
+delete from chat_rooms c
+ using chat_room_duplicates d
+ where c.id = d.id;
+
+drop table chat_room_duplicates;
+
+-- One room per unordered user pair, enforced by the database so two users
+-- opening a chat at the same moment cannot create duplicates.
+create unique index if not exists chat_rooms_pair_key
+    on chat_rooms ((least(user1_id, user2_id)), (greatest(user1_id, user2_id)));
+
+-- Resolve or create the room for a pair in a single round trip.
+create or replace function get_or_create_room(a uuid, b uuid)
+returns uuid
+language plpgsql
+as $$
+declare
+    rid uuid;
+begin
+    select id into rid from chat_rooms
+     where least(user1_id, user2_id) = least(a, b)
+       and greatest(user1_id, user2_id) = greatest(a, b)
+     limit 1;
+    if rid is null then
+        insert into chat_rooms (id, user1_id, user2_id)
+        values (gen_random_uuid(), least(a, b), greatest(a, b))
+        on conflict ((least(user1_id, user2_id)), (greatest(user1_id, user2_id))) do nothing
+        returning id into rid;
+    end if;
+    if rid is null then
+        -- lost the race to a concurrent insert
+        select id into rid from chat_rooms
+         where least(user1_id, user2_id) = least(a, b)
+           and greatest(user1_id, user2_id) = greatest(a, b)
+         limit 1;
+    end if;
+    return rid;
+end;
+$$;
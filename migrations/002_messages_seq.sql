@@ -0,0 +1,6 @@
+-- Per-room sequence number stamped on every broadcast, used to resume a
+-- reconnecting client from the last message it saw.
+alter table messages add column if not exists seq bigint;
+
+create index if not exists messages_room_seq
+    on messages (chat_room_id, seq);
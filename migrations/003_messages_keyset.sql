@@ -0,0 +1,5 @@
+-- Keyset pagination for GET /chat/rooms/{room_id}/messages: pages are read
+-- newest first by (created_at, id) within a room, so each page is a single
+-- index range scan no matter how far back the client has scrolled.
+create index if not exists messages_room_created_id
+    on messages (chat_room_id, created_at desc, id desc);
@@ -0,0 +1,37 @@
+-- Read watermarks: each user's last read seq per room. Unread count for a
+-- room is chat_rooms.last_seq - room_reads.last_read_seq, so counting never
+-- touches messages. Both values only move forward.
+alter table chat_rooms add column if not exists last_seq bigint not null default 0;
+
+create table if not exists room_reads (
+    room_id uuid not null references chat_rooms (id) on delete cascade,
+    user_id uuid not null,
+    last_read_seq bigint not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (room_id, user_id)
+);
+
+create index if not exists room_reads_user on room_reads (user_id);
+
+-- Batched from the message write path: one call per flush.
+create or replace function advance_room_seq(room_ids uuid[], seqs bigint[])
+returns void
+language sql
+as $$
+    update chat_rooms c
+       set last_seq = v.seq
+      from unnest(room_ids, seqs) as v(id, seq)
+     where c.id = v.id and c.last_seq < v.seq;
+$$;
+
+-- Batched read receipts; a late, smaller watermark never moves one back.
+create or replace function mark_rooms_read(room_ids uuid[], user_ids uuid[], seqs bigint[])
+returns void
+language sql
+as $$
+    insert into room_reads (room_id, user_id, last_read_seq)
+    select * from unnest(room_ids, user_ids, seqs)
+    on conflict (room_id, user_id) do update
+       set last_read_seq = greatest(room_reads.last_read_seq, excluded.last_read_seq),
+           updated_at = now();
+$$;
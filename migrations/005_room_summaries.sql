@@ -0,0 +1,78 @@
+-- Inbox: each room carries a summary of its latest message, kept current by
+-- the batched message write path, so listing a user's rooms is one indexed
+-- read instead of a latest-message query per room.
+alter table chat_rooms
+    add column if not exists last_activity_at timestamptz,
+    add column if not exists last_sender_id uuid,
+    add column if not exists last_message_preview text;
+
+-- Backfill from existing messages, then from the room's creation time.
+update chat_rooms c
+   set last_seq = greatest(c.last_seq, coalesce(m.seq, 0)),
+       last_activity_at = m.created_at,
+       last_sender_id = m.sender_id,
+       last_message_preview = left(m.content, 120)
+  from (select distinct on (chat_room_id) chat_room_id, seq, created_at, sender_id, content
+          from messages
+         order by chat_room_id, created_at desc, id desc) m
+ where c.id = m.chat_room_id;
+
+update chat_rooms set last_activity_at = coalesce(created_at, now()) where last_activity_at is null;
+
+alter table chat_rooms
+    alter column last_activity_at set default now(),
+    alter column last_activity_at set not null;
+
+-- A user is either side of a pair: one index per side, each in inbox order.
+create index if not exists chat_rooms_user1_activity on chat_rooms (user1_id, last_activity_at desc, id desc);
+create index if not exists chat_rooms_user2_activity on chat_rooms (user2_id, last_activity_at desc, id desc);
+
+-- Batched from the message write path: one call per flush, with the latest
+-- message of each room in it. Replaces advance_room_seq from 004.
+create or replace function update_room_summaries(room_ids uuid[], seqs bigint[], sender_ids uuid[],
+                                                 previews text[], sent_at timestamptz[])
+returns void
+language sql
+as $$
+    update chat_rooms c
+       set last_seq = v.seq,
+           last_activity_at = v.sent_at,
+           last_sender_id = v.sender_id,
+           last_message_preview = v.preview
+      from unnest(room_ids, seqs, sender_ids, previews, sent_at) as v(id, seq, sender_id, preview, sent_at)
+     where c.id = v.id and c.last_seq < v.seq;
+$$;
+
+drop function if exists advance_room_seq(uuid[], bigint[]);
+
+-- One page of a user's inbox, most recent activity first. Each side of the
+-- pair is read from its own index and the two are merged, so the cost is
+-- two short index scans whatever the number of rooms.
+create or replace function list_rooms(uid uuid, before_at timestamptz, before_id uuid, page_size int)
+returns table (id uuid, other_user_id uuid, other_username text, last_seq bigint,
+               last_activity_at timestamptz, last_sender_id uuid, last_message_preview text,
+               last_read_seq bigint)
+language sql
+stable
+as $$
+    select r.id, r.other_user_id, u.username, r.last_seq, r.last_activity_at, r.last_sender_id,
+           r.last_message_preview, coalesce(rr.last_read_seq, 0)
+      from ((select c.id, c.user2_id as other_user_id, c.last_seq, c.last_activity_at, c.last_sender_id,
+                    c.last_message_preview
+               from chat_rooms c
+              where c.user1_id = uid
+                and (before_at is null or (c.last_activity_at, c.id) < (before_at, before_id))
+              order by c.last_activity_at desc, c.id desc
+              limit page_size)
+            union all
+            (select c.id, c.user1_id, c.last_seq, c.last_activity_at, c.last_sender_id, c.last_message_preview
+               from chat_rooms c
+              where c.user2_id = uid
+                and (before_at is null or (c.last_activity_at, c.id) < (before_at, before_id))
+              order by c.last_activity_at desc, c.id desc
+              limit page_size)) r
+      left join users u on u.id = r.other_user_id
+      left join room_reads rr on rr.room_id = r.id and rr.user_id = uid
+     order by r.last_activity_at desc, r.id desc
+     limit page_size;
+$$;
@@ -0,0 +1,42 @@
+-- Full-text search over messages. The tsvector is a stored generated
+-- column, so it is computed by the same insert (COPY) that persists each
+-- batch, and the GIN index is maintained incrementally with it. 'simple'
+-- lowercases without stemming, which suits mixed-language chat.
+-- Adding the column rewrites messages once; run it off-peak.
+alter table messages
+    add column if not exists search tsvector
+    generated always as (to_tsvector('simple', content)) stored;
+
+create index if not exists messages_search on messages using gin (search);
+
+-- One page of hits in the user's rooms (or one of them), best first.
+-- Pages continue after (before_score, before_id). Snippets are built only
+-- for the returned page, with chr(2)/chr(3) around matches so the app can
+-- escape the text before adding its own highlight markup.
+create or replace function search_messages(uid uuid, query text, room uuid, before_score real,
+                                           before_id uuid, page_size int)
+returns table (id uuid, chat_room_id uuid, sender_id uuid, seq bigint, created_at timestamptz,
+               score real, snippet text)
+language sql
+stable
+as $$
+    with q as (
+        select websearch_to_tsquery('simple', query) as tsq
+    ), page as (
+        select m.id, m.chat_room_id, m.sender_id, m.seq, m.created_at, m.content,
+               ts_rank(m.search, q.tsq) as score
+          from messages m, q
+         where m.search @@ q.tsq
+           and m.chat_room_id in (select c.id from chat_rooms c
+                                   where (c.user1_id = uid or c.user2_id = uid)
+                                     and (room is null or c.id = room))
+           and (before_score is null or (ts_rank(m.search, q.tsq), m.id) < (before_score, before_id))
+         order by score desc, m.id desc
+         limit page_size
+    )
+    select p.id, p.chat_room_id, p.sender_id, p.seq, p.created_at, p.score,
+           ts_headline('simple', p.content, q.tsq,
+                       'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=20, MinWords=5, MaxFragments=2')
+      from page p, q
+     order by p.score desc, p.id desc;
+$$;
@@ -1,12 +1,19 @@
+import asyncio
+from collections import Counter
 from fastapi import APIRouter, Request, HTTPException, Depends
 from fastapi.responses import JSONResponse
-from core.supabase import signup_user, login_user, supabase
+from core import config
+from core.supabase import signup_user, login_user
+from core.repository import get_repository
+from core.sessions import refresher
 from datetime import datetime, timedelta, timezone
 from core.dependencies import verify_request_token
+from core.log import get_logger
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  
 
 router = APIRouter()
+log = get_logger("auth")
 
 @router.post("/signup")
 async def signup(request: Request):
@@ -17,28 +24,117 @@ async def signup(request: Request):
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password required")
 
-    res = signup_user(email, password)
+    res = await signup_user(email, password)
     if res.status_code == 200:
-        user_id = res.json()["user"]["id"]
-        # Extract username from email (everything before @)
-        username = email.split('@')[0]
-        supabase.table("users").insert({
-            "id": user_id, 
-            "email": email, 
-            "username": username,
-            "role": "user",
-            "preferences": {}  # Initialize empty JSON object
-            # Other columns will use their default values:
-            # created_at: now()
-            # updated_at: now()
-            # body_type: NULL
-            # skin_tone: NULL
-            # latitude: NULL
-            # longitude: NULL
-        }).execute()
+        await get_repository().insert_users([user_row(signed_up_id(res), email)])
         return {"message": "Signup successful"}
+    log.info("signup_failed", status=res.status_code)
     raise HTTPException(status_code=400, detail=res.text)
 
+def signed_up_id(res) -> str:
+    # GoTrue nests the user under "user" when it returns a session, and
+    # returns the bare user when email confirmation is required.
+    data = res.json()
+    return (data.get("user") or data)["id"]
+
+def user_row(user_id: str, email: str, role: str = "user") -> dict:
+    return {
+        "id": user_id,
+        "email": email,
+        # Extract username from email (everything before @)
+        "username": email.split('@')[0],
+        "role": role,
+        "preferences": {}  # Initialize empty JSON object
+        # Other columns will use their default values:
+        # created_at: now()
+        # updated_at: now()
+        # body_type: NULL
+        # skin_tone: NULL
+        # latitude: NULL
+        # longitude: NULL
+    }
+
+def is_admin(user: dict) -> bool:
+    # app_metadata can only be written with the service role key;
+    # user_metadata is editable by the user and is not checked here.
+    app_metadata = user.get("app_metadata") or {}
+    user_id = user.get("id") or user.get("sub") or user.get("user_id")
+    return app_metadata.get("role") == "admin" or user_id in config.ADMIN_USER_IDS
+
+@router.post("/bulk_signup")
+async def bulk_signup(request: Request, user=Depends(verify_request_token)):
+    """Create many accounts at once (admin only).
+
+    Body: {"users": [{"email", "password", "role"?}, ...]}. GoTrue signups
+    run BULK_SIGNUP_CONCURRENCY at a time and the users rows are inserted in
+    batches. Returns one result per item, in request order.
+    """
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin role required")
+    body = await request.json()
+    items = body.get("users") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="users must be a non-empty list")
+    if len(items) > config.BULK_SIGNUP_MAX_USERS:
+        raise HTTPException(status_code=413, detail=f"At most {config.BULK_SIGNUP_MAX_USERS} users per request")
+
+    results = [None] * len(items)
+    todo, seen = [], set()
+    for i, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        email, password, role = item.get("email"), item.get("password"), item.get("role", "user")
+        if not email or not password:
+            results[i] = {"email": email, "status": "invalid", "error": "Email and password required"}
+        elif role not in config.JWT_ALLOWED_ROLES:
+            results[i] = {"email": email, "status": "invalid", "error": f"Role not allowed: {role}"}
+        elif email in seen:
+            results[i] = {"email": email, "status": "invalid", "error": "Email repeated in this request"}
+        else:
+            seen.add(email)
+            todo.append((i, email, password, role))
+
+    created = []
+    pending = iter(todo)
+
+    async def sign_up():
+        # Each worker pulls the next item, so at most BULK_SIGNUP_CONCURRENCY
+        # signups are in flight however large the request is.
+        for i, email, password, role in pending:
+            try:
+                res = await signup_user(email, password, role)
+            except Exception as e:
+                results[i] = {"email": email, "status": "failed", "error": str(e)}
+                continue
+            if res.status_code != 200:
+                results[i] = {"email": email, "status": "failed", "error": res.text}
+                continue
+            try:
+                user_id = signed_up_id(res)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                log.warning("bulk_signup_bad_response", status=res.status_code, error=str(e))
+                results[i] = {"email": email, "status": "failed", "error": "Unexpected signup response"}
+                continue
+            results[i] = {"email": email, "status": "created", "user_id": user_id}
+            created.append((i, user_row(user_id, email, role)))
+
+    await asyncio.gather(*(sign_up() for _ in range(min(config.BULK_SIGNUP_CONCURRENCY, len(todo)))))
+
+    repository = get_repository()
+    size = config.BULK_SIGNUP_BATCH_SIZE
+    for start in range(0, len(created), size):
+        batch = created[start:start + size]
+        try:
+            await repository.insert_users([row for _, row in batch])
+        except Exception as e:
+            log.warning("bulk_signup_insert_failed", rows=len(batch), error=str(e))
+            for i, _ in batch:
+                results[i].update(status="failed", error=f"Account created but users insert failed: {str(e)}")
+
+    counts = Counter(r["status"] for r in results)
+    log.info("bulk_signup", requested=len(items), created=counts["created"], failed=counts["failed"],
+             invalid=counts["invalid"])
+    return {"created": counts["created"], "failed": counts["failed"] + counts["invalid"], "results": results}
+
 @router.get("/user")
 async def get_user(user=Depends(verify_request_token)):
     """Get current user information"""
@@ -52,28 +148,50 @@ async def login(request: Request):
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password required")
 
-    res = login_user(email, password)
+    res = await login_user(email, password)
     if res.status_code == 200:
-        tokens = res.json()
-        user_id = tokens.get("user", {}).get("id")
-        
-        response = JSONResponse(content={
-            "message": "Login successful",
-            "user_id": user_id
-        })
-        expires = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-
-        response.set_cookie(
-            key="access_token",
-            value=tokens["access_token"],
-            httponly=True,
-            expires=expires
-        )
-        response.set_cookie(
-            key="refresh_token",
-            value=tokens["refresh_token"],
-            httponly=True
-        )
-        return response
+        return session_response("Login successful", res.json())
 
+    log.info("login_failed", status=res.status_code)
     raise HTTPException(status_code=400, detail=res.text)
+
+@router.post("/refresh")
+async def refresh(request: Request):
+    """Rotate the session: a new access and refresh token for a refresh token.
+
+    The refresh token comes from the body ({"refresh_token": ...}) or the
+    refresh_token cookie set by login.
+    """
+    body = await request.json() if await request.body() else {}
+    refresh_token = body.get("refresh_token") if isinstance(body, dict) else None
+    refresh_token = refresh_token or request.cookies.get("refresh_token")
+    if not refresh_token:
+        raise HTTPException(status_code=400, detail="Refresh token required")
+
+    status, tokens = await refresher.refresh(refresh_token)
+    if status == 200:
+        return session_response("Token refreshed", tokens)
+
+    log.info("refresh_failed", status=status)
+    raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+
+def session_response(message: str, tokens: dict) -> JSONResponse:
+    """Body plus the access_token/refresh_token cookies for a GoTrue session."""
+    response = JSONResponse(content={
+        "message": message,
+        "user_id": tokens.get("user", {}).get("id")
+    })
+    expires = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    response.set_cookie(
+        key="access_token",
+        value=tokens["access_token"],
+        httponly=True,
+        expires=expires
+    )
+    response.set_cookie(
+        key="refresh_token",
+        value=tokens["refresh_token"],
+        httponly=True
+    )
+    return response
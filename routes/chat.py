@@ -1,67 +1,335 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from core.dependencies import verify_token_direct
+import html
+from uuid import uuid4
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect, Query, Depends, HTTPException
+from core import config
+from core.cursors import encode_cursor, decode_cursor, number_field, timestamp_field, uuid_field
+from core.dependencies import verify_token_direct, verify_request_token
 from core.ws_manager import ConnectionManager
-from core.supabase import supabase
+from core.admission import AdmissionControl, Rejected
+from core.history import now_iso
+from core.envelope import MAX_SEQ, make_envelope, choose_subprotocol, read_inbound, read_receipt
+from core.persistence import MessageWriter
+from core.receipts import read_receipts
+from core.metrics import MESSAGES_RECEIVED, OVERSIZED_FRAMES
+from core.ratelimit import TokenBucketLimiter, MessageLimits, ALLOW, CLOSE
+from core.log import get_logger
+from core.repository import get_repository, MESSAGE_COLUMNS, SNIPPET_START, SNIPPET_STOP
+from core.rooms import room_membership
 
 router = APIRouter()
+log = get_logger("chat")
 manager = ConnectionManager()
+manager.register_metrics()
+admission = AdmissionControl(manager)
+admission.register_metrics()
 
-@router.websocket("/ws/chat/{room_id}")
-async def chat_ws(websocket: WebSocket, room_id: str, token: str = Query(None)):
-    print(f"WebSocket connection attempt for room: {room_id}")
-    
-    if not token:
-        print("No token provided, closing connection")
-        await websocket.close(code=1008)
-        return
+async def persist_messages(rows):
+    repository = get_repository()
+    await repository.insert_messages(rows)
+    # Keep each room's summary (last_seq for unread counts, latest message
+    # for the inbox) current: one write per batch with the newest message of
+    # each room. Not retried with the batch (that would insert the messages
+    # twice); the next batch for the room moves it forward anyway.
+    latest = {}
+    for row in rows:
+        if row.get("seq") and row["seq"] > latest.get(row["chat_room_id"], {}).get("seq", 0):
+            latest[row["chat_room_id"]] = row
+    if latest:
+        try:
+            await repository.update_room_summaries([{
+                "room_id": room_id,
+                "seq": row["seq"],
+                "sender_id": row["sender_id"],
+                "preview": row["content"][:config.ROOM_PREVIEW_CHARS],
+                "created_at": row["created_at"],
+            } for room_id, row in latest.items()])
+        except Exception as e:
+            log.warning("room_summary_update_failed", rooms=len(latest), error=str(e))
+
+message_writer = MessageWriter(persist_messages, transient=lambda error: get_repository().is_transient(error))
+
+message_limits = MessageLimits(
+    TokenBucketLimiter(config.WS_RATE_CONNECTION, config.WS_BURST_CONNECTION, config.RATE_LIMIT_IDLE_SECONDS),
+    TokenBucketLimiter(config.WS_RATE_USER, config.WS_BURST_USER, config.RATE_LIMIT_IDLE_SECONDS),
+    TokenBucketLimiter(config.WS_RATE_ROOM, config.WS_BURST_ROOM, config.RATE_LIMIT_IDLE_SECONDS),
+    config.WS_RATE_ACTION,
+    config.WS_RATE_MAX_DELAY,
+    TokenBucketLimiter(config.WS_RATE_CONTROL, config.WS_BURST_CONTROL, config.RATE_LIMIT_IDLE_SECONDS),
+)
+
+def frame_too_large(message: str) -> bool:
+    # A str is at most 4 UTF-8 bytes per character; only encode when needed.
+    limit = config.WS_MAX_FRAME_BYTES
+    return len(message) > limit or (len(message) * 4 > limit and len(message.encode()) > limit)
+
+async def refuse(websocket: WebSocket, room_id: str, rejected: Rejected):
+    # Accept first so the client sees 1013 and the hint rather than an HTTP 403.
+    log.info("ws_refused", room_id=room_id, reason=rejected.reason, retry_after=rejected.retry_after)
+    await websocket.accept()
+    await websocket.close(code=1013, reason=f"retry-after={rejected.retry_after}")
 
+async def authenticate(websocket: WebSocket, room_id: str, token: str):
+    """Returns the verified user if they may join the room, otherwise closes
+    the socket (1008, or 1011 if membership can't be checked) and returns None"""
     try:
         user = await verify_token_direct(token)
-        print(f"User authenticated: {user.get('email')}")
-        
         # Check role in user_metadata instead of top-level role
         user_role = user.get("user_metadata", {}).get("role")
-        print(f"User role: {user_role}")
         
         if user_role != "user":
-            print(f"Invalid role: {user_role}, closing connection")
+            log.info("ws_rejected", room_id=room_id, reason="role", role=user_role)
             await websocket.close(code=1008)
-            return
+            return None
     except Exception as e:
-        print(f"Authentication error: {str(e)}")
+        log.info("ws_rejected", room_id=room_id, reason="auth", error=str(e))
         await websocket.close(code=1008)
+        return None
+
+    # Only the room's two participants may join; answered from memory
+    # for any room recently resolved through /room/get_or_create
+    user_id = user.get("id") or user.get("sub") or user.get("user_id")
+    try:
+        allowed = await room_membership.is_member(room_id, user_id)
+    except Exception as e:
+        log.warning("ws_membership_failed", room_id=room_id, user_id=user_id, error=str(e))
+        # Accept first: closed before the handshake the client only sees an
+        # HTTP 403, not the 1011 that tells it to retry.
+        await websocket.accept()
+        await websocket.close(code=1011)
+        return None
+    if not allowed:
+        log.info("ws_rejected", room_id=room_id, reason="not_member", user_id=user_id)
+        await websocket.close(code=1008)
+        return None
+    return user
+
+@router.websocket("/ws/chat/{room_id}")
+async def chat_ws(websocket: WebSocket, room_id: str, token: str = Query(None), since: int = Query(None)):
+    if not token:
+        log.info("ws_rejected", room_id=room_id, reason="missing_token")
+        await websocket.close(code=1008)
+        return
+
+    # Cheap local capacity checks happen before spending time on auth
+    try:
+        admission.precheck(room_id)
+    except Rejected as e:
+        await refuse(websocket, room_id, e)
+        return
+
+    try:
+        user = await authenticate(websocket, room_id, token)
+    except BaseException:
+        admission.abandon()
+        raise
+    if user is None:
+        admission.abandon()
         return
 
-    print(f"Connecting user to room: {room_id}")
-    await manager.connect(room_id, websocket)
-    print(f"User connected to room: {room_id}")
+    sender_id = user.get("id") or user.get("sub") or user.get("user_id")
+    try:
+        admission.admit(sender_id)
+    except Rejected as e:
+        await refuse(websocket, room_id, e)
+        return
 
+    conn = None
     try:
+        subprotocol = choose_subprotocol(websocket.scope.get("subprotocols", ()))
+        conn = await manager.connect(room_id, websocket, sender_id, since, subprotocol)
+        log.info("ws_connected", room_id=room_id, user_id=sender_id, since=since)
+
         while True:
-            message = await websocket.receive_text()
-            print(f"Received message: {message}")
-            
-            # Handle ping messages
+            event = await websocket.receive()
+            if event["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(event.get("code", 1000))
+            conn.touch()
+            message = read_inbound(event, conn.binary)
+            if message is None:
+                continue
+
+            # Handle ping messages; the pong is queued like any other frame,
+            # so only the connection's writer ever sends on the socket
             if message == "ping":
-                await websocket.send_text("pong")
-                print("Sent pong response")
+                if message_limits.admit_control(conn.id) == ALLOW:
+                    manager.send(conn, "pong")
+                continue
+
+            # Read receipts: {"type": "read", "seq": N}
+            read_seq = read_receipt(message)
+            if read_seq is not None:
+                if message_limits.admit_control(conn.id) == ALLOW:
+                    read_seq = await read_receipts.clamp(room_id, read_seq, conn.last_sent_seq)
+                    read_receipts.mark_read(room_id, sender_id, read_seq)
                 continue
             
-            # Broadcast the message to all users in the room
-            await manager.broadcast(room_id, message)
+            MESSAGES_RECEIVED.inc()
+            if frame_too_large(message):
+                OVERSIZED_FRAMES.inc()
+                log.info("ws_frame_too_large", room_id=room_id, user_id=sender_id, size=len(message))
+                await websocket.close(code=1009)
+                break
+            if "\x00" in message:
+                # Postgres text can't hold NUL; it would only fail the insert
+                log.info("ws_message_rejected", room_id=room_id, user_id=sender_id, reason="nul")
+                continue
+            admitted = await message_limits.admit(conn.id, sender_id, room_id)
+            if admitted != ALLOW:
+                if admitted == CLOSE:
+                    log.info("ws_rate_limited", room_id=room_id, user_id=sender_id)
+                    await websocket.close(code=config.WS_RATE_CLOSE_CODE)
+                    break
+                continue
+            log.debug("message_received", room_id=room_id, user_id=sender_id, content=message)
+
+            # Stamp with the room sequence and broadcast to all users in the room
+            seq = await manager.history.next_seq(room_id)
+            created_at = now_iso()
+            await manager.broadcast(room_id, make_envelope(room_id, seq, sender_id, message, created_at))
+            read_receipts.message_sent(room_id, sender_id, seq)
             
-            # Store message in database
-            supabase.table("messages").insert({
+            # Queue message for batched insert; only waits if the buffer is full
+            await message_writer.submit({
+                # Generated here so a retried batch can't store it twice
+                "id": str(uuid4()),
                 "chat_room_id": room_id,
-                "sender_id": user.get("id") or user.get("sub") or user.get("user_id"),
+                "sender_id": sender_id,
                 "content": message,
                 "message_type": "text",
-                "is_read": False
-            }).execute()
-            print(f"Message stored in database")
+                "is_read": False,
+                "seq": seq,
+                "created_at": created_at
+            })
     except WebSocketDisconnect:
-        print(f"WebSocket disconnected for room: {room_id}")
-        manager.disconnect(room_id, websocket)
+        log.info("ws_disconnected", room_id=room_id, user_id=sender_id)
+    except Exception as e:
+        log.warning("ws_error", room_id=room_id, user_id=sender_id, error=str(e))
+    finally:
+        admission.release(sender_id)
+        if conn is not None:
+            manager.disconnect(conn)
+            message_limits.forget(conn.id)
+
+@router.get("/rooms/{room_id}/messages")
+async def list_messages(
+    room_id: str,
+    cursor: str = Query(None),
+    limit: int = Query(None, ge=1),
+    fields: str = Query(None),
+    user=Depends(verify_request_token)
+):
+    """Page through a room's messages, newest first"""
+    await require_member(room_id, user)
+
+    limit = min(limit or config.MESSAGES_PAGE_DEFAULT, config.MESSAGES_PAGE_MAX)
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(MESSAGE_COLUMNS)
+    unknown = [f for f in requested if f not in MESSAGE_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # The cursor is built from (created_at, id), so always read those
+    columns = list(dict.fromkeys(requested + ["created_at", "id"]))
+
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor, (timestamp_field, uuid_field))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        rows = await get_repository().messages_page(room_id, before, limit + 1, columns)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Message fetch failed: {str(e)}")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["created_at"], rows[-1]["id"]])
+    if fields:
+        rows = [{f: row.get(f) for f in requested} for row in rows]
+    return {"messages": rows, "next_cursor": next_cursor}
+
+async def require_member(room_id: str, user: dict) -> str:
+    user_id = user.get("id") or user.get("sub") or user.get("user_id")
+    try:
+        allowed = await room_membership.is_member(room_id, user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Membership check failed: {str(e)}")
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Not a member of this room")
+    return user_id
+
+@router.post("/rooms/{room_id}/read")
+async def mark_room_read(room_id: str, request: Request, user=Depends(verify_request_token)):
+    """Move the caller's read watermark in a room forward to the given seq"""
+    user_id = await require_member(room_id, user)
+    body = await request.json()
+    seq = body.get("seq")
+    if not isinstance(seq, int) or isinstance(seq, bool) or not 0 <= seq <= MAX_SEQ:
+        raise HTTPException(status_code=400, detail="seq must be a non-negative integer")
+    seq = await read_receipts.clamp(room_id, seq)
+    read_receipts.mark_read(room_id, user_id, seq)
+    return {"room_id": room_id, "last_read_seq": seq}
+
+@router.get("/unread")
+async def unread_counts(user=Depends(verify_request_token)):
+    """Unread message counts for all of the caller's rooms"""
+    user_id = user.get("id") or user.get("sub") or user.get("user_id")
+    try:
+        rooms = await read_receipts.unread(user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Unread count failed: {str(e)}")
+    return {"rooms": rooms, "total": sum(r["unread"] for r in rooms)}
+
+@router.get("/search")
+async def search_messages(
+    q: str = Query(..., min_length=1),
+    room_id: str = Query(None),
+    cursor: str = Query(None),
+    limit: int = Query(None, ge=1),
+    user=Depends(verify_request_token)
+):
+    """Full-text search over the caller's rooms (or one room), best matches first"""
+    if len(q) > config.SEARCH_QUERY_MAX:
+        raise HTTPException(status_code=400, detail=f"Query longer than {config.SEARCH_QUERY_MAX} characters")
+    if room_id:
+        user_id = await require_member(room_id, user)
+    else:
+        user_id = user.get("id") or user.get("sub") or user.get("user_id")
+
+    limit = min(limit or config.SEARCH_PAGE_DEFAULT, config.SEARCH_PAGE_MAX)
+
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor, (number_field, uuid_field))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        rows = await get_repository().search_messages(user_id, q, room_id, before, limit + 1)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
     except Exception as e:
-        print(f"WebSocket error: {str(e)}")
-        manager.disconnect(room_id, websocket)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["score"], rows[-1]["id"]])
+    return {
+        "hits": [{
+            "message_id": row["id"],
+            "room_id": row["chat_room_id"],
+            "sender_id": row["sender_id"],
+            "seq": row["seq"],
+            "created_at": row["created_at"],
+            "score": row["score"],
+            # Message text is escaped; only the highlight markup is HTML
+            "snippet": html.escape(row["snippet"] or "").replace(SNIPPET_START, "<mark>")
+                                                         .replace(SNIPPET_STOP, "</mark>"),
+        } for row in rows],
+        "next_cursor": next_cursor,
+    }
+
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from core.gateway import gateway
+from routes.chat import admission
+
+router = APIRouter()
+
+@router.get("/live")
+async def live():
+    """The process is up and serving requests"""
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready(request: Request):
+    """503 until startup has finished and again once shutdown has begun"""
+    state = request.app.state
+    if getattr(state, "ready", False):
+        return {"status": "ready"}
+    status = "draining" if getattr(state, "draining", False) else "starting"
+    return JSONResponse({"status": status}, status_code=503)
+
+@router.get("/gateway")
+async def gateway_stats():
+    """Connection pool and request statistics for the Supabase gateway"""
+    return gateway.stats()
+
+@router.get("/capacity")
+async def capacity():
+    """Connection headroom on this worker, for load balancer routing"""
+    return admission.capacity()
@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from core.metrics import render, CONTENT_TYPE
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the counters in core/metrics.py"""
+    return Response(render(), media_type=CONTENT_TYPE)
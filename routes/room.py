@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Request, Depends, HTTPException
+from uuid import UUID
+from fastapi import APIRouter, Request, Depends, HTTPException, Query
+from core import config
+from core.cursors import encode_cursor, decode_cursor, timestamp_field, uuid_field
 from core.dependencies import verify_request_token
-from core.supabase import supabase
-from uuid import uuid4
+from core.repository import get_repository
+from core.receipts import read_receipts
+from core.rooms import room_directory
+from core.log import get_logger
 
 router = APIRouter()
+log = get_logger("room")
 
 @router.post("/get_or_create")
 async def get_or_create_room(request: Request, user=Depends(verify_request_token)):
@@ -12,16 +18,15 @@ async def get_or_create_room(request: Request, user=Depends(verify_request_token
 
     if not other_user_id:
         raise HTTPException(status_code=400, detail="Missing other user ID")
+    try:
+        other_user_id = str(UUID(other_user_id))
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="other_user_id must be a UUID")
 
     # Check for existing room with either user combination
     # Get user ID from the user object (try different possible keys)
     current_user_id = user.get('id') or user.get('sub') or user.get('user_id')
     
-    # Debug: Print the user object to see its structure
-    print(f"User object: {user}")
-    print(f"Extracted current_user_id: {current_user_id}")
-    print(f"Provided other_user_id: {other_user_id}")
-    
     if not current_user_id:
         raise HTTPException(status_code=400, detail="Could not determine user ID")
 
@@ -32,47 +37,63 @@ async def get_or_create_room(request: Request, user=Depends(verify_request_token
         raise HTTPException(status_code=400, detail="Cannot create a chat room with yourself")
     
     try:
-        print("Checking for existing room...")
-        
-        # First, check if a room already exists between these users
-        # Try first combination: user1_id = current_user, user2_id = other_user
-        existing1 = supabase.table("chat_rooms").select("*").eq("user1_id", current_user_id).eq("user2_id", other_user_id).maybe_single().execute()
-        print(f"First query result: {existing1}")
-        
-        # If first query found a room, return it immediately
-        if existing1.data:
-            print(f"Found existing room in first query: {existing1.data}")
-            return {"room_id": existing1.data["id"]}
-        
-        # Only try second query if first query didn't find anything
-        existing2 = supabase.table("chat_rooms").select("*").eq("user1_id", other_user_id).eq("user2_id", current_user_id).maybe_single().execute()
-        print(f"Second query result: {existing2}")
-        
-        # Check if second query found an existing room
-        if existing2.data:
-            print(f"Found existing room in second query: {existing2.data}")
-            return {"room_id": existing2.data["id"]}
-        
-        # If no existing room, create a new one
-        print("Creating new room...")
-        room_id = str(uuid4())
-        print(f"Generated room_id: {room_id}")
-        
-        result = supabase.table("chat_rooms").insert({
-            "id": room_id,
-            "user1_id": current_user_id,
-            "user2_id": other_user_id
-        }).execute()
-        
-        print(f"Insert result: {result}")
+        # Canonical pair lookup: served from memory for known pairs, and a
+        # single atomic get-or-create call on the backend otherwise
+        room_id = await room_directory.get_or_create(current_user_id, other_user_id)
         return {"room_id": room_id}
         
     except Exception as e:
-        print(f"Error in room creation: {str(e)}")
-        print(f"Current user ID: {current_user_id}")
-        print(f"Other user ID: {other_user_id}")
+        log.error("room_create_failed", user_id=current_user_id, other_user_id=other_user_id, error=str(e))
         raise HTTPException(status_code=500, detail=f"Room creation failed: {str(e)}")
 
-    return {"room_id": room_id}
+@router.get("/list")
+async def list_rooms(
+    cursor: str = Query(None),
+    limit: int = Query(None, ge=1),
+    user=Depends(verify_request_token)
+):
+    """The caller's rooms (inbox), most recent activity first.
+
+    Served from the per-room summary columns kept up to date by the message
+    writer: one read per page, whatever the number of rooms.
+    """
+    current_user_id = user.get('id') or user.get('sub') or user.get('user_id')
+    limit = min(limit or config.ROOM_LIST_PAGE_DEFAULT, config.ROOM_LIST_PAGE_MAX)
+
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor, (timestamp_field, uuid_field))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        rows = await get_repository().list_rooms(current_user_id, before, limit + 1)
+    except Exception as e:
+        log.error("room_list_failed", user_id=current_user_id, error=str(e))
+        raise HTTPException(status_code=500, detail=f"Room list failed: {str(e)}")
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]["last_activity_at"], rows[-1]["id"]])
 
+    rooms = []
+    for row in rows:
+        # The client is likely to open these next: warm the pair and membership caches
+        room_directory.put(current_user_id, row["other_user_id"], row["id"])
+        rooms.append({
+            "room_id": row["id"],
+            "other_user": {"id": row["other_user_id"], "username": row["other_username"]},
+            "last_message": {
+                "seq": row["last_seq"],
+                "sender_id": row["last_sender_id"],
+                "preview": row["last_message_preview"],
+                "created_at": row["last_activity_at"],
+            } if row["last_sender_id"] else None,
+            "last_activity_at": row["last_activity_at"],
+            "unread": read_receipts.counts(row["id"], current_user_id, row["last_seq"],
+                                           row["last_read_seq"])["unread"],
+        })
+    return {"rooms": rooms, "next_cursor": next_cursor}
 
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+# core.config reads the environment at import time: point everything at the
+# offline backends before any test module imports the app.
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", ":memory:")
+os.environ.setdefault("BACKPLANE_URL", "memory://")
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-secret-test-secret-test-secret")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+from jose import jwt
+
+import core.repository
+from core.repository.sqlite import SqliteRepository
+
+
+@pytest.fixture
+def repository(monkeypatch):
+    """A fresh in-memory SQLite repository, installed as get_repository()."""
+    repo = SqliteRepository(":memory:")
+    monkeypatch.setattr(core.repository, "_repository", repo)
+    yield repo
+    repo.db.close()
+
+
+def seed_room(repository, messages=0, contents=None):
+    """A room between two new users with ``messages`` stored messages;
+    returns (room_id, sender, other)."""
+    from core.history import now_iso
+    from core.rooms import pair_key
+
+    contents = contents or [f"hello {i}" for i in range(messages)]
+    sender, other = str(uuid.uuid4()), str(uuid.uuid4())
+
+    async def main():
+        room_id = await repository.get_or_create_room(pair_key(sender, other))
+        if contents:
+            await repository.insert_messages([
+                {"id": str(uuid.uuid4()), "chat_room_id": room_id, "sender_id": sender, "content": content,
+                 "seq": i + 1, "created_at": now_iso()}
+                for i, content in enumerate(contents)])
+        return room_id
+
+    return asyncio.run(main()), sender, other
+
+
+class FakeWebSocket:
+    """Records what the manager sends and how it closes the socket."""
+
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        if not isinstance(text, str):
+            raise TypeError("send_text needs a str")
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+def make_token(user_id: str, role: str = "user", **claims) -> str:
+    """An HS256 access token like GoTrue's, signed with the test secret."""
+    claims = {"sub": user_id, "aud": "authenticated", "user_metadata": {"role": role},
+              "exp": int(time.time()) + 600, **claims}
+    return jwt.encode(claims, os.environ["SUPABASE_JWT_SECRET"], algorithm="HS256")
+
+
+def api_client(token: str = None) -> httpx.AsyncClient:
+    """In-process client for the app; the SQLite connection belongs to the
+    test's thread, so requests must not go through TestClient's portal."""
+    from main import app
+
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return httpx.AsyncClient(app=app, base_url="http://test", headers=headers)
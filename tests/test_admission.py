@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from core.admission import AdmissionControl, Rejected
+from core.backplane import InMemoryBackplane
+from core.ws_manager import ConnectionManager
+from tests.conftest import FakeWebSocket
+
+
+def admission(**caps):
+    caps = {"max_global": 0, "max_worker": 0, "max_room": 0, "max_user": 0,
+            "connect_rate": 0, "connect_burst": 0, **caps}
+    return AdmissionControl(ConnectionManager(backplane=InMemoryBackplane()), **caps)
+
+
+def test_precheck_and_admit_track_connections():
+    control = admission(max_worker=10)
+    control.precheck("room")
+    assert control.pending == 1 and control.connections == 0
+    control.admit("user")
+    assert control.pending == 0 and control.connections == 1
+    control.release("user")
+    assert control.connections == 0 and control._users == {}
+
+
+def test_abandon_frees_the_handshake_slot():
+    control = admission(max_worker=1)
+    control.precheck("room")
+    with pytest.raises(Rejected, match="worker"):
+        control.precheck("room")
+    control.abandon()
+    control.precheck("room")
+
+
+def test_worker_cap_counts_pending_handshakes():
+    control = admission(max_worker=2)
+    control.precheck("room")
+    control.admit("a")
+    control.precheck("room")
+    with pytest.raises(Rejected) as rejected:
+        control.precheck("room")
+    assert rejected.value.reason == "worker"
+    assert rejected.value.retry_after > 0
+    assert control.capacity()["worker_free"] == 0
+    assert not control.capacity()["accepting"]
+
+
+def test_user_cap():
+    control = admission(max_user=2)
+    for _ in range(2):
+        control.precheck("room")
+        control.admit("user")
+    control.precheck("room")
+    with pytest.raises(Rejected, match="user"):
+        control.admit("user")
+    assert control.pending == 0
+    control.precheck("room")
+    control.admit("other")
+
+
+def test_room_cap():
+    async def main():
+        manager = ConnectionManager(backplane=InMemoryBackplane())
+        control = AdmissionControl(manager, max_global=0, max_worker=0, max_room=1, max_user=0,
+                                   connect_rate=0, connect_burst=0)
+        conn = await manager.connect("room", FakeWebSocket(), "user")
+        try:
+            with pytest.raises(Rejected, match="room"):
+                control.precheck("room")
+            control.precheck("other-room")
+        finally:
+            manager.disconnect(conn)
+            await manager.close()
+
+    asyncio.run(main())
+
+
+def test_connect_rate_rejection_suggests_a_wait():
+    control = admission(connect_rate=1, connect_burst=1)
+    control.precheck("room")
+    with pytest.raises(Rejected) as rejected:
+        control.precheck("room")
+    assert rejected.value.reason == "connect_rate"
+    assert rejected.value.retry_after > 0
+    assert control.pending == 1
+
+
+def test_global_cap_uses_the_reported_cluster_total():
+    async def main():
+        control = admission(max_global=3)
+        control._cluster_total = 2
+        control.precheck("room")
+        control.admit("a")
+        assert control.cluster_estimate() == 3
+        control.precheck("room")
+        with pytest.raises(Rejected, match="global"):
+            control.admit("b")
+        await asyncio.sleep(0)
+        # The background report replaces the estimate with the backplane's total.
+        assert control.cluster_estimate() == 1
+        await control.close()
+
+    asyncio.run(main())
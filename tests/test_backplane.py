@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from core.backplane import RedisBackplane, RespError, encode_command, read_reply
+from tools.resp_standin import RespStandin
+
+
+async def start_standin():
+    server = await RespStandin().serve("127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def stop(backplane, server):
+    await backplane.close()
+    server.close()
+    await server.wait_closed()
+    await asyncio.sleep(0.01)  # let the stand-in's handlers see the EOF
+
+
+def test_reply_parsing():
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"+OK\r\n:42\r\n$5\r\nhello\r\n$-1\r\n*2\r\n$1\r\na\r\n:1\r\n-ERR nope\r\n")
+        reader.feed_eof()
+        replies = [await read_reply(reader) for _ in range(5)]
+        with pytest.raises(RespError):
+            await read_reply(reader)
+        with pytest.raises(ConnectionError):
+            await read_reply(reader)
+        return replies
+
+    assert asyncio.run(main()) == ["OK", 42, b"hello", None, [b"a", 1]]
+    assert encode_command("SET", "k", 7) == b"*3\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\n7\r\n"
+
+
+def test_pipelined_commands_get_their_own_replies():
+    async def main():
+        server, port = await start_standin()
+        backplane = RedisBackplane("127.0.0.1", port)
+        await backplane.start(lambda room_id, message: None)
+        seqs = await asyncio.gather(*(backplane.next_seq("room") for _ in range(50)))
+        await backplane.seed_seq("other", 10)
+        other = await backplane.next_seq("other")
+        with pytest.raises(RespError):
+            await backplane.execute("NOPE")
+        after_error = await backplane.next_seq("room")
+        await stop(backplane, server)
+        return seqs, other, after_error
+
+    seqs, other, after_error = asyncio.run(main())
+    assert sorted(seqs) == list(range(1, 51))
+    assert other == 11
+    assert after_error == 51
+
+
+def test_publish_reaches_subscribers_and_survives_a_bad_delivery():
+    received = []
+
+    def deliver(room_id, message):
+        if message == "boom":
+            raise ValueError("bad message")
+        received.append((room_id, message))
+
+    async def main():
+        server, port = await start_standin()
+        backplane = RedisBackplane("127.0.0.1", port)
+        await backplane.start(deliver)
+        backplane.subscribe("room")
+        await asyncio.sleep(0.05)
+        for message in ("boom", "hello"):
+            await backplane.publish("room", message)
+        await backplane.publish("elsewhere", "ignored")
+        await asyncio.sleep(0.05)
+        await stop(backplane, server)
+
+    asyncio.run(main())
+    assert received == [("room", "hello")]
+
+
+def test_worker_connection_counts():
+    async def main():
+        server, port = await start_standin()
+        first, second = RedisBackplane("127.0.0.1", port), RedisBackplane("127.0.0.1", port)
+        await first.report_connections("a", 3, stale_after=60)
+        total = await second.report_connections("b", 4, stale_after=60)
+        await first.close()
+        await stop(second, server)
+        return total
+
+    assert asyncio.run(main()) == 7
+
+
+@pytest.mark.parametrize("command, attempts", [(("PUBLISH", "chat:room:r", "hi"), 1),
+                                               (("INCR", "chat:seq:r"), 1),
+                                               (("HGETALL", "chat:workers"), 2)])
+def test_only_idempotent_commands_are_retried_after_sending(command, attempts):
+    received = []
+
+    async def hang_up(reader, writer):
+        # Reads the command, then drops the connection without replying.
+        received.append(await read_reply(reader))
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(hang_up, "127.0.0.1", 0)
+        backplane = RedisBackplane("127.0.0.1", server.sockets[0].getsockname()[1])
+        with pytest.raises(ConnectionError):
+            await backplane.execute(*command)
+        await stop(backplane, server)
+
+    asyncio.run(main())
+    assert len(received) == attempts
+
+
+def test_reconnect_is_reported():
+    reconnects = []
+
+    async def main():
+        server, port = await start_standin()
+        backplane = RedisBackplane("127.0.0.1", port)
+        await backplane.start(lambda room_id, message: None, lambda: reconnects.append(1))
+        await asyncio.sleep(0.05)
+        backplane._sub_writer.transport.abort()
+        await asyncio.sleep(0.3)
+        await stop(backplane, server)
+
+    asyncio.run(main())
+    assert reconnects == [1]
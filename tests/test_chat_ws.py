@@ -0,0 +1,23 @@
+import uuid
+
+import pytest
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import routes.chat
+from tests.conftest import make_token
+
+
+def test_membership_failure_closes_with_1011_after_accepting(monkeypatch):
+    async def unavailable(room_id, user_id):
+        raise OSError("database unavailable")
+
+    monkeypatch.setattr(routes.chat.room_membership, "is_member", unavailable)
+    from main import app
+
+    client = TestClient(app)
+    token = make_token(str(uuid.uuid4()))
+    with client.websocket_connect(f"/chat/ws/chat/{uuid.uuid4()}?token={token}") as websocket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            websocket.receive_text()
+    assert closed.value.code == 1011
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from core.concurrency import single_flight
+
+
+def test_concurrent_callers_share_one_load():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "room"
+
+    async def main():
+        pending = {}
+        results = await asyncio.gather(*(single_flight(pending, "k", load) for _ in range(5)))
+        return results, pending
+
+    results, pending = asyncio.run(main())
+    assert results == ["room"] * 5
+    assert calls == [1]
+    assert pending == {}
+
+
+def test_followers_get_the_leaders_error():
+    async def load():
+        await asyncio.sleep(0.01)
+        raise LookupError("missing")
+
+    async def main():
+        pending = {}
+        results = await asyncio.gather(*(single_flight(pending, "k", load) for _ in range(3)),
+                                       return_exceptions=True)
+        return results, pending
+
+    results, pending = asyncio.run(main())
+    assert all(isinstance(r, LookupError) for r in results)
+    assert pending == {}
+
+
+def test_follower_survives_leader_cancellation():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return len(calls)
+
+    async def main():
+        pending = {}
+        leader = asyncio.create_task(single_flight(pending, "k", load))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(single_flight(pending, "k", load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(follower, 1), pending
+
+    result, pending = asyncio.run(main())
+    # The follower took over and ran load itself.
+    assert result == 2
+    assert pending == {}
+
+
+def test_cancelled_follower_does_not_disturb_leader():
+    async def load():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    async def main():
+        pending = {}
+        leader = asyncio.create_task(single_flight(pending, "k", load))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(single_flight(pending, "k", load))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == "ok"
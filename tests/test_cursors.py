@@ -0,0 +1,77 @@
+import asyncio
+import uuid
+
+import pytest
+
+from core.cursors import decode_cursor, encode_cursor, number_field, timestamp_field, uuid_field
+from core.history import now_iso
+from tests.conftest import api_client, make_token, seed_room
+
+MESSAGE_CURSOR = (timestamp_field, uuid_field)
+SEARCH_CURSOR = (number_field, uuid_field)
+
+
+def test_round_trip():
+    room_id = str(uuid.uuid4())
+    values = [now_iso(), room_id]
+    assert decode_cursor(encode_cursor(values), MESSAGE_CURSOR) == values
+    assert decode_cursor(encode_cursor([0.25, room_id]), SEARCH_CURSOR) == [0.25, room_id]
+
+
+def test_messages_page_continues_after_cursor(repository):
+    room_id, _, _ = seed_room(repository, 5)
+    columns = ["id", "created_at"]
+    first = asyncio.run(repository.messages_page(room_id, None, 2, columns))
+    cursor = encode_cursor([first[-1]["created_at"], first[-1]["id"]])
+    rest = asyncio.run(repository.messages_page(room_id, decode_cursor(cursor, MESSAGE_CURSOR), 10, columns))
+    assert len(rest) == 3
+    assert not {row["id"] for row in first} & {row["id"] for row in rest}
+
+
+@pytest.mark.parametrize("cursor, fields", [
+    ("!!!", MESSAGE_CURSOR),
+    (encode_cursor([now_iso()]), MESSAGE_CURSOR),
+    (encode_cursor({"a": 1}), MESSAGE_CURSOR),
+    (encode_cursor(["yesterday", str(uuid.uuid4())]), MESSAGE_CURSOR),
+    (encode_cursor([now_iso(), "1' or '1'='1"]), MESSAGE_CURSOR),
+    (encode_cursor([now_iso(), 42]), MESSAGE_CURSOR),
+    (encode_cursor(["0.5", str(uuid.uuid4())]), SEARCH_CURSOR),
+    (encode_cursor([True, str(uuid.uuid4())]), SEARCH_CURSOR),
+])
+def test_tampered_cursor_is_rejected(cursor, fields):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, fields)
+
+
+def test_history_endpoint_pages_newest_first(repository):
+    room_id, sender, _ = seed_room(repository, 5)
+
+    async def main():
+        async with api_client(make_token(sender)) as client:
+            first = (await client.get(f"/chat/rooms/{room_id}/messages", params={"limit": 3})).json()
+            rest = (await client.get(f"/chat/rooms/{room_id}/messages",
+                                     params={"limit": 3, "cursor": first["next_cursor"]})).json()
+            fields = (await client.get(f"/chat/rooms/{room_id}/messages", params={"fields": "seq"})).json()
+            unknown = await client.get(f"/chat/rooms/{room_id}/messages", params={"fields": "password"})
+            tampered = await client.get(f"/chat/rooms/{room_id}/messages",
+                                        params={"cursor": encode_cursor([now_iso(), "x"])})
+            return first, rest, fields, unknown.status_code, tampered.status_code
+
+    first, rest, fields, unknown, tampered = asyncio.run(main())
+    assert [m["seq"] for m in first["messages"]] == [5, 4, 3]
+    assert [m["seq"] for m in rest["messages"]] == [2, 1]
+    assert rest["next_cursor"] is None
+    assert fields["messages"][0] == {"seq": 5}
+    assert (unknown, tampered) == (400, 400)
+
+
+def test_room_list_rejects_tampered_cursor(repository):
+    cursor = encode_cursor([now_iso(), "1' or '1'='1"])
+
+    async def main():
+        async with api_client(make_token(str(uuid.uuid4()))) as client:
+            valid = await client.get("/room/list")
+            tampered = await client.get("/room/list", params={"cursor": cursor})
+            return valid.status_code, tampered.status_code
+
+    assert asyncio.run(main()) == (200, 400)
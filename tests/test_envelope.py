@@ -0,0 +1,74 @@
+import json
+import uuid
+
+import pytest
+from starlette.testclient import TestClient
+
+import routes.chat
+from core.envelope import (JSON_PROTOCOL, MAX_SEQ, MSGPACK_PROTOCOL, Frame, choose_subprotocol, make_envelope,
+                           read_inbound, read_receipt)
+from tests.conftest import make_token
+
+msgpack = pytest.importorskip("msgpack")
+
+
+def test_frame_is_encoded_once_per_format():
+    text = make_envelope("room", 7, "user", "héllo", "2024-01-01T00:00:00+00:00")
+    frame = Frame.parse(text)
+    assert frame.seq == 7
+    assert json.loads(frame.text)["content"] == "héllo"
+    assert msgpack.unpackb(frame.binary) == json.loads(text)
+    assert frame.binary is frame.binary
+
+
+def test_non_json_frames_have_no_seq():
+    frame = Frame.parse("not json")
+    assert frame.seq is None
+    assert msgpack.unpackb(frame.binary) == "not json"
+
+
+def test_subprotocol_choice():
+    assert choose_subprotocol([]) is None
+    assert choose_subprotocol(["unknown", MSGPACK_PROTOCOL, JSON_PROTOCOL]) == MSGPACK_PROTOCOL
+    assert choose_subprotocol([JSON_PROTOCOL, MSGPACK_PROTOCOL]) == JSON_PROTOCOL
+
+
+def test_binary_inbound_frames():
+    assert read_inbound({"bytes": msgpack.packb("hi")}, binary=True) == "hi"
+    assert read_inbound({"bytes": msgpack.packb({"content": "hi"})}, binary=True) == "hi"
+    receipt = read_inbound({"bytes": msgpack.packb({"type": "read", "seq": 3})}, binary=True)
+    assert read_receipt(receipt) == 3
+    assert read_inbound({"bytes": msgpack.packb([1, 2])}, binary=True) is None
+    assert read_inbound({"bytes": b"\xc1"}, binary=True) is None
+    assert read_inbound({"text": "plain"}, binary=True) == "plain"
+    assert read_inbound({"bytes": b"caf\xc3\xa9"}, binary=False) == "café"
+
+
+@pytest.mark.parametrize("message, seq", [
+    ('{"type":"read","seq":4}', 4),
+    ('{"type":"read","seq":-1}', None),
+    ('{"type":"read","seq":true}', None),
+    ('{"type":"read","seq":"4"}', None),
+    (json.dumps({"type": "read", "seq": MAX_SEQ + 1}), None),
+    ('{"type":"message","seq":4}', None),
+    ("read", None),
+])
+def test_read_receipt_frames(message, seq):
+    assert read_receipt(message) == seq
+
+
+def test_msgpack_client_ping_gets_a_packed_pong(monkeypatch):
+    async def member(room_id, user_id):
+        return True
+
+    monkeypatch.setattr(routes.chat.room_membership, "is_member", member)
+    from main import app
+
+    token = make_token(str(uuid.uuid4()))
+    with TestClient(app) as client:
+        with client.websocket_connect(f"/chat/ws/chat/{uuid.uuid4()}?token={token}",
+                                      subprotocols=[MSGPACK_PROTOCOL]) as websocket:
+            assert websocket.accepted_subprotocol == MSGPACK_PROTOCOL
+            for _ in range(2):
+                websocket.send_bytes(msgpack.packb("ping"))
+                assert msgpack.unpackb(websocket.receive_bytes()) == "pong"
@@ -0,0 +1,143 @@
+import asyncio
+import json
+
+from core.backplane import InMemoryBackplane
+from core.envelope import Frame, make_envelope
+from core.history import RoomHistory, now_iso
+from core.ws_manager import ConnectionManager
+from tests.conftest import FakeWebSocket
+
+ROOM = "room"
+
+
+def rows(seqs):
+    return [{"chat_room_id": ROOM, "sender_id": "user", "content": f"message {seq}", "seq": seq,
+             "created_at": now_iso()}
+            for seq in seqs]
+
+
+def store(repository, seqs):
+    asyncio.run(repository.insert_messages(rows(seqs)))
+
+
+def record(history, seqs):
+    for seq in seqs:
+        history.record(ROOM, Frame(make_envelope(ROOM, seq, "user", f"message {seq}", now_iso()), seq))
+
+
+def seqs(frames):
+    return [frame.seq for frame in frames]
+
+
+def test_replay_from_memory(repository):
+    history = RoomHistory(InMemoryBackplane())
+    record(history, range(1, 11))
+    assert seqs(asyncio.run(history.replay(ROOM, 6))) == [7, 8, 9, 10]
+
+
+def test_replay_pages_the_gap_from_storage(repository):
+    store(repository, range(1, 21))
+    history = RoomHistory(InMemoryBackplane(), page_size=3)
+    record(history, range(15, 21))
+    # Stored rows stop where the buffer starts, so nothing is sent twice.
+    assert seqs(asyncio.run(history.replay(ROOM, 5))) == list(range(6, 21))
+
+
+def test_long_gap_replays_the_latest_window(repository):
+    store(repository, range(1, 101))
+    history = RoomHistory(InMemoryBackplane(), page_size=7, max_replay=20)
+    frames = asyncio.run(history.replay(ROOM, 10))
+    notice = json.loads(frames[0].text)
+    assert notice == {"type": "truncated", "room_id": ROOM, "since": 10, "resume_from": 81}
+    assert seqs(frames[1:]) == list(range(81, 101))
+
+
+def test_buffer_is_bounded():
+    history = RoomHistory(InMemoryBackplane(), room_messages=5)
+    record(history, range(1, 21))
+    assert seqs(history._rooms[ROOM].entries) == [16, 17, 18, 19, 20]
+
+
+def test_replay_waits_for_unflushed_messages(repository):
+    backplane = InMemoryBackplane()
+    store(repository, range(1, 6))
+
+    async def main():
+        for _ in range(8):
+            await backplane.next_seq(ROOM)  # 6-8 are still in a write-behind buffer
+        history = RoomHistory(backplane, flush_wait=0.05)
+
+        async def flush_later():
+            await asyncio.sleep(0.01)
+            await repository.insert_messages(rows(range(6, 9)))
+
+        flushed = asyncio.create_task(flush_later())
+        frames = await history.replay(ROOM, 3)
+        await flushed
+        return frames
+
+    assert seqs(asyncio.run(main())) == [4, 5, 6, 7, 8]
+
+
+def test_forget_and_clear_drop_buffers_and_seeds(repository):
+    history = RoomHistory(InMemoryBackplane())
+    asyncio.run(history.next_seq(ROOM))
+    record(history, range(1, 4))
+    assert ROOM in history._seeded
+    history.forget(ROOM)
+    assert not history._seeded and not history._rooms
+    record(history, range(1, 4))
+    asyncio.run(history.next_seq(ROOM))
+    assert history.clear() == 1
+    assert not history._seeded and not history._rooms and history._bytes == 0
+
+
+def test_replay_failure_closes_with_1011(monkeypatch):
+    async def broken_replay(room_id, since):
+        raise OSError("database unavailable")
+
+    async def main():
+        manager = ConnectionManager(backplane=InMemoryBackplane())
+        monkeypatch.setattr(manager.history, "replay", broken_replay)
+        websocket = FakeWebSocket()
+        conn = await manager.connect(ROOM, websocket, "user", since=3)
+        await asyncio.wait_for(conn.writer, 1)
+        await manager.close()
+        return manager, conn, websocket
+
+    manager, conn, websocket = asyncio.run(main())
+    assert websocket.close_code == 1011
+    assert websocket.sent == []
+    assert conn.closed
+    assert len(manager.connections) == 0
+
+
+def test_live_frames_already_replayed_are_skipped(monkeypatch):
+    async def replay(room_id, since):
+        return [Frame(make_envelope(ROOM, seq, "user", f"message {seq}", now_iso()), seq) for seq in (4, 5)]
+
+    async def main():
+        manager = ConnectionManager(backplane=InMemoryBackplane())
+        monkeypatch.setattr(manager.history, "replay", replay)
+        websocket = FakeWebSocket()
+        conn = await manager.connect(ROOM, websocket, "user", since=3)
+        for seq in (5, 6):
+            manager._fan_out(ROOM, make_envelope(ROOM, seq, "user", f"message {seq}", now_iso()))
+        await asyncio.sleep(0.01)
+        manager.disconnect(conn)
+        await manager.close()
+        return websocket
+
+    websocket = asyncio.run(main())
+    assert [Frame.parse(text).seq for text in websocket.sent] == [4, 5, 6]
+
+
+def test_backplane_reconnect_drops_buffers():
+    async def main():
+        manager = ConnectionManager(backplane=InMemoryBackplane())
+        record(manager.history, range(1, 4))
+        manager._resubscribed()
+        return manager.history
+
+    history = asyncio.run(main())
+    assert not history._rooms
@@ -0,0 +1,95 @@
+import asyncio
+import uuid
+
+from core.history import now_iso
+from core.persistence import MessageWriter
+
+
+class Storage:
+    """Flush target that rejects rows marked bad and can fail transiently."""
+
+    def __init__(self, transient_failures=0):
+        self.rows = []
+        self.calls = []
+        self.transient_failures = transient_failures
+
+    async def flush(self, batch):
+        self.calls.append(len(batch))
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise OSError("connection reset")
+        if any(row.get("bad") for row in batch):
+            raise ValueError("invalid row")
+        self.rows.extend(batch)
+
+
+def run(writer, rows):
+    async def main():
+        for row in rows:
+            await writer.submit(row)
+        await writer.close()
+
+    asyncio.run(main())
+
+
+def test_batches_rows():
+    storage = Storage()
+    writer = MessageWriter(storage.flush, batch_size=10, flush_interval=60)
+    run(writer, [{"seq": i} for i in range(25)])
+    assert storage.calls == [10, 10, 5]
+    assert [row["seq"] for row in storage.rows] == list(range(25))
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+    storage = Storage(transient_failures=2)
+    writer = MessageWriter(storage.flush, batch_size=4, flush_interval=60, max_retries=3)
+    run(writer, [{"seq": i} for i in range(4)])
+    assert storage.calls == [4, 4, 4]
+    assert len(storage.rows) == 4
+    assert writer.failed == 0
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+    storage = Storage(transient_failures=10)
+    writer = MessageWriter(storage.flush, batch_size=4, flush_interval=60, max_retries=2)
+    run(writer, [{"seq": i} for i in range(4)])
+    assert storage.calls == [4, 4, 4]
+    assert writer.failed == 4
+
+
+def test_bad_row_is_isolated_by_bisection():
+    storage = Storage()
+    writer = MessageWriter(storage.flush, batch_size=16, flush_interval=60)
+    rows = [{"seq": i, "bad": i == 5} for i in range(16)]
+    run(writer, rows)
+    assert writer.failed == 1
+    assert sorted(row["seq"] for row in storage.rows) == [i for i in range(16) if i != 5]
+    # Only the halves containing the bad row are split again.
+    assert storage.calls == [16, 8, 4, 4, 2, 1, 1, 2, 8]
+
+
+_sleep = asyncio.sleep
+
+
+async def _no_sleep(delay, result=None):
+    await _sleep(0)
+    return result
+
+
+def test_retry_after_an_ambiguous_failure_stores_rows_once(repository, monkeypatch):
+    monkeypatch.setattr(asyncio, "sleep", _no_sleep)
+    timeouts = [1]
+
+    async def flush(batch):
+        await repository.insert_messages(batch)
+        if timeouts:
+            timeouts.pop()
+            raise OSError("timed out after the commit")
+
+    writer = MessageWriter(flush, batch_size=3, flush_interval=60)
+    run(writer, [{"id": str(uuid.uuid4()), "chat_room_id": "room", "sender_id": "user", "content": f"m{i}",
+                  "seq": i, "created_at": now_iso()} for i in range(3)])
+    assert writer.failed == 0
+    assert repository.db.execute("select count(*) from messages").fetchone()[0] == 3
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from core.ratelimit import ALLOW, CLOSE, DELAY, DROP, MessageLimits, TokenBucketLimiter
+
+
+def test_bucket_allows_burst_then_refills():
+    limiter = TokenBucketLimiter(rate=2, burst=3)
+    for _ in range(3):
+        assert limiter.wait_time("k", now=0.0) == 0.0
+        limiter.take("k", now=0.0)
+    assert limiter.wait_time("k", now=0.0) == pytest.approx(0.5)
+    assert limiter.wait_time("k", now=0.5) == 0.0
+
+
+def test_zero_rate_disables_limiter():
+    limiter = TokenBucketLimiter(rate=0, burst=1)
+    for _ in range(100):
+        limiter.take("k")
+    assert limiter.wait_time("k") == 0.0
+
+
+def test_idle_buckets_are_evicted():
+    limiter = TokenBucketLimiter(rate=1, burst=1, idle_seconds=10)
+    limiter.take("old", now=0.0)
+    limiter.take("new", now=20.0)
+    assert len(limiter) == 1
+
+
+def limits(action, connection=(0, 1), control=None):
+    return MessageLimits(TokenBucketLimiter(*connection), TokenBucketLimiter(0, 1), TokenBucketLimiter(0, 1),
+                         action, max_delay=0.05, control=control)
+
+
+def test_drop_and_close_actions():
+    async def admit_all(message_limits, count):
+        return [await message_limits.admit("conn", "user", "room") for _ in range(count)]
+
+    assert asyncio.run(admit_all(limits(DROP, (0.001, 2)), 3)) == [ALLOW, ALLOW, DROP]
+    assert asyncio.run(admit_all(limits(CLOSE, (0.001, 2)), 3)) == [ALLOW, ALLOW, CLOSE]
+
+
+def test_delay_action_waits_for_a_token():
+    async def main():
+        message_limits = limits(DELAY, (100, 1))
+        await message_limits.admit("conn", "user", "room")
+        return await message_limits.admit("conn", "user", "room")
+
+    assert asyncio.run(main()) == ALLOW
+    assert asyncio.run(_admit_twice(limits(DELAY, (1, 1)))) == CLOSE
+
+
+async def _admit_twice(message_limits):
+    await message_limits.admit("conn", "user", "room")
+    return await message_limits.admit("conn", "user", "room")
+
+
+def test_control_frames_have_their_own_bucket():
+    message_limits = limits(DROP, (0.001, 1), control=TokenBucketLimiter(0.001, 2))
+    assert [message_limits.admit_control("conn") for _ in range(3)] == [ALLOW, ALLOW, DROP]
+    # Pings and receipts didn't use the message bucket.
+    assert asyncio.run(message_limits.admit("conn", "user", "room")) == ALLOW
+    message_limits.forget("conn")
+    assert message_limits.admit_control("conn") == ALLOW
@@ -0,0 +1,154 @@
+import asyncio
+import sqlite3
+import uuid
+
+from core.receipts import ReadReceipts
+from core.rooms import pair_key
+from tests.conftest import api_client, make_token
+
+
+def test_close_flushes_pending_receipts(repository):
+    async def main():
+        receipts = ReadReceipts(flush_interval=60)
+        receipts.message_sent("room", "alice", 3)
+        receipts.mark_read("room", "bob", 2)
+        await receipts.close()
+
+    asyncio.run(main())
+    rows = repository.db.execute("select room_id, user_id, last_read_seq from room_reads order by user_id")
+    assert [tuple(row) for row in rows] == [("room", "alice", 3), ("room", "bob", 2)]
+
+
+def test_close_during_a_write_keeps_the_batch(repository, monkeypatch):
+    mark_read = repository.mark_read
+    started = None
+
+    async def slow_mark_read(marks):
+        started.set()
+        await asyncio.sleep(0.02)
+        await mark_read(marks)
+
+    monkeypatch.setattr(repository, "mark_read", slow_mark_read)
+
+    async def main():
+        nonlocal started
+        started = asyncio.Event()
+        receipts = ReadReceipts(flush_interval=0.01)
+        receipts.mark_read("room", "alice", 7)
+        await started.wait()
+        await receipts.close()
+
+    asyncio.run(main())
+    assert repository.db.execute("select last_read_seq from room_reads").fetchone()[0] == 7
+
+
+def test_failed_flush_is_retried(repository, monkeypatch):
+    mark_read = repository.mark_read
+    failures = [sqlite3.OperationalError("database is locked")]
+
+    async def flaky_mark_read(marks):
+        if failures:
+            raise failures.pop()
+        await mark_read(marks)
+
+    monkeypatch.setattr(repository, "mark_read", flaky_mark_read)
+
+    async def main():
+        receipts = ReadReceipts(flush_interval=60)
+        receipts.mark_read("room", "alice", 4)
+        await receipts.flush()
+        receipts.mark_read("room", "alice", 2)  # older: must not win
+        await receipts.close()
+
+    asyncio.run(main())
+    assert repository.db.execute("select last_read_seq from room_reads").fetchone()[0] == 4
+
+
+def test_unread_counts_use_the_watermark():
+    receipts = ReadReceipts()
+    receipts._room_seqs["room"] = 10
+    receipts._reads[("room", "alice")] = 4
+    assert receipts.counts("room", "alice", 8, 2) == {"last_seq": 10, "last_read_seq": 4, "unread": 6}
+
+
+def add_room(repository, last_seq):
+    repository.db.execute("insert into chat_rooms (id, user1_id, user2_id, last_seq) values ('room', 'a', 'b', ?)",
+                          (last_seq,))
+
+
+def test_receipts_are_clamped_to_the_rooms_last_seq(repository):
+    add_room(repository, 5)
+
+    async def main():
+        receipts = ReadReceipts(flush_interval=60)
+        clamped = [await receipts.clamp("room", 2 ** 62), await receipts.clamp("room", 3),
+                   await receipts.clamp("room", 9, seen=8)]
+        await receipts.close()
+        return clamped
+
+    assert asyncio.run(main()) == [5, 3, 8]
+
+
+def test_bad_receipt_is_isolated(repository, monkeypatch):
+    mark_read = repository.mark_read
+
+    async def strict_mark_read(marks):
+        if any(user == "bad" for _, user, _ in marks):
+            raise ValueError("int too large")
+        await mark_read(marks)
+
+    monkeypatch.setattr(repository, "mark_read", strict_mark_read)
+
+    async def main():
+        receipts = ReadReceipts(flush_interval=60)
+        for user in ("alice", "bob", "bad", "carol", "dave"):
+            receipts.mark_read("room", user, 3)
+        await receipts.flush()
+        dirty = dict(receipts._dirty)
+        await receipts.close()
+        return dirty
+
+    assert asyncio.run(main()) == {}
+    users = [row[0] for row in repository.db.execute("select user_id from room_reads order by user_id")]
+    assert users == ["alice", "bob", "carol", "dave"]
+
+
+def test_read_endpoint_bounds_seq(repository, monkeypatch):
+    import routes.chat
+
+    receipts = ReadReceipts(flush_interval=60)
+    monkeypatch.setattr(routes.chat, "read_receipts", receipts)
+    alice, bob = str(uuid.uuid4()), str(uuid.uuid4())
+
+    async def main():
+        room_id = await repository.get_or_create_room(pair_key(alice, bob))
+        repository.db.execute("update chat_rooms set last_seq = 4 where id = ?", (room_id,))
+        async with api_client(make_token(alice)) as client:
+            too_big = await client.post(f"/chat/rooms/{room_id}/read", json={"seq": 2 ** 70})
+            ahead = await client.post(f"/chat/rooms/{room_id}/read", json={"seq": 1000})
+        await receipts.close()
+        return room_id, too_big.status_code, ahead.json()
+
+    room_id, too_big, ahead = asyncio.run(main())
+    assert too_big == 400
+    assert ahead == {"room_id": room_id, "last_read_seq": 4}
+
+
+def test_unread_endpoint_overlays_unflushed_receipts(repository, monkeypatch):
+    import routes.chat
+
+    receipts = ReadReceipts(flush_interval=60)
+    monkeypatch.setattr(routes.chat, "read_receipts", receipts)
+    alice, bob = str(uuid.uuid4()), str(uuid.uuid4())
+
+    async def main():
+        room_id = await repository.get_or_create_room(pair_key(alice, bob))
+        receipts.message_sent(room_id, alice, 6)
+        receipts.mark_read(room_id, bob, 2)
+        async with api_client(make_token(bob)) as client:
+            unread = (await client.get("/chat/unread")).json()
+        await receipts.close()
+        return room_id, unread
+
+    room_id, unread = asyncio.run(main())
+    assert unread == {"rooms": [{"room_id": room_id, "last_seq": 6, "last_read_seq": 2, "unread": 4}], "total": 4}
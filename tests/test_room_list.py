@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+
+import routes.room
+from core.receipts import ReadReceipts
+from core.rooms import RoomDirectory, RoomMembership, pair_key
+from tests.conftest import api_client, make_token
+
+
+def seed_inbox(repository, rooms=3):
+    """``rooms`` rooms for one user, the newest activity last; returns
+    (user, [(room_id, other_user_id), ...])."""
+    me = str(uuid.uuid4())
+    others = [str(uuid.uuid4()) for _ in range(rooms)]
+
+    async def main():
+        await repository.insert_users([{"id": other, "email": f"{i}@example.com", "username": f"user{i}"}
+                                       for i, other in enumerate(others)])
+        inbox = []
+        for i, other in enumerate(others):
+            room_id = await repository.get_or_create_room(pair_key(me, other))
+            await repository.update_room_summaries([{
+                "room_id": room_id, "seq": i + 1, "created_at": f"2024-01-0{i + 1}T00:00:00+00:00",
+                "sender_id": other, "preview": f"hi from {i}"}])
+            inbox.append((room_id, other))
+        return inbox
+
+    return me, asyncio.run(main())
+
+
+def test_inbox_is_newest_first_with_summaries(repository, monkeypatch):
+    monkeypatch.setattr(routes.room, "read_receipts", ReadReceipts(flush_interval=60))
+    me, inbox = seed_inbox(repository)
+    quiet = str(uuid.uuid4())
+
+    async def main():
+        await repository.get_or_create_room(pair_key(me, quiet))
+        await repository.mark_read([(inbox[2][0], me, 2)])
+        async with api_client(make_token(me)) as client:
+            return (await client.get("/room/list")).json()
+
+    body = asyncio.run(main())
+    rooms = body["rooms"]
+    assert body["next_cursor"] is None
+    # A new room's activity is its creation: the empty room is the newest.
+    assert rooms[0]["other_user"] == {"id": quiet, "username": None}
+    assert rooms[0]["last_message"] is None
+    assert rooms[0]["unread"] == 0
+    assert [room["room_id"] for room in rooms[1:]] == [room_id for room_id, _ in reversed(inbox)]
+
+    newest = rooms[1]
+    assert newest["other_user"] == {"id": inbox[2][1], "username": "user2"}
+    assert newest["last_message"] == {"seq": 3, "sender_id": inbox[2][1], "preview": "hi from 2",
+                                      "created_at": "2024-01-03T00:00:00+00:00"}
+    assert newest["unread"] == 1
+    assert rooms[2]["unread"] == 2
+
+
+def test_inbox_pages_with_next_cursor(repository):
+    me, inbox = seed_inbox(repository, rooms=5)
+
+    async def main():
+        pages, cursor = [], None
+        async with api_client(make_token(me)) as client:
+            while True:
+                params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+                body = (await client.get("/room/list", params=params)).json()
+                pages.append([room["room_id"] for room in body["rooms"]])
+                cursor = body["next_cursor"]
+                if cursor is None:
+                    return pages
+
+    pages = asyncio.run(main())
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == [room_id for room_id, _ in reversed(inbox)]
+
+
+def test_listing_warms_the_room_caches(repository, monkeypatch):
+    membership = RoomMembership()
+    monkeypatch.setattr(routes.room, "room_directory", RoomDirectory(membership))
+    me, inbox = seed_inbox(repository, rooms=1)
+    room_id, other = inbox[0]
+
+    async def main():
+        async with api_client(make_token(me)) as client:
+            await client.get("/room/list")
+
+    asyncio.run(main())
+    assert routes.room.room_directory.get(other, me) == room_id
+    assert membership._rooms[room_id][0] == pair_key(me, other)
+
+
+def test_list_requires_a_token(repository):
+    async def main():
+        async with api_client() as client:
+            return (await client.get("/room/list")).status_code
+
+    assert asyncio.run(main()) in (401, 403)
@@ -0,0 +1,85 @@
+import asyncio
+import uuid
+
+from core.rooms import RoomDirectory, RoomMembership, pair_key
+from tests.conftest import seed_room
+
+
+def counting_get_room(repository, monkeypatch):
+    calls = []
+    get_room = repository.get_room
+
+    async def counted(room_id):
+        calls.append(room_id)
+        await asyncio.sleep(0.01)
+        return await get_room(room_id)
+
+    monkeypatch.setattr(repository, "get_room", counted)
+    return calls
+
+
+def test_members_and_strangers(repository):
+    room_id, sender, other = seed_room(repository)
+    membership = RoomMembership()
+
+    async def main():
+        return (await membership.is_member(room_id, sender), await membership.is_member(room_id, other),
+                await membership.is_member(room_id, str(uuid.uuid4())),
+                await membership.is_member(str(uuid.uuid4()), sender))
+
+    assert asyncio.run(main()) == (True, True, False, False)
+
+
+def test_lookups_are_cached_and_shared(repository, monkeypatch):
+    room_id, sender, _ = seed_room(repository)
+    calls = counting_get_room(repository, monkeypatch)
+    membership = RoomMembership()
+
+    async def main():
+        first = await asyncio.gather(*(membership.is_member(room_id, sender) for _ in range(5)))
+        second = await membership.is_member(room_id, sender)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert all(first) and second
+    assert calls == [room_id]
+    assert membership.hits == 1
+
+
+def test_unknown_rooms_are_remembered_for_the_negative_ttl(repository, monkeypatch):
+    calls = counting_get_room(repository, monkeypatch)
+    room_id = str(uuid.uuid4())
+
+    async def main(membership):
+        await membership.is_member(room_id, "user")
+        await membership.is_member(room_id, "user")
+
+    asyncio.run(main(RoomMembership(negative_ttl=60)))
+    assert len(calls) == 1
+    asyncio.run(main(RoomMembership(negative_ttl=0)))
+    assert len(calls) == 3
+
+
+def test_cache_is_bounded():
+    membership = RoomMembership(max_size=2)
+    for room_id in ("a", "b", "c"):
+        membership.put(room_id, ("u1", "u2"))
+    assert list(membership._rooms) == ["b", "c"]
+
+
+def test_directory_warms_membership(repository, monkeypatch):
+    membership = RoomMembership()
+    directory = RoomDirectory(membership)
+    user_a, user_b = str(uuid.uuid4()), str(uuid.uuid4())
+
+    async def main():
+        room_id = await directory.get_or_create(user_a, user_b)
+        calls = counting_get_room(repository, monkeypatch)
+        return room_id, await membership.is_member(room_id, user_b), calls
+
+    room_id, member, calls = asyncio.run(main())
+    assert member and calls == []
+    assert membership._rooms[room_id][0] == pair_key(user_a, user_b)
+
+    directory.invalidate(user_b, user_a)
+    assert room_id not in membership._rooms
@@ -0,0 +1,49 @@
+import asyncio
+
+from core.cursors import decode_cursor, encode_cursor, number_field, uuid_field
+from tests.conftest import api_client, make_token, seed_room
+
+SEARCH_CURSOR = (number_field, uuid_field)
+
+
+def test_search_continues_after_cursor(repository):
+    _, sender, _ = seed_room(repository, 5)
+    first = asyncio.run(repository.search_messages(sender, "hello", None, None, 2))
+    cursor = encode_cursor([first[-1]["score"], first[-1]["id"]])
+    rest = asyncio.run(repository.search_messages(sender, "hello", None, decode_cursor(cursor, SEARCH_CURSOR), 10))
+    assert len(rest) == 3
+    assert not {hit["id"] for hit in first} & {hit["id"] for hit in rest}
+
+
+def test_search_only_covers_the_users_rooms(repository):
+    _, alice, _ = seed_room(repository, contents=["lunch at noon"])
+    _, mallory, _ = seed_room(repository, contents=["lunch is private"])
+    hits = asyncio.run(repository.search_messages(alice, "lunch", None, None, 10))
+    assert len(hits) == 1
+    assert asyncio.run(repository.search_messages(mallory, "noon", None, None, 10)) == []
+
+
+def test_query_syntax_is_treated_as_words(repository):
+    _, sender, _ = seed_room(repository, contents=['say "hi" OR NOT bye'])
+    for query in ('"hi', "OR", "NOT bye", "hi*", "(bye"):
+        asyncio.run(repository.search_messages(sender, query, None, None, 10))
+
+
+def test_search_endpoint_escapes_snippets_and_pages(repository):
+    room_id, sender, _ = seed_room(repository, contents=["<b>meeting</b> moved", "meeting at 5", "meeting room"])
+
+    async def main():
+        async with api_client(make_token(sender)) as client:
+            first = (await client.get("/chat/search", params={"q": "meeting", "limit": 2})).json()
+            rest = (await client.get("/chat/search", params={"q": "meeting", "limit": 2,
+                                                             "cursor": first["next_cursor"]})).json()
+            in_room = (await client.get("/chat/search", params={"q": "moved", "room_id": room_id})).json()
+            too_long = await client.get("/chat/search", params={"q": "x" * 1000})
+            return first, rest, in_room, too_long.status_code
+
+    first, rest, in_room, too_long = asyncio.run(main())
+    assert len(first["hits"]) == 2 and len(rest["hits"]) == 1
+    assert rest["next_cursor"] is None
+    snippet = in_room["hits"][0]["snippet"]
+    assert "&lt;b&gt;" in snippet and "<mark>" in snippet and "<b>" not in snippet
+    assert too_long == 400
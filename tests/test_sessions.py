@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import httpx
+
+from core.gateway import gateway
+from core.sessions import Refresher, SessionCache
+
+
+def test_session_lives_until_exp(monkeypatch):
+    cache = SessionCache()
+    now = time.time()
+    cache.put("token", {"id": "user"}, now + 60)
+    assert cache.get("token") == {"id": "user"}
+    assert cache.get("other") is None
+
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_expired_or_unbounded_sessions_are_not_cached():
+    cache = SessionCache()
+    cache.put("expired", {"id": "user"}, time.time() - 1)
+    cache.put("no-exp", {"id": "user"}, None)
+    assert len(cache) == 0
+
+
+def test_tokens_are_stored_hashed():
+    cache = SessionCache()
+    cache.put("secret-token", {"id": "user"}, time.time() + 60)
+    assert "secret-token" not in cache._sessions
+
+
+def test_cache_is_lru_bounded_and_invalidates():
+    cache = SessionCache(max_size=2)
+    for token in ("a", "b"):
+        cache.put(token, {"id": token}, time.time() + 60)
+    cache.get("a")
+    cache.put("c", {"id": "c"}, time.time() + 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == {"id": "a"}
+    cache.invalidate("a")
+    assert cache.get("a") is None
+
+
+def fake_refresh(monkeypatch, status=200):
+    calls = []
+
+    async def refresh(refresh_token):
+        calls.append(refresh_token)
+        await asyncio.sleep(0.01)
+        return httpx.Response(status, json={"access_token": f"access-{len(calls)}"})
+
+    monkeypatch.setattr(gateway, "refresh", refresh)
+    return calls
+
+
+def test_concurrent_refreshes_share_one_call(monkeypatch):
+    calls = fake_refresh(monkeypatch)
+    refresher = Refresher(reuse_seconds=0)
+
+    async def main():
+        return await asyncio.gather(*(refresher.refresh("rt") for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == ["rt"]
+    assert results == [(200, {"access_token": "access-1"})] * 5
+
+
+def test_late_callers_reuse_a_recent_refresh(monkeypatch):
+    calls = fake_refresh(monkeypatch)
+
+    async def main(refresher):
+        first = await refresher.refresh("rt")
+        return first, await refresher.refresh("rt")
+
+    first, second = asyncio.run(main(Refresher(reuse_seconds=10)))
+    assert first == second and len(calls) == 1
+
+    first, second = asyncio.run(main(Refresher(reuse_seconds=0)))
+    assert first != second and len(calls) == 3
+
+
+def test_failed_refreshes_are_not_reused(monkeypatch):
+    calls = fake_refresh(monkeypatch, status=400)
+    refresher = Refresher(reuse_seconds=10)
+
+    async def main():
+        return await refresher.refresh("rt"), await refresher.refresh("rt")
+
+    (status, _), _ = asyncio.run(main())
+    assert status == 400 and len(calls) == 2
@@ -0,0 +1,99 @@
+import asyncio
+
+from core.backplane import InMemoryBackplane
+from core.envelope import make_envelope
+from core.history import now_iso
+from core.timerwheel import TimerWheel
+from core.ws_manager import ConnectionManager
+from tests.conftest import FakeWebSocket
+
+
+def run_wheel(schedule, seconds, tick=0.01, slots=8):
+    expired = []
+
+    async def main():
+        wheel = TimerWheel(expired.append, tick=tick, slots=slots)
+        schedule(wheel)
+        wheel.start()
+        await asyncio.sleep(seconds)
+        await wheel.close()
+        return wheel
+
+    return asyncio.run(main()), expired
+
+
+def test_timers_fire_in_order():
+    def schedule(wheel):
+        wheel.schedule("late", 0.05)
+        wheel.schedule("early", 0.02)
+
+    wheel, expired = run_wheel(schedule, 0.15)
+    assert expired == ["early", "late"]
+    assert len(wheel) == 0
+
+
+def test_delay_longer_than_one_lap():
+    # 8 slots of 10ms: 0.12s needs a second lap of the wheel.
+    wheel, expired = run_wheel(lambda wheel: wheel.schedule("item", 0.12), 0.06)
+    assert expired == []
+    wheel, expired = run_wheel(lambda wheel: wheel.schedule("item", 0.12), 0.25)
+    assert expired == ["item"]
+
+
+def test_cancel_and_reschedule():
+    def schedule(wheel):
+        wheel.schedule("cancelled", 0.02)
+        wheel.cancel("cancelled")
+        wheel.schedule("moved", 0.02)
+        wheel.schedule("moved", 0.3)
+
+    wheel, expired = run_wheel(schedule, 0.1)
+    assert expired == []
+    assert len(wheel) == 1
+
+
+def test_failing_callback_does_not_stop_the_wheel():
+    expired = []
+
+    def expire(item):
+        if item == "bad":
+            raise RuntimeError("boom")
+        expired.append(item)
+
+    async def main():
+        wheel = TimerWheel(expire, tick=0.01, slots=8)
+        wheel.schedule("bad", 0.01)
+        wheel.schedule("good", 0.03)
+        wheel.start()
+        await asyncio.sleep(0.1)
+        await wheel.close()
+
+    asyncio.run(main())
+    assert expired == ["good"]
+
+
+class StalledWebSocket(FakeWebSocket):
+    async def send_text(self, text):
+        await asyncio.sleep(3600)  # a peer that stopped reading
+
+
+def test_heartbeat_reaps_idle_and_stalled_sockets():
+    async def main():
+        manager = ConnectionManager(backplane=InMemoryBackplane())
+        manager.heartbeat = TimerWheel(manager._check_alive, tick=0.01, slots=8)
+        manager.idle_timeout, manager.send_timeout = 0.05, 0.05
+        idle, stalled, active = FakeWebSocket(), StalledWebSocket(), FakeWebSocket()
+        await manager.connect("room", idle, "a")
+        await manager.connect("room", stalled, "b")
+        conn = await manager.connect("room", active, "c")
+        manager._fan_out("room", make_envelope("room", 1, "c", "hi", now_iso()))
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            conn.touch()
+        await manager.close()
+        return manager, idle, stalled, active
+
+    manager, idle, stalled, active = asyncio.run(main())
+    assert idle.close_code == 1001 and stalled.close_code == 1001
+    assert active.close_code is None
+    assert manager.reaped == {"idle": 1, "send_stalled": 1}
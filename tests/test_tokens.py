@@ -0,0 +1,57 @@
+import asyncio
+import os
+import time
+import uuid
+
+import pytest
+from jose import jwt
+
+from core.tokens import KeyUnavailable, LocalVerifier, SigningKeys, TokenInvalid
+from tests.conftest import make_token
+
+SECRET = os.environ["SUPABASE_JWT_SECRET"]
+
+
+def verify(token, keys=None, **kwargs):
+    verifier = LocalVerifier(keys or SigningKeys(SECRET), **kwargs)
+    return asyncio.run(verifier.verify(token))
+
+
+def test_valid_token_is_shaped_like_gotrue_user():
+    user_id = str(uuid.uuid4())
+    user = verify(make_token(user_id, role="admin", email="a@example.com", session_id="s1"))
+    assert user["id"] == user_id
+    assert user["user_metadata"]["role"] == "admin"
+    assert user["email"] == "a@example.com"
+    assert user["session_id"] == "s1"
+    assert user["app_metadata"] == {}
+
+
+@pytest.mark.parametrize("token, reason", [
+    (make_token("u", exp=int(time.time()) - 10), "expired"),
+    (make_token("u", aud="someone-else"), "audience"),
+    (make_token("u", role="guest"), "Role not allowed"),
+    (make_token(""), "subject"),
+    (jwt.encode({"sub": "u", "aud": "authenticated", "user_metadata": {"role": "user"}},
+                "wrong-secret-wrong-secret-wrong-secret", algorithm="HS256"), "Signature"),
+    (jwt.encode({"sub": "u"}, SECRET, algorithm="HS512"), "Unsupported algorithm"),
+    ("not-a-jwt", "Malformed"),
+])
+def test_rejected_tokens(token, reason):
+    with pytest.raises(TokenInvalid, match=reason):
+        verify(token)
+
+
+def test_missing_secret_is_key_unavailable():
+    with pytest.raises(KeyUnavailable):
+        verify(make_token("u"), keys=SigningKeys(secret=None))
+
+
+def test_rs256_without_jwks_is_key_unavailable():
+    keys = SigningKeys(SECRET)
+    with pytest.raises(KeyUnavailable, match="No JWKS"):
+        asyncio.run(keys.get({"alg": "RS256", "kid": "k1"}))
+
+
+def test_allowed_roles_are_configurable():
+    assert verify(make_token("u", role="guest"), allowed_roles=["guest"])["id"] == "u"
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from core.backplane import InMemoryBackplane
+from core.envelope import MSGPACK_PROTOCOL, Frame, make_envelope
+from core.history import now_iso
+from core.ws_manager import ConnectionManager
+from tests.conftest import FakeWebSocket
+
+
+def envelope(seq):
+    return make_envelope("room", seq, "user", f"message {seq}", now_iso())
+
+
+def test_binary_client_gets_a_packed_pong():
+    msgpack = pytest.importorskip("msgpack")
+
+    async def main():
+        manager = ConnectionManager(backplane=InMemoryBackplane())
+        websocket = FakeWebSocket()
+        conn = await manager.connect("room", websocket, "user", subprotocol=MSGPACK_PROTOCOL)
+        manager.send(conn, "pong")
+        manager._fan_out("room", envelope(1))
+        await asyncio.sleep(0.01)
+        connected = len(manager.connections)
+        manager.disconnect(conn)
+        await manager.close()
+        return websocket, connected
+
+    websocket, connected = asyncio.run(main())
+    assert connected == 1
+    assert websocket.close_code is None
+    assert msgpack.unpackb(websocket.sent[0]) == "pong"
+    assert msgpack.unpackb(websocket.sent[1])["seq"] == 1
+
+
+def test_send_failure_closes_with_1011():
+    async def main():
+        manager = ConnectionManager(backplane=InMemoryBackplane())
+        websocket = FakeWebSocket()
+        conn = await manager.connect("room", websocket, "user")
+        manager._enqueue(conn, Frame(object()))  # not text: send_text can't take it
+        await asyncio.wait_for(conn.writer, 1)
+        await manager.close()
+        return manager, websocket
+
+    manager, websocket = asyncio.run(main())
+    assert websocket.close_code == 1011
+    assert len(manager.connections) == 0
@@ -0,0 +1,64 @@
+"""Measure how long importing the app takes and fail over a budget.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter a few
+times (so nothing is already imported) and reports the best total and the
+slowest modules from that run. Exits 1 when the total is over --budget-ms,
+so it can run in CI:
+
+    python -m tools.import_budget --budget-ms 800
+    python -m tools.import_budget --module main --top 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str) -> List[Tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for every import, in import order."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, cwd=ROOT)
+    if result.returncode != 0:
+        raise SystemExit(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            rows.append((name, int(self_us), int(cumulative)))
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    parser.add_argument("--runs", type=int, default=3, help="best of this many cold imports")
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list (by self time)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    best = None
+    for _ in range(args.runs):
+        rows = measure(args.module)
+        total = next(cumulative for name, _, cumulative in rows if name == args.module)
+        if best is None or total < best[0]:
+            best = (total, rows)
+    total, rows = best
+    report = {
+        "module": args.module,
+        "total_ms": round(total / 1000, 1),
+        "budget_ms": args.budget_ms,
+        "within_budget": total / 1000 <= args.budget_ms,
+        "slowest": [{"module": name, "self_ms": round(self_us / 1000, 1), "cumulative_ms": round(cumulative / 1000, 1)}
+                    for name, self_us, cumulative in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]],
+    }
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["within_budget"] else 1)
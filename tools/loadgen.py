@@ -0,0 +1,231 @@
+"""Headless load generator and latency benchmark for the chat server.
+
+Provisions users (through /auth/signup + /auth/login, or by minting JWTs
+locally with the project secret), pairs them into rooms through
+/room/get_or_create, opens one WebSocket per user and sends messages at a
+fixed rate. Prints a JSON report so runs can be compared:
+
+    python -m tools.loadgen --users 1000 --rate 0.5 --duration 60
+    python -m tools.loadgen --users 5000 --mint-secret "$SUPABASE_JWT_SECRET"
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+from jose import jwt
+
+
+class Stats:
+    def __init__(self):
+        self.connect_ms: List[float] = []
+        self.latency_ms: List[float] = []
+        self.sent = 0
+        self.received = 0
+        self.errors: Dict[str, int] = {}
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def percentiles(values: List[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pick(p):
+        return round(values[min(len(values) - 1, int(p / 100 * len(values)))], 3)
+
+    return {
+        "count": len(values),
+        "p50": pick(50),
+        "p95": pick(95),
+        "p99": pick(99),
+        "max": round(values[-1], 3),
+        "mean": round(sum(values) / len(values), 3),
+    }
+
+
+class User:
+    def __init__(self, user_id: str, token: str):
+        self.id = user_id
+        self.token = token
+        self.room_id: Optional[str] = None
+
+
+def mint_token(secret: str, user_id: str, ttl: int = 3600) -> str:
+    now = int(time.time())
+    return jwt.encode({
+        "sub": user_id,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "email": f"load-{user_id}@loadgen.local",
+        "iat": now,
+        "exp": now + ttl,
+        "user_metadata": {"role": "user"},
+    }, secret, algorithm="HS256")
+
+
+async def provision(client: httpx.AsyncClient, args, index: int, stats: Stats) -> Optional[User]:
+    if args.mint_secret:
+        user_id = str(uuid.uuid4())
+        return User(user_id, mint_token(args.mint_secret, user_id))
+
+    email = f"{args.email_prefix}{args.run_id}-{index}@{args.email_domain}"
+    body = {"email": email, "password": args.password}
+    response = await client.post("/auth/signup", json=body)
+    if response.status_code != 200:
+        stats.error(f"signup_{response.status_code}")
+        return None
+    response = await client.post("/auth/login", json=body)
+    if response.status_code != 200:
+        stats.error(f"login_{response.status_code}")
+        return None
+    return User(response.json()["user_id"], response.cookies.get("access_token"))
+
+
+async def pair_rooms(client: httpx.AsyncClient, users: List[User], stats: Stats, limit: asyncio.Semaphore):
+    async def create(a: User, b: User):
+        async with limit:
+            response = await client.post("/room/get_or_create", json={"other_user_id": b.id},
+                                         headers={"Authorization": f"Bearer {a.token}"})
+        if response.status_code != 200:
+            stats.error(f"room_{response.status_code}")
+            return
+        a.room_id = b.room_id = response.json()["room_id"]
+
+    await asyncio.gather(*(create(users[i], users[i + 1]) for i in range(0, len(users) - 1, 2)))
+
+
+async def run_socket(args, user: User, stats: Stats, start: asyncio.Event, stop: asyncio.Event):
+    url = f"{args.ws_url}/chat/ws/chat/{user.room_id}?token={user.token}"
+    began = time.perf_counter()
+    try:
+        ws = await websockets.connect(url, open_timeout=args.connect_timeout, max_queue=None)
+    except Exception as e:
+        stats.error(f"connect_{type(e).__name__}")
+        return
+    stats.connect_ms.append((time.perf_counter() - began) * 1000)
+
+    async def receive():
+        try:
+            async for frame in ws:
+                try:
+                    body = json.loads(json.loads(frame)["content"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if isinstance(body, dict) and "t" in body:
+                    stats.received += 1
+                    stats.latency_ms.append((time.perf_counter() - body["t"]) * 1000)
+        except websockets.ConnectionClosed as e:
+            if not stop.is_set():
+                stats.error(f"closed_{e.code}")
+
+    async def send():
+        await start.wait()
+        interval = 1.0 / args.rate
+        await asyncio.sleep(random.uniform(0, interval))
+        while not stop.is_set():
+            payload = json.dumps({"t": time.perf_counter(), "pad": "x" * args.size})
+            await ws.send(payload)
+            stats.sent += 1
+            await asyncio.sleep(interval)
+
+    receiver = asyncio.create_task(receive())
+    try:
+        if args.rate > 0:
+            await send()
+        else:
+            await stop.wait()
+        # let in-flight messages arrive before closing
+        await asyncio.sleep(args.drain)
+    except websockets.ConnectionClosed as e:
+        stats.error(f"closed_{e.code}")
+    except Exception as e:
+        stats.error(f"send_{type(e).__name__}")
+    finally:
+        receiver.cancel()
+        await ws.close()
+
+
+async def main(args) -> dict:
+    stats = Stats()
+    limit = asyncio.Semaphore(args.setup_concurrency)
+    limits = httpx.Limits(max_connections=args.setup_concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        async def one(i):
+            async with limit:
+                try:
+                    return await provision(client, args, i, stats)
+                except httpx.HTTPError as e:
+                    stats.error(f"provision_{type(e).__name__}")
+
+        setup_began = time.perf_counter()
+        users = [u for u in await asyncio.gather(*(one(i) for i in range(args.users))) if u]
+        await pair_rooms(client, users, stats, limit)
+        setup_s = time.perf_counter() - setup_began
+
+    users = [u for u in users if u.room_id]
+    start, stop = asyncio.Event(), asyncio.Event()
+    sockets = [asyncio.create_task(run_socket(args, u, stats, start, stop)) for u in users]
+    await asyncio.sleep(args.ramp)
+    start.set()
+    run_began = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    run_s = time.perf_counter() - run_began
+    await asyncio.gather(*sockets)
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "mint_secret"},
+        "users": len(users),
+        "rooms": len({u.room_id for u in users}),
+        "setup_seconds": round(setup_s, 3),
+        "run_seconds": round(run_s, 3),
+        "connect_ms": percentiles(stats.connect_ms),
+        "fanout_latency_ms": percentiles(stats.latency_ms),
+        "sent": stats.sent,
+        "received": stats.received,
+        "sent_per_second": round(stats.sent / run_s, 2),
+        "received_per_second": round(stats.received / run_s, 2),
+        "errors": stats.errors,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--ws-url", default=None, help="defaults to --base-url with ws:// scheme")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1.0, help="messages per second per socket")
+    parser.add_argument("--size", type=int, default=32, help="payload padding in bytes")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds to wait for sockets before sending")
+    parser.add_argument("--drain", type=float, default=1.0)
+    parser.add_argument("--connect-timeout", type=float, default=30.0)
+    parser.add_argument("--setup-concurrency", type=int, default=50)
+    parser.add_argument("--mint-secret", default=None, help="mint HS256 tokens instead of signing up")
+    parser.add_argument("--email-prefix", default="load-")
+    parser.add_argument("--email-domain", default="loadgen.local")
+    parser.add_argument("--password", default="loadgen-password")
+    parser.add_argument("--run-id", default=uuid.uuid4().hex[:8])
+    parser.add_argument("--output", default=None, help="write the JSON report here as well")
+    args = parser.parse_args(argv)
+    if args.ws_url is None:
+        args.ws_url = args.base_url.replace("http", "ws", 1)
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
@@ -0,0 +1,113 @@
+"""Minimal Redis stand-in for exercising the pub/sub backplane offline.
+
+Implements just the RESP commands the backplane uses: PING, PUBLISH,
+SUBSCRIBE, UNSUBSCRIBE, INCR, GET, SET (with NX), HSET, HGETALL, HDEL, AUTH
+and SELECT.
+
+    python -m tools.resp_standin --port 6379
+"""
+import argparse
+import asyncio
+from typing import Dict, Set
+
+from core.backplane import encode_command, read_reply
+
+
+def _confirm(kind: bytes, channel: bytes, count: int) -> bytes:
+    return b"*3\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n:%d\r\n" % (len(kind), kind, len(channel), channel, count)
+
+
+class RespStandin:
+    def __init__(self):
+        self.channels: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self.values: Dict[bytes, bytes] = {}
+        self.hashes: Dict[bytes, Dict[bytes, bytes]] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[bytes] = set()
+        try:
+            while True:
+                try:
+                    command = await read_reply(reader)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                if not isinstance(command, list) or not command:
+                    writer.write(b"-ERR protocol error\r\n")
+                    continue
+                name, args = command[0].upper(), command[1:]
+                if name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                elif name in (b"AUTH", b"SELECT"):
+                    writer.write(b"+OK\r\n")
+                elif name == b"PUBLISH":
+                    receivers = self.channels.get(args[0], set())
+                    for sub in receivers:
+                        sub.write(encode_command("message", args[0], args[1]))
+                    writer.write(b":%d\r\n" % len(receivers))
+                elif name == b"SUBSCRIBE":
+                    for channel in args:
+                        self.channels.setdefault(channel, set()).add(writer)
+                        subscribed.add(channel)
+                        writer.write(_confirm(b"subscribe", channel, len(subscribed)))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in args:
+                        self._drop(channel, writer)
+                        subscribed.discard(channel)
+                        writer.write(_confirm(b"unsubscribe", channel, len(subscribed)))
+                elif name == b"INCR":
+                    value = int(self.values.get(args[0], b"0")) + 1
+                    self.values[args[0]] = str(value).encode()
+                    writer.write(b":%d\r\n" % value)
+                elif name == b"SET":
+                    if b"NX" in (a.upper() for a in args[2:]) and args[0] in self.values:
+                        writer.write(b"$-1\r\n")
+                    else:
+                        self.values[args[0]] = args[1]
+                        writer.write(b"+OK\r\n")
+                elif name == b"GET":
+                    value = self.values.get(args[0])
+                    writer.write(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+                elif name == b"HSET":
+                    fields = self.hashes.setdefault(args[0], {})
+                    pairs = list(zip(args[1::2], args[2::2]))
+                    added = sum(1 for field, _ in pairs if field not in fields)
+                    fields.update(pairs)
+                    writer.write(b":%d\r\n" % added)
+                elif name == b"HGETALL":
+                    fields = self.hashes.get(args[0], {})
+                    writer.write(encode_command(*(item for pair in fields.items() for item in pair)))
+                elif name == b"HDEL":
+                    fields = self.hashes.get(args[0], {})
+                    removed = sum(1 for field in args[1:] if fields.pop(field, None) is not None)
+                    writer.write(b":%d\r\n" % removed)
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % name)
+                await writer.drain()
+        finally:
+            for channel in subscribed:
+                self._drop(channel, writer)
+            writer.close()
+
+    def _drop(self, channel: bytes, writer: asyncio.StreamWriter):
+        subs = self.channels.get(channel)
+        if subs is not None:
+            subs.discard(writer)
+            if not subs:
+                del self.channels[channel]
+
+    async def serve(self, host: str, port: int):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def main(host: str, port: int):
+    server = await RespStandin().serve(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port))
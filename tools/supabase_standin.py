@@ -0,0 +1,459 @@
+"""Offline Supabase stand-in for performance and integration testing.
+
+Implements the slice of GoTrue and PostgREST this app uses, in memory:
+
+- GoTrue: POST /auth/v1/signup, POST /auth/v1/token (password and
+  refresh_token grants), GET /auth/v1/user. Tokens are HS256 JWTs signed
+  with --jwt-secret, so the app can verify them locally too.
+- PostgREST: GET/POST/PATCH on /rest/v1/{users,chat_rooms,messages,room_reads}
+  with eq/neq/gt/gte/lt/lte/is/in/not filters, or=/and= trees, select, order
+  and limit, plus the get_or_create_room, update_room_summaries and
+  mark_rooms_read RPCs.
+
+Latency and errors can be injected per request, globally or separately for
+auth and rest, and changed at runtime through POST /_standin/config:
+
+    python -m tools.supabase_standin --port 54321 --latency-ms 20 --jitter-ms 10 --error-rate 0.01
+
+Point the app at it with SUPABASE_URL=http://127.0.0.1:54321.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from jose import jwt, JWTError
+
+TABLES = ("users", "chat_rooms", "messages", "room_reads")
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Injection:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    def as_dict(self) -> dict:
+        return {"latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms, "error_rate": self.error_rate}
+
+
+class Standin:
+    def __init__(self, jwt_secret: str, token_ttl: int, auth: Injection, rest: Injection, seed: Optional[int]):
+        self.jwt_secret = jwt_secret
+        self.token_ttl = token_ttl
+        self.injection = {"auth": auth, "rest": rest}
+        self.random = random.Random(seed)
+        self.accounts: Dict[str, dict] = {}  # email -> {"password", "user"}
+        self.refresh_tokens: Dict[str, str] = {}  # refresh token -> email
+        self.tables: Dict[str, List[dict]] = {t: [] for t in TABLES}
+        # Indexes so inserts and room-scoped reads stay cheap as tables grow
+        self.ids: Dict[str, Dict[str, dict]] = {t: {} for t in TABLES}
+        self.pairs: Dict[frozenset, dict] = {}
+        self.room_messages: Dict[str, List[dict]] = {}
+        self.requests = 0
+        self.injected_errors = 0
+
+    # fault injection
+
+    async def inject(self, group: str) -> Optional[Response]:
+        self.requests += 1
+        injection = self.injection[group]
+        delay = injection.latency_ms + self.random.uniform(-injection.jitter_ms, injection.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if injection.error_rate and self.random.random() < injection.error_rate:
+            self.injected_errors += 1
+            return JSONResponse({"message": "injected failure"}, status_code=503)
+        return None
+
+    # GoTrue
+
+    def issue(self, email: str) -> dict:
+        user = self.accounts[email]["user"]
+        now = int(time.time())
+        access_token = jwt.encode({
+            "sub": user["id"],
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": email,
+            "iat": now,
+            "exp": now + self.token_ttl,
+            "session_id": str(uuid.uuid4()),
+            "app_metadata": user["app_metadata"],
+            "user_metadata": user["user_metadata"],
+        }, self.jwt_secret, algorithm="HS256")
+        refresh_token = uuid.uuid4().hex
+        self.refresh_tokens[refresh_token] = email
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "expires_in": self.token_ttl,
+            "expires_at": now + self.token_ttl,
+            "refresh_token": refresh_token,
+            "user": user,
+        }
+
+    def user_from_token(self, token: str) -> Optional[dict]:
+        try:
+            claims = jwt.decode(token, self.jwt_secret, algorithms=["HS256"], audience="authenticated")
+        except JWTError:
+            return None
+        account = self.accounts.get(claims.get("email"))
+        return account["user"] if account else None
+
+    # PostgREST
+
+    def insert(self, table: str, rows: List[dict], on_conflict: Optional[List[str]], resolution: Optional[str]):
+        written = []
+        for row in rows:
+            row = dict(row)
+            row.setdefault("id", str(uuid.uuid4()))
+            row.setdefault("created_at", now_iso())
+            existing = self.conflict(table, row, on_conflict)
+            if existing is not None:
+                if resolution == "ignore-duplicates":
+                    continue
+                if resolution == "merge-duplicates":
+                    existing.update(row)
+                    written.append(existing)
+                    continue
+                return None
+            self.store(table, row)
+            written.append(row)
+        return written
+
+    def store(self, table: str, row: dict):
+        if table == "chat_rooms":
+            # Column defaults from the migrations
+            row.setdefault("created_at", now_iso())
+            row.setdefault("last_seq", 0)
+            row.setdefault("last_activity_at", row["created_at"])
+        self.tables[table].append(row)
+        self.ids[table][row["id"]] = row
+        if table == "chat_rooms":
+            self.pairs[frozenset((row["user1_id"], row["user2_id"]))] = row
+        elif table == "messages":
+            self.room_messages.setdefault(row["chat_room_id"], []).append(row)
+
+    def conflict(self, table: str, row: dict, on_conflict: Optional[List[str]]) -> Optional[dict]:
+        existing = self.ids[table].get(row["id"])
+        if existing is None and table == "chat_rooms":
+            existing = self.pairs.get(frozenset((row.get("user1_id"), row.get("user2_id"))))
+        if existing is None and on_conflict and on_conflict != ["id"]:
+            existing = next((r for r in self.tables[table]
+                             if all(r.get(c) == row.get(c) for c in on_conflict)), None)
+        return existing
+
+    def candidates(self, table: str, params) -> List[dict]:
+        room = params.get("chat_room_id", "")
+        if table == "messages" and room.startswith("eq."):
+            return self.room_messages.get(room[3:], [])
+        return self.tables[table]
+
+    def get_or_create_room(self, a: str, b: str) -> str:
+        room = self.pairs.get(frozenset((a, b)))
+        if room is None:
+            low, high = sorted((a, b))
+            room = {"id": str(uuid.uuid4()), "user1_id": low, "user2_id": high, "created_at": now_iso()}
+            self.store("chat_rooms", room)
+        return room["id"]
+
+
+# PostgREST filter parsing
+
+
+def split_top(text: str) -> List[str]:
+    """Split on commas that are not inside parentheses or quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(ch)
+    parts.append("".join(current))
+    return parts
+
+
+def coerce(raw: str, sample):
+    raw = raw.strip('"')
+    if isinstance(sample, bool):
+        return raw.lower() == "true"
+    if isinstance(sample, int):
+        return int(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def compare(value, op: str, raw: str) -> bool:
+    if op == "is":
+        raw = raw.lower()
+        return value is None if raw == "null" else value is (raw == "true")
+    if op == "in":
+        return value is not None and str(value) in [v.strip('"') for v in split_top(raw.strip("()"))]
+    if value is None:
+        return False
+    target = coerce(raw, value)
+    return {
+        "eq": value == target,
+        "neq": value != target,
+        "gt": value > target,
+        "gte": value >= target,
+        "lt": value < target,
+        "lte": value <= target,
+    }[op]
+
+
+def condition(column: str, expression: str):
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[4:]
+    op, _, raw = expression.partition(".")
+
+    def check(row):
+        return compare(row.get(column), op, raw) != negate
+    return check
+
+
+def tree(kind: str, body: str):
+    """Predicate for an or=(...) / and=(...) logic tree."""
+    checks = []
+    for part in split_top(body[1:-1]):
+        if part.startswith(("and(", "or(")):
+            name, _, rest = part.partition("(")
+            checks.append(tree(name, "(" + rest))
+        else:
+            column, _, expression = part.partition(".")
+            checks.append(condition(column, expression))
+    combine = any if kind == "or" else all
+    return lambda row: combine(check(row) for check in checks)
+
+
+def build_filters(params) -> list:
+    checks = []
+    for key, value in params.multi_items():
+        if key in ("select", "order", "limit", "offset", "on_conflict"):
+            continue
+        if key in ("or", "and"):
+            checks.append(tree(key, value))
+        else:
+            checks.append(condition(key, value))
+    return checks
+
+
+def sort_rows(rows: List[dict], order: Optional[str]) -> List[dict]:
+    if not order:
+        return rows
+    for term in reversed(order.split(",")):
+        column, _, direction = term.partition(".")
+        descending = direction.startswith("desc")
+        present = [r for r in rows if r.get(column) is not None]
+        missing = [r for r in rows if r.get(column) is None]
+        present.sort(key=lambda r: r[column], reverse=descending)
+        rows = present + missing
+    return rows
+
+
+def project(rows: List[dict], select: Optional[str]) -> List[dict]:
+    if not select or select == "*":
+        return [dict(r) for r in rows]
+    columns = [c.strip() for c in select.split(",")]
+    return [{c: r.get(c) for c in columns} for r in rows]
+
+
+def create_app(standin: Standin) -> FastAPI:
+    app = FastAPI()
+    app.state.standin = standin
+
+    @app.middleware("http")
+    async def inject_faults(request: Request, call_next):
+        path = request.url.path
+        group = "auth" if path.startswith("/auth/") else "rest" if path.startswith("/rest/") else None
+        if group:
+            failure = await standin.inject(group)
+            if failure is not None:
+                return failure
+        return await call_next(request)
+
+    @app.get("/_standin/config")
+    async def get_config():
+        return {
+            "auth": standin.injection["auth"].as_dict(),
+            "rest": standin.injection["rest"].as_dict(),
+            "requests": standin.requests,
+            "injected_errors": standin.injected_errors,
+            "rows": {t: len(rows) for t, rows in standin.tables.items()},
+        }
+
+    @app.post("/_standin/config")
+    async def set_config(request: Request):
+        body = await request.json()
+        for group in ("auth", "rest"):
+            for key, value in (body.get(group) or {}).items():
+                setattr(standin.injection[group], key, float(value))
+        return await get_config()
+
+    @app.post("/auth/v1/signup")
+    async def signup(request: Request):
+        body = await request.json()
+        email, password = body.get("email"), body.get("password")
+        if not email or not password:
+            return JSONResponse({"msg": "Signup requires a valid password"}, status_code=422)
+        if email in standin.accounts:
+            return JSONResponse({"msg": "User already registered"}, status_code=400)
+        user = {
+            "id": str(uuid.uuid4()),
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": email,
+            "app_metadata": {"provider": "email"},
+            "user_metadata": body.get("data") or {},
+            "created_at": now_iso(),
+        }
+        standin.accounts[email] = {"password": password, "user": user}
+        return {**standin.issue(email), "user": user}
+
+    @app.post("/auth/v1/token")
+    async def token(request: Request, grant_type: str):
+        body = await request.json()
+        if grant_type == "password":
+            account = standin.accounts.get(body.get("email"))
+            if account is None or account["password"] != body.get("password"):
+                return JSONResponse({"error": "invalid_grant", "error_description": "Invalid login credentials"},
+                                    status_code=400)
+            return standin.issue(body["email"])
+        if grant_type == "refresh_token":
+            email = standin.refresh_tokens.pop(body.get("refresh_token"), None)
+            if email is None:
+                return JSONResponse({"error": "invalid_grant", "error_description": "Invalid Refresh Token"},
+                                    status_code=400)
+            return standin.issue(email)
+        return JSONResponse({"error": "unsupported_grant_type"}, status_code=400)
+
+    @app.get("/auth/v1/user")
+    async def user(request: Request):
+        auth = request.headers.get("authorization", "")
+        found = standin.user_from_token(auth[7:]) if auth.lower().startswith("bearer ") else None
+        if found is None:
+            return JSONResponse({"msg": "invalid JWT"}, status_code=401)
+        return found
+
+    @app.post("/rest/v1/rpc/get_or_create_room")
+    async def rpc_get_or_create_room(request: Request):
+        body = await request.json()
+        return standin.get_or_create_room(body["a"], body["b"])
+
+    @app.post("/rest/v1/rpc/update_room_summaries")
+    async def rpc_update_room_summaries(request: Request):
+        body = await request.json()
+        for room_id, seq, sender_id, preview, sent_at in zip(body["room_ids"], body["seqs"], body["sender_ids"],
+                                                             body["previews"], body["sent_at"]):
+            room = standin.ids["chat_rooms"].get(room_id)
+            if room is not None and seq > (room.get("last_seq") or 0):
+                room.update(last_seq=seq, last_activity_at=sent_at, last_sender_id=sender_id,
+                            last_message_preview=preview)
+        return Response(status_code=204)
+
+    @app.post("/rest/v1/rpc/mark_rooms_read")
+    async def rpc_mark_rooms_read(request: Request):
+        body = await request.json()
+        for room_id, user_id, seq in zip(body["room_ids"], body["user_ids"], body["seqs"]):
+            row = {"id": str(uuid.uuid4()), "room_id": room_id, "user_id": user_id, "last_read_seq": seq}
+            existing = standin.conflict("room_reads", row, ["room_id", "user_id"])
+            if existing is None:
+                standin.store("room_reads", row)
+            elif seq > existing["last_read_seq"]:
+                existing["last_read_seq"] = seq
+        return Response(status_code=204)
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        if table not in standin.tables:
+            return JSONResponse({"message": f"relation {table} does not exist"}, status_code=404)
+        params = request.query_params
+        checks = build_filters(params)
+        rows = [r for r in standin.candidates(table, params) if all(check(r) for check in checks)]
+        rows = sort_rows(rows, params.get("order"))
+        offset = int(params.get("offset", 0))
+        limit = params.get("limit")
+        rows = rows[offset:offset + int(limit) if limit is not None else None]
+        return project(rows, params.get("select"))
+
+    @app.post("/rest/v1/{table}")
+    async def insert(table: str, request: Request):
+        if table not in standin.tables:
+            return JSONResponse({"message": f"relation {table} does not exist"}, status_code=404)
+        body = await request.json()
+        rows = body if isinstance(body, list) else [body]
+        prefer = request.headers.get("prefer", "")
+        resolution = next((p.split("=", 1)[1] for p in prefer.split(",") if p.strip().startswith("resolution=")), None)
+        on_conflict = request.query_params.get("on_conflict")
+        written = standin.insert(table, rows, on_conflict.split(",") if on_conflict else None, resolution)
+        if written is None:
+            return JSONResponse({"code": "23505", "message": "duplicate key value violates unique constraint"},
+                                status_code=409)
+        if "return=representation" in prefer:
+            return JSONResponse(written, status_code=201)
+        return Response(status_code=201)
+
+    @app.patch("/rest/v1/{table}")
+    async def update(table: str, request: Request):
+        if table not in standin.tables:
+            return JSONResponse({"message": f"relation {table} does not exist"}, status_code=404)
+        values = await request.json()
+        checks = build_filters(request.query_params)
+        updated = []
+        for row in standin.candidates(table, request.query_params):
+            if all(check(row) for check in checks):
+                row.update(values)
+                updated.append(row)
+        if "return=representation" in request.headers.get("prefer", ""):
+            return updated
+        return Response(status_code=204)
+
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--jwt-secret", default="standin-jwt-secret")
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added to every auth and rest request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--auth-latency-ms", type=float, default=None)
+    parser.add_argument("--rest-latency-ms", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=None, help="seed for jitter and error injection")
+    return parser.parse_args(argv)
+
+
+def build(args) -> FastAPI:
+    def injection(latency):
+        return Injection(args.latency_ms if latency is None else latency, args.jitter_ms, args.error_rate)
+    return create_app(Standin(args.jwt_secret, args.token_ttl, injection(args.auth_latency_ms),
+                              injection(args.rest_latency_ms), args.seed))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_args()
+    uvicorn.run(build(args), host=args.host, port=args.port, log_level="warning")